@@ -0,0 +1,29 @@
+-- Hire counts per month, department and job, maintained by the Data API Lambda
+-- alongside every write to hr_data.hired_employees. Run after transformations.sql.
+CREATE TABLE hr_data.hiring_summary (
+    month_start DATE NOT NULL,
+    year SMALLINT NOT NULL,
+    quarter SMALLINT NOT NULL,
+    month SMALLINT NOT NULL,
+    department_id INTEGER NOT NULL,
+    job_id INTEGER NOT NULL,
+    hires BIGINT NOT NULL
+)
+DISTSTYLE ALL
+SORTKEY (month_start, department_id, job_id);
+
+-- Initial load
+INSERT INTO hr_data.hiring_summary (month_start, year, quarter, month, department_id, job_id, hires)
+SELECT
+    CAST(DATE_TRUNC('month', datetime) AS DATE) AS month_start,
+    EXTRACT(YEAR FROM datetime) AS year,
+    EXTRACT(QUARTER FROM datetime) AS quarter,
+    EXTRACT(MONTH FROM datetime) AS month,
+    department_id,
+    job_id,
+    COUNT(*) AS hires
+FROM hr_data.hired_employees
+WHERE datetime IS NOT NULL AND department_id IS NOT NULL AND job_id IS NOT NULL
+GROUP BY 1, 2, 3, 4, 5, 6;
+
+ALTER TABLE hr_data.hiring_summary ADD CONSTRAINT pk_hiring_summary PRIMARY KEY (month_start, department_id, job_id);
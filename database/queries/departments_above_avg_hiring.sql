@@ -1,4 +1,8 @@
 -- Departments with hiring above average
+-- @report departments_above_avg_hiring
+-- @description Departments that hired more employees than the average department in the window
+-- @window
+-- @cache_ttl 300
 WITH CTE1 AS (
     SELECT
         d.id AS department_id,
@@ -7,7 +11,8 @@ WITH CTE1 AS (
         AVG(COUNT(DISTINCT e.id)) OVER() AS avg_hired
     FROM hr_data.hired_employees e
     JOIN hr_data.departments d ON e.department_id = d.id
-    WHERE EXTRACT(YEAR FROM e.datetime) = {year}
+    WHERE e.datetime >= CAST(:window_start AS TIMESTAMPTZ)
+        AND e.datetime < CAST(:window_end AS TIMESTAMPTZ)
         AND d.department IS NOT NULL
     GROUP BY d.id, d.department
 )
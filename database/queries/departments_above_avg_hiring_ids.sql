@@ -0,0 +1,26 @@
+-- Departments with hiring above average, grouped by department id; the Lambda attaches the names
+-- @report departments_above_avg_hiring
+-- @variant ids
+-- @window
+-- @cache_ttl 300
+-- @attach department_id departments department_name
+WITH CTE1 AS (
+    SELECT
+        e.department_id,
+        COUNT(DISTINCT e.id) AS hired,
+        AVG(COUNT(DISTINCT e.id)) OVER() AS avg_hired
+    FROM hr_data.hired_employees e
+    WHERE e.datetime >= CAST(:window_start AS TIMESTAMPTZ)
+        AND e.datetime < CAST(:window_end AS TIMESTAMPTZ)
+        -- Only departments the joined variant keeps, so orphan ids do not move the average
+        AND e.department_id IN (SELECT id FROM hr_data.departments WHERE department IS NOT NULL)
+    GROUP BY e.department_id
+)
+
+SELECT 
+    department_id,
+    hired,
+    ROUND(avg_hired, 2) AS avg_hired
+FROM CTE1
+WHERE hired > avg_hired
+ORDER BY hired DESC;
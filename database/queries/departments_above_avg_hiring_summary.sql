@@ -0,0 +1,30 @@
+-- Departments with hiring above average, read from the maintained hiring summary
+-- @report departments_above_avg_hiring
+-- @variant summary
+-- The summary counts hire rows while the report counts distinct ids, so ids
+-- posted more than once count again here; it only runs with ?source=summary
+-- @opt_in
+-- @window
+-- @cache_ttl 300
+WITH CTE1 AS (
+    SELECT
+        d.id AS department_id,
+        d.department AS department_name,
+        SUM(s.hires) AS hired,
+        AVG(SUM(s.hires)) OVER() AS avg_hired
+    FROM hr_data.hiring_summary s
+    JOIN hr_data.departments d ON s.department_id = d.id
+    WHERE s.month_start >= CAST(:window_start AS TIMESTAMPTZ)
+        AND s.month_start < CAST(:window_end AS TIMESTAMPTZ)
+        AND d.department IS NOT NULL
+    GROUP BY d.id, d.department
+)
+
+SELECT 
+    department_id,
+    department_name,
+    hired,
+    ROUND(avg_hired, 2) AS avg_hired
+FROM CTE1
+WHERE hired > avg_hired
+ORDER BY hired DESC;
@@ -0,0 +1,15 @@
+-- Monthly hiring trend from the maintained hiring summary
+-- @report monthly_hiring_trend
+-- @description Hires per month in the window, with the running total; windows are counted in whole months
+-- @window
+-- @cache_ttl 300
+SELECT
+    s.year,
+    s.month,
+    SUM(s.hires) AS hires,
+    SUM(SUM(s.hires)) OVER (ORDER BY s.year, s.month ROWS UNBOUNDED PRECEDING) AS cumulative_hires
+FROM hr_data.hiring_summary s
+WHERE s.month_start >= CAST(:window_start AS TIMESTAMPTZ)
+  AND s.month_start < CAST(:window_end AS TIMESTAMPTZ)
+GROUP BY s.year, s.month
+ORDER BY s.year, s.month;
@@ -11,6 +11,7 @@ SELECT
 FROM hr_data.hired_employees e
 JOIN hr_data.departments d ON e.department_id = d.id
 JOIN hr_data.jobs j ON e.job_id = j.id
-WHERE EXTRACT(YEAR FROM e.datetime) = 2021
+WHERE e.datetime >= '2021-01-01 00:00:00+00'
+  AND e.datetime < '2022-01-01 00:00:00+00'
 GROUP BY d.department, j.job
 ORDER BY d.department, j.job;
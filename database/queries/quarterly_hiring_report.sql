@@ -1,4 +1,8 @@
 -- Quarterly hiring report with pivot format
+-- @report quarterly_hiring_report
+-- @description Hires per department and job, pivoted by quarter
+-- @window
+-- @cache_ttl 300
 SELECT 
     d.department,
     j.job,
@@ -9,6 +13,7 @@ SELECT
 FROM hr_data.hired_employees e
 JOIN hr_data.departments d ON e.department_id = d.id
 JOIN hr_data.jobs j ON e.job_id = j.id
-WHERE EXTRACT(YEAR FROM e.datetime) = {year}
+WHERE e.datetime >= CAST(:window_start AS TIMESTAMPTZ)
+  AND e.datetime < CAST(:window_end AS TIMESTAMPTZ)
 GROUP BY d.department, j.job
 ORDER BY d.department, j.job;
@@ -0,0 +1,21 @@
+-- Quarterly hiring report grouped by dimension ids; the Lambda attaches the names
+-- @report quarterly_hiring_report
+-- @variant ids
+-- @window
+-- @cache_ttl 300
+-- @attach department_id departments department replace
+-- @attach job_id jobs job replace
+-- @sort department job
+SELECT 
+    e.department_id,
+    e.job_id,
+    SUM(CASE WHEN EXTRACT(QUARTER FROM e.datetime) = 1 THEN 1 ELSE 0 END) AS Q1,
+    SUM(CASE WHEN EXTRACT(QUARTER FROM e.datetime) = 2 THEN 1 ELSE 0 END) AS Q2,
+    SUM(CASE WHEN EXTRACT(QUARTER FROM e.datetime) = 3 THEN 1 ELSE 0 END) AS Q3,
+    SUM(CASE WHEN EXTRACT(QUARTER FROM e.datetime) = 4 THEN 1 ELSE 0 END) AS Q4
+FROM hr_data.hired_employees e
+WHERE e.datetime >= CAST(:window_start AS TIMESTAMPTZ)
+  AND e.datetime < CAST(:window_end AS TIMESTAMPTZ)
+  AND e.department_id IS NOT NULL
+  AND e.job_id IS NOT NULL
+GROUP BY e.department_id, e.job_id;
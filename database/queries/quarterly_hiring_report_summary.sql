@@ -0,0 +1,19 @@
+-- Quarterly hiring report read from the maintained hiring summary
+-- @report quarterly_hiring_report
+-- @variant summary
+-- @window
+-- @cache_ttl 300
+SELECT 
+    d.department,
+    j.job,
+    SUM(CASE WHEN s.quarter = 1 THEN s.hires ELSE 0 END) AS Q1,
+    SUM(CASE WHEN s.quarter = 2 THEN s.hires ELSE 0 END) AS Q2,
+    SUM(CASE WHEN s.quarter = 3 THEN s.hires ELSE 0 END) AS Q3,
+    SUM(CASE WHEN s.quarter = 4 THEN s.hires ELSE 0 END) AS Q4
+FROM hr_data.hiring_summary s
+JOIN hr_data.departments d ON s.department_id = d.id
+JOIN hr_data.jobs j ON s.job_id = j.id
+WHERE s.month_start >= CAST(:window_start AS TIMESTAMPTZ)
+  AND s.month_start < CAST(:window_end AS TIMESTAMPTZ)
+GROUP BY d.department, j.job
+ORDER BY d.department, j.job;
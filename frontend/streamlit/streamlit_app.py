@@ -1,24 +1,278 @@
 import streamlit as st
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ConnectTimeoutError
 import json
 import pandas as pd
 import os
+import random
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 
 # Configuration from environment variables
 DATA_API_URL = os.environ.get('DATA_API_URL', 'https://euvoczmkf2.execute-api.us-east-1.amazonaws.com/Prod')
 BEDROCK_API_URL = os.environ.get('BEDROCK_API_URL', 'https://k86bczfnj3.execute-api.us-east-1.amazonaws.com/Prod')
 
+# Keep-alive connections shared by all sessions on this server, and cache lifetimes
+HTTP_POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', '20'))
+REFERENCE_TTL_SECONDS = int(os.environ.get('REFERENCE_TTL_SECONDS', '600'))
+REPORT_TTL_SECONDS = int(os.environ.get('REPORT_TTL_SECONDS', '300'))
+
+# Employee grid: rows per page and pages each browser session keeps in memory
+GRID_PAGE_SIZE = int(os.environ.get('GRID_PAGE_SIZE', '500'))
+GRID_CACHED_PAGES = 5
+
+# File uploads: rows per /data request, requests in flight, and retries on throttling
+UPLOAD_CHUNK_ROWS = int(os.environ.get('UPLOAD_CHUNK_ROWS', '1000'))
+UPLOAD_MAX_WORKERS = int(os.environ.get('UPLOAD_MAX_WORKERS', '4'))
+UPLOAD_MAX_RETRIES = 5
+# An upsert chunk is idempotent, so it retries server and gateway errors too. An append chunk may
+# have committed before a 5xx, so it only retries 429s and connections that never opened
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+APPEND_RETRYABLE_STATUS = {429}
+
+# The APIs rate limit per caller, which for this app is its own address; calls retry a 429 after its Retry-After
+API_MAX_RETRIES = 4
+MAX_RETRY_DELAY_SECONDS = 30
+
+TABLE_COLUMNS = {
+    'departments': ['id', 'department'],
+    'jobs': ['id', 'job'],
+    'hired_employees': ['id', 'name', 'datetime', 'department_id', 'job_id'],
+}
+
+EMPLOYEE_PAGE_SQL = (
+    "SELECT e.id, e.name, e.datetime, d.department, j.job FROM hr_data.hired_employees e "
+    "LEFT JOIN hr_data.departments d ON e.department_id = d.id LEFT JOIN hr_data.jobs j ON e.job_id = j.id "
+    "WHERE e.id > {after_id} ORDER BY e.id LIMIT {limit}"
+)
+
+@st.cache_resource
+def get_http_session():
+    """One requests.Session per server so API calls reuse TLS connections instead of opening one per click"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=2, pool_maxsize=HTTP_POOL_SIZE)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+def retry_delay(response, retries):
+    """Seconds to wait before retrying: the Retry-After header, else jittered exponential backoff"""
+    retry_after = response.headers.get('Retry-After') if response is not None else None
+    try:
+        delay = float(retry_after) * random.uniform(1.0, 1.25)
+    except (TypeError, ValueError):
+        delay = min(0.5 * 2 ** retries, 8) * random.uniform(0.5, 1.5)
+    return min(delay, MAX_RETRY_DELAY_SECONDS)
+
+def api_request(method, url, session=None, **kwargs):
+    """Call an API, retrying 429s (nothing ran, so retrying is always safe)
+    
+    Off the Streamlit script thread (prefetch and upload pools) pass the session explicitly.
+    """
+    session = session or get_http_session()
+    retries = 0
+    while True:
+        response = session.request(method, url, **kwargs)
+        if response.status_code != 429 or retries == API_MAX_RETRIES:
+            return response
+        time.sleep(retry_delay(response, retries))
+        retries += 1
+
 def execute_sql(sql_query):
     """Execute SQL query via API"""
-    return requests.post(f"{DATA_API_URL}/sql", json={"sql": sql_query})
+    return api_request('POST', f"{DATA_API_URL}/sql", json={"sql": sql_query})
 
 def insert_data(table, data):
     """Insert data via API"""
-    return requests.post(f"{DATA_API_URL}/data/{table}", json={"data": data})
+    return api_request('POST', f"{DATA_API_URL}/data/{table}", json={"data": data})
 
 def ask_bedrock(question):
     """Ask Bedrock AI a question"""
-    return requests.post(f"{BEDROCK_API_URL}/ask", json={"question": question})
+    return api_request('POST', f"{BEDROCK_API_URL}/ask", json={"question": question})
+
+@st.cache_data(ttl=REFERENCE_TTL_SECONDS, show_spinner=False)
+def fetch_reference_table(table):
+    """Rows of a small, rarely changing table (departments, jobs), cached across reruns"""
+    response = execute_sql(f"SELECT * FROM hr_data.{table}")
+    response.raise_for_status()
+    return response.json()
+
+@st.cache_data(ttl=REPORT_TTL_SECONDS, show_spinner=False)
+def fetch_report(report, year):
+    """Report result, cached across reruns and users"""
+    response = api_request('GET', f"{DATA_API_URL}/reports/{report}/{year}")
+    response.raise_for_status()
+    return response.json()
+
+@st.cache_data(ttl=60, show_spinner=False)
+def count_employees():
+    """Total hired_employees rows for the grid header"""
+    response = execute_sql("SELECT COUNT(*) AS total FROM hr_data.hired_employees")
+    response.raise_for_status()
+    return response.json()['rows'][0][0]
+
+@st.cache_resource
+def get_prefetch_pool():
+    return ThreadPoolExecutor(max_workers=4)
+
+def fetch_employee_page(session, after_id):
+    """One keyset page: the GRID_PAGE_SIZE employees with id greater than after_id
+    
+    Runs on the prefetch pool, so it takes the session rather than touching Streamlit state.
+    """
+    sql = EMPLOYEE_PAGE_SQL.format(after_id=int(after_id), limit=GRID_PAGE_SIZE)
+    response = api_request('POST', f"{DATA_API_URL}/sql", session, json={"sql": sql})
+    response.raise_for_status()
+    return response.json()
+
+def employee_page(after_id):
+    """Future for a page, from this session's page cache (at most GRID_CACHED_PAGES pages)"""
+    pages = st.session_state.setdefault('grid_pages', OrderedDict())
+    if after_id not in pages:
+        pages[after_id] = get_prefetch_pool().submit(fetch_employee_page, get_http_session(), after_id)
+    pages.move_to_end(after_id)
+    while len(pages) > GRID_CACHED_PAGES:
+        pages.popitem(last=False)
+    return pages[after_id]
+
+def show_employee_grid():
+    """Page through hired_employees by id, prefetching the next page while this one is read"""
+    cursors = st.session_state.grid_cursors
+    
+    def next_page(last_id):
+        cursors.append(last_id)
+    
+    def previous_page():
+        cursors.pop()
+    
+    try:
+        data = employee_page(cursors[-1]).result()
+    except requests.HTTPError as e:
+        st.session_state.grid_pages.pop(cursors[-1], None)
+        st.error(f"Error: {e.response.status_code} - {e.response.text}")
+        return
+    
+    rows = data['rows']
+    has_next = len(rows) == GRID_PAGE_SIZE
+    if has_next:
+        employee_page(rows[-1][0])
+    
+    try:
+        total = f"{count_employees():,}"
+    except requests.HTTPError:
+        total = "?"
+    
+    first = (len(cursors) - 1) * GRID_PAGE_SIZE
+    st.caption(f"Page {len(cursors)} · rows {first + 1:,}–{first + len(rows):,} of {total}")
+    st.dataframe(pd.DataFrame(rows, columns=data['columns']), use_container_width=True)
+    
+    prev_col, next_col = st.columns(2)
+    with prev_col:
+        st.button("◀ Previous", on_click=previous_page, disabled=len(cursors) == 1, key="grid_prev")
+    with next_col:
+        st.button("Next ▶", on_click=next_page, args=(rows[-1][0] if rows else 0,), disabled=not has_next, key="grid_next")
+
+def iter_upload_chunks(uploaded_file, columns):
+    """Yield lists of row dicts of at most UPLOAD_CHUNK_ROWS from a CSV or Parquet upload
+    
+    CSV is read with pandas in chunks and Parquet batch by batch with pyarrow, so
+    the whole file is never materialized as one DataFrame.
+    """
+    if uploaded_file.name.lower().endswith('.parquet'):
+        import pyarrow.parquet as pq
+        frames = (batch.to_pandas() for batch in pq.ParquetFile(uploaded_file).iter_batches(batch_size=UPLOAD_CHUNK_ROWS))
+    else:
+        frames = pd.read_csv(uploaded_file, chunksize=UPLOAD_CHUNK_ROWS)
+    
+    for frame in frames:
+        missing = [col for col in columns if col not in frame.columns and col != 'datetime']
+        if missing:
+            raise ValueError(f"File is missing columns: {', '.join(missing)}")
+        # convert_dtypes keeps integer ids integral when a column has blanks (instead of 1.0)
+        frame = frame[[col for col in columns if col in frame.columns]].convert_dtypes().astype(object)
+        yield frame.where(pd.notnull(frame), None).to_dict('records')
+
+def count_upload_rows(uploaded_file):
+    """Row count for the progress bar: Parquet metadata, or newlines for CSV (an estimate)"""
+    if uploaded_file.name.lower().endswith('.parquet'):
+        import pyarrow.parquet as pq
+        rows = pq.ParquetFile(uploaded_file).metadata.num_rows
+    else:
+        rows = uploaded_file.getvalue().count(b'\n') - 1
+    uploaded_file.seek(0)
+    return max(rows, 1)
+
+def never_sent(error):
+    """Whether a request failed while connecting, before any of it reached the API"""
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    # NewConnectionError (refused, DNS) is a ConnectTimeoutError too
+    return isinstance(reason, ConnectTimeoutError)
+
+def post_chunk(session, table, mode, rows):
+    """POST one chunk to /data, retrying what cannot duplicate rows with jittered backoff
+    
+    Upserts retry throttling and gateway errors. Appends only retry throttling and
+    failed connections, since a 5xx or a dropped response may follow a commit.
+    """
+    body = json.dumps({"data": rows, "mode": mode}, default=str)
+    retry_status = RETRYABLE_STATUS if mode == 'upsert' else APPEND_RETRYABLE_STATUS
+    retries = 0
+    while True:
+        response = None
+        try:
+            response = session.post(f"{DATA_API_URL}/data/{table}", data=body,
+                                    headers={"Content-Type": "application/json"})
+            if response.status_code == 200:
+                return {"rows": len(rows), "retries": retries, "error": None}
+            error = f"{response.status_code}: {response.text[:200]}"
+            retryable = response.status_code in retry_status
+        except requests.ConnectionError as e:
+            error, retryable = str(e), mode == 'upsert' or never_sent(e)
+        
+        if not retryable or retries == UPLOAD_MAX_RETRIES:
+            return {"rows": len(rows), "retries": retries, "error": error, "first_id": rows[0].get("id")}
+        time.sleep(retry_delay(response, retries))
+        retries += 1
+
+def upload_file(uploaded_file, table, mode, progress):
+    """Send an upload to /data in parallel chunks, keeping at most twice the pool size in memory"""
+    session = get_http_session()
+    total_rows = count_upload_rows(uploaded_file)
+    results = []
+    started = time.time()
+    
+    def record(done):
+        for future in done:
+            results.append(future.result())
+        sent = sum(r["rows"] for r in results)
+        progress.progress(min(sent / total_rows, 1.0), text=f"{sent:,} of ~{total_rows:,} rows")
+    
+    with ThreadPoolExecutor(max_workers=UPLOAD_MAX_WORKERS) as pool:
+        in_flight = set()
+        for rows in iter_upload_chunks(uploaded_file, TABLE_COLUMNS[table]):
+            if len(in_flight) >= UPLOAD_MAX_WORKERS * 2:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                record(done)
+            in_flight.add(pool.submit(post_chunk, session, table, mode, rows))
+        record(wait(in_flight).done)
+    
+    elapsed = time.time() - started
+    loaded = sum(r["rows"] for r in results if r["error"] is None)
+    return {
+        "loaded_rows": loaded,
+        "chunks": len(results),
+        "failed": [r for r in results if r["error"] is not None],
+        "retries": sum(r["retries"] for r in results),
+        "elapsed_seconds": elapsed,
+        "rows_per_second": loaded / elapsed if elapsed else 0.0,
+    }
+
+def invalidate_cached_data():
+    """Drop cached tables, reports and grid pages after a write so the next view is fresh"""
+    st.cache_data.clear()
+    st.session_state.pop('grid_pages', None)
 
 def query_data_page():
     """Query Data page"""
@@ -29,33 +283,28 @@ def query_data_page():
     
     with col1:
         if st.button("Show All Departments"):
-            response = execute_sql("SELECT * FROM hr_data.departments")
-            if response.status_code == 200:
-                data = response.json()
+            try:
+                data = fetch_reference_table("departments")
                 df = pd.DataFrame(data['rows'], columns=data['columns'])
                 st.dataframe(df, use_container_width=True)
-            else:
-                st.error(f"Error: {response.status_code} - {response.text}")
+            except requests.HTTPError as e:
+                st.error(f"Error: {e.response.status_code} - {e.response.text}")
     
     with col2:
         if st.button("Show All Jobs"):
-            response = execute_sql("SELECT * FROM hr_data.jobs")
-            if response.status_code == 200:
-                data = response.json()
+            try:
+                data = fetch_reference_table("jobs")
                 df = pd.DataFrame(data['rows'], columns=data['columns'])
                 st.dataframe(df, use_container_width=True)
-            else:
-                st.error(f"Error: {response.status_code} - {response.text}")
+            except requests.HTTPError as e:
+                st.error(f"Error: {e.response.status_code} - {e.response.text}")
     
     with col3:
         if st.button("Show All Employees"):
-            response = execute_sql("SELECT e.id, e.name, e.datetime, d.department, j.job FROM hr_data.hired_employees e LEFT JOIN hr_data.departments d ON e.department_id = d.id LEFT JOIN hr_data.jobs j ON e.job_id = j.id")
-            if response.status_code == 200:
-                data = response.json()
-                df = pd.DataFrame(data['rows'], columns=data['columns'])
-                st.dataframe(df, use_container_width=True)
-            else:
-                st.error(f"Error: {response.status_code} - {response.text}")
+            st.session_state.grid_cursors = [0]
+    
+    if 'grid_cursors' in st.session_state:
+        show_employee_grid()
     
     # Custom SQL
     st.subheader("Custom SQL Query")
@@ -84,7 +333,7 @@ def insert_data_page():
     st.header("📝 Insert New Data")
     
     # Batch insert option
-    insert_mode = st.radio("Insert Mode:", ["Single Record", "Batch Insert (up to 1000 records)"])
+    insert_mode = st.radio("Insert Mode:", ["Single Record", "Batch Insert (up to 1000 records)", "File Upload (CSV/Parquet)"])
     
     table_type = st.selectbox("Select table:", ["departments", "jobs", "hired_employees"])
     
@@ -99,6 +348,7 @@ def insert_data_page():
                     data = [{"id": int(dept_id), "department": dept_name}]
                     response = insert_data("departments", data)
                     if response.status_code == 200:
+                        invalidate_cached_data()
                         st.success("Department added successfully!")
                     else:
                         st.error(f"Error: {response.text}")
@@ -113,6 +363,7 @@ def insert_data_page():
                     data = [{"id": int(job_id), "job": job_name}]
                     response = insert_data("jobs", data)
                     if response.status_code == 200:
+                        invalidate_cached_data()
                         st.success("Job added successfully!")
                     else:
                         st.error(f"Error: {response.text}")
@@ -134,10 +385,35 @@ def insert_data_page():
                     }]
                     response = insert_data("hired_employees", data)
                     if response.status_code == 200:
+                        invalidate_cached_data()
                         st.success("Employee added successfully!")
                     else:
                         st.error(f"Error: {response.text}")
     
+    elif insert_mode == "File Upload (CSV/Parquet)":
+        st.subheader(f"File Upload - {table_type.title()}")
+        st.info(f"Columns: {', '.join(TABLE_COLUMNS[table_type])}. Rows are sent in chunks of {UPLOAD_CHUNK_ROWS:,}, {UPLOAD_MAX_WORKERS} at a time.")
+        uploaded_file = st.file_uploader("CSV or Parquet file", type=["csv", "parquet"])
+        mode = st.selectbox("Mode:", ["upsert", "append"],
+                            help="upsert replaces rows with the same id, so a retried chunk never creates duplicates")
+        
+        if uploaded_file is not None and st.button("Upload File"):
+            progress = st.progress(0.0, text="Starting upload...")
+            try:
+                summary = upload_file(uploaded_file, table_type, mode, progress)
+            except (ValueError, pd.errors.ParserError) as e:
+                st.error(f"Could not read file: {str(e)}")
+            else:
+                if summary["loaded_rows"]:
+                    invalidate_cached_data()
+                st.success(
+                    f"Loaded {summary['loaded_rows']:,} rows in {summary['chunks']} chunks, "
+                    f"{summary['elapsed_seconds']:.1f}s ({summary['rows_per_second']:,.0f} rows/s, {summary['retries']} retries)"
+                )
+                if summary["failed"]:
+                    st.error(f"{len(summary['failed'])} chunks failed")
+                    st.dataframe(pd.DataFrame(summary["failed"]), use_container_width=True)
+    
     else:  # Batch Insert
         st.subheader(f"Batch Insert - {table_type.title()}")
         st.info("Enter JSON array with 1-1000 records. Duplicates will be prevented by primary key constraints.")
@@ -181,6 +457,7 @@ def insert_data_page():
                 else:
                     response = insert_data(table_type, data)
                     if response.status_code == 200:
+                        invalidate_cached_data()
                         st.success(f"Successfully inserted {len(data)} records!")
                     else:
                         st.error(f"Error: {response.text}")
@@ -202,32 +479,64 @@ def backup_restore_page():
         
         if st.button("Create AVRO Backup"):
             with st.spinner(f"Creating backup for {backup_table}..."):
-                response = requests.post(f"{DATA_API_URL}/backup/{backup_table}")
+                response = api_request('POST', f"{DATA_API_URL}/backup/{backup_table}")
                 
                 if response.status_code == 200:
                     result = response.json()
                     st.success(f"✅ Backup created successfully!")
-                    st.info(f"📁 Backup key: `{result['backup_key']}`")
-                    st.code(f"s3://{result['backup_key']}")
+                    # Restores take the manifest key; backup_key is only this backup's own data files
+                    st.info(f"📁 Restore key: `{result['manifest_key']}`")
+                    st.code(result['manifest_key'])
+                    st.caption(f"{result['mode'].capitalize()} backup of {result['rows']} rows, data at s3://{result['backup_key']}")
                 else:
                     st.error(f"❌ Backup failed: {response.text}")
     
     with col2:
         st.subheader("Restore from Backup")
         restore_table = st.selectbox("Select table to restore:", ["departments", "jobs", "hired_employees"], key="restore_table")
-        backup_key = st.text_input("Backup Key:", placeholder="backups/departments/2024-01-01T12:00:00.avro")
+        
+        backup_key = None
+        source = st.radio("Restore from:", ["Backup catalog", "Point in time", "Backup key"], horizontal=True)
+        if source == "Backup catalog":
+            response = api_request('GET', f"{DATA_API_URL}/backups/{restore_table}")
+            entries = response.json().get('entries', []) if response.status_code == 200 else []
+            if entries:
+                entry = st.selectbox(
+                    "Backup:",
+                    entries[::-1],
+                    format_func=lambda e: f"{e['created_at']} · {e['mode']} · {e['rows']} rows · {e['codec']} · {e['size_bytes'] / 1024:.1f} KiB"
+                )
+                backup_key = entry['key']
+            else:
+                st.info(f"No catalogued backups for {restore_table}")
+        elif source == "Point in time":
+            as_of_date = st.date_input("As of date:")
+            as_of_time = st.time_input("As of time (UTC):")
+            response = api_request(
+                'GET', f"{DATA_API_URL}/backups/{restore_table}",
+                params={"as_of": f"{as_of_date.isoformat()}T{as_of_time.isoformat()}"}
+            )
+            if response.status_code == 200:
+                entry = response.json()['backup']
+                st.caption(f"Newest backup at that time: {entry['created_at']} ({entry['rows']} rows)")
+                backup_key = entry['key']
+            else:
+                st.warning(response.json().get('error', response.text))
+        else:
+            backup_key = st.text_input("Backup Key:", placeholder="backups/departments/2024-01-01T12:00:00.manifest.json")
         
         if st.button("Restore from Backup"):
             if not backup_key:
-                st.error("Please enter a backup key")
+                st.error("Please choose a backup")
             else:
                 with st.spinner(f"Restoring {restore_table} from backup..."):
-                    response = requests.post(
-                        f"{DATA_API_URL}/restore/{restore_table}",
+                    response = api_request(
+                        'POST', f"{DATA_API_URL}/restore/{restore_table}",
                         json={"backup_key": backup_key}
                     )
                     
                     if response.status_code == 200:
+                        invalidate_cached_data()
                         st.success(f"✅ Table {restore_table} restored successfully!")
                     else:
                         st.error(f"❌ Restore failed: {response.text}")
@@ -243,9 +552,8 @@ def hr_reports_page():
         year_q = st.selectbox("Select Year:", [2020, 2021, 2022, 2023, 2024], index=1, key="year_q")
         
         if st.button("Generate Quarterly Report"):
-            response = requests.get(f"{DATA_API_URL}/reports/quarterly_hiring_report/{year_q}")
-            if response.status_code == 200:
-                data = response.json()
+            try:
+                data = fetch_report("quarterly_hiring_report", year_q)
                 if data['rows']:
                     st.markdown(f"### Quarterly Hiring Report - {year_q}")
                     df = pd.DataFrame(data['rows'], columns=data['columns'])
@@ -253,17 +561,16 @@ def hr_reports_page():
                     st.info(f"Total records: {len(data['rows'])}")
                 else:
                     st.warning(f"No hiring data found for {year_q}")
-            else:
-                st.error(f"Error: {response.text}")
+            except requests.HTTPError as e:
+                st.error(f"Error: {e.response.text}")
     
     with col2:
         st.subheader("Departments Above Average Hiring")
         year_d = st.selectbox("Select Year:", [2020, 2021, 2022, 2023, 2024], index=1, key="year_d")
         
         if st.button("Generate Department Report"):
-            response = requests.get(f"{DATA_API_URL}/reports/departments_above_avg_hiring/{year_d}")
-            if response.status_code == 200:
-                data = response.json()
+            try:
+                data = fetch_report("departments_above_avg_hiring", year_d)
                 if data['rows']:
                     st.markdown(f"### Departments Above Average Hiring - {year_d}")
                     df = pd.DataFrame(data['rows'], columns=data['columns'])
@@ -271,8 +578,8 @@ def hr_reports_page():
                     st.info(f"Total departments above average: {len(data['rows'])}")
                 else:
                     st.warning(f"No departments above average for {year_d}")
-            else:
-                st.error(f"Error: {response.text}")
+            except requests.HTTPError as e:
+                st.error(f"Error: {e.response.text}")
 
 def ask_ai_page():
     """Ask AI page"""
@@ -0,0 +1,455 @@
+"""Admission control for the statements the Lambdas submit to Redshift.
+
+Every statement belongs to a workload class: report, ingest, adhoc or ai. It
+must hold one of its class's slots, and one of the global slots, from submit
+until Redshift finishes it. When no slot is free the statement waits, and
+freed slots go to the waiting statement with the best priority (then the
+oldest) whose class still has room, so a burst of ad-hoc SQL queues behind
+reports instead of filling the WLM queues ahead of them. A statement that
+waits longer than the timeout is rejected.
+
+Callers are also rate limited with a token bucket per (caller, class). A
+request takes one token when it arrives, so a restore that runs hundreds of
+statements is never cut off halfway. The caller is the identity the API
+Gateway authorizer vouched for (the Cognito subject, or a custom authorizer's
+principal), else the source IP. Nothing a client sends itself, such as a header
+it could rotate on every request, picks its bucket, so every Streamlit user
+shares the budget of the frontend's address.
+
+Slots, waiters and buckets live in an AdmissionStore. A Lambda container runs
+one invocation at a time, so limits only hold across a burst when every
+container sees the same state: DynamoDBStore keeps it in a DynamoDB table, and
+is what the deployed functions use. MemoryStore keeps state in one process and
+SQLiteStore in a database file shared by the processes on one host, which is
+what local testing uses. Slots and waiters carry a lease, so an entry left
+behind by a crashed process expires instead of holding capacity forever.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from botocore.exceptions import ClientError
+
+WORKLOAD_CLASSES = ('report', 'ingest', 'adhoc', 'ai')
+
+DEFAULT_LIMITS = {'report': 8, 'ingest': 4, 'adhoc': 2, 'ai': 2}
+# Lower runs first
+DEFAULT_PRIORITIES = {'report': 0, 'ingest': 1, 'ai': 2, 'adhoc': 3}
+# Tokens per second and bucket size
+DEFAULT_RATES = {'report': (10.0, 50.0), 'ingest': (5.0, 20.0), 'adhoc': (2.0, 10.0), 'ai': (0.5, 3.0)}
+
+# A waiter that has not polled for this long is treated as gone
+WAITER_TTL_SECONDS = 5.0
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is over its rate limit or a statement waited too long for a slot"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def parse_settings(text: str, parse: Callable[[str], object], defaults: Dict[str, object]) -> Dict[str, object]:
+    """Parse 'report=8,adhoc=2' into per-class values on top of the defaults"""
+    settings = dict(defaults)
+    for item in filter(None, (part.strip() for part in (text or '').split(','))):
+        workload, _, value = item.partition('=')
+        workload = workload.strip()
+        if workload not in WORKLOAD_CLASSES:
+            raise ValueError(f"Unknown workload class: {workload}")
+        settings[workload] = parse(value.strip())
+    return settings
+
+
+def parse_rate(text: str) -> Tuple[float, float]:
+    """'2/10' is 2 tokens per second with a bucket of 10"""
+    rate, _, burst = text.partition('/')
+    return float(rate), float(burst or rate)
+
+
+def first_eligible(waiters: Iterable[Tuple[str, str, int, int]], in_flight: Dict[str, int],
+                   limits: Dict[str, int], total_limit: int) -> Optional[str]:
+    """The waiting ticket that gets the next slot, if any slot is free
+
+    waiters are (ticket, workload, priority, sequence) tuples.
+    """
+    if sum(in_flight.values()) >= total_limit:
+        return None
+    for ticket, workload, _, _ in sorted(waiters, key=lambda waiter: (waiter[2], waiter[3])):
+        if in_flight.get(workload, 0) < limits[workload]:
+            return ticket
+    return None
+
+
+def refill(tokens: float, updated_at: float, rate: float, burst: float, now: float) -> float:
+    return min(burst, tokens + max(0.0, now - updated_at) * rate)
+
+
+class AdmissionStore(ABC):
+    """Shared admission state: running slots, waiting tickets and token buckets"""
+
+    @abstractmethod
+    def try_admit(self, ticket: str, workload: str, priority: int, sequence: int, limits: Dict[str, int],
+                  total_limit: int, now: float, lease_seconds: float) -> bool:
+        """Queue the ticket if it is new and admit it when it is next in line"""
+
+    @abstractmethod
+    def release(self, ticket: str):
+        """Free a running slot, or drop a waiting ticket that gave up"""
+
+    @abstractmethod
+    def take_token(self, key: str, rate: float, burst: float, now: float) -> float:
+        """Take one token; return 0, or the seconds until a token is available"""
+
+    @abstractmethod
+    def in_flight(self, now: float) -> Dict[str, int]:
+        """Running statements per workload class"""
+
+    def wait(self, timeout: float):
+        """Block until admission state may have changed"""
+        time.sleep(timeout)
+
+
+class MemoryStore(AdmissionStore):
+    """State for one process; waiters are woken as soon as a slot is released"""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._running: Dict[str, Tuple[str, float]] = {}
+        self._waiting: Dict[str, Tuple[str, int, int, float]] = {}
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+
+    def _counts(self, now: float) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for workload, expires_at in self._running.values():
+            if expires_at > now:
+                counts[workload] = counts.get(workload, 0) + 1
+        return counts
+
+    def try_admit(self, ticket, workload, priority, sequence, limits, total_limit, now, lease_seconds):
+        with self._condition:
+            self._waiting[ticket] = (workload, priority, sequence, now + WAITER_TTL_SECONDS)
+            waiters = [
+                (waiting, entry[0], entry[1], entry[2])
+                for waiting, entry in self._waiting.items() if entry[3] > now
+            ]
+            if first_eligible(waiters, self._counts(now), limits, total_limit) != ticket:
+                return False
+            del self._waiting[ticket]
+            self._running[ticket] = (workload, now + lease_seconds)
+            # Another waiter may be next in line for a different class
+            self._condition.notify_all()
+            return True
+
+    def release(self, ticket):
+        with self._condition:
+            self._running.pop(ticket, None)
+            self._waiting.pop(ticket, None)
+            self._condition.notify_all()
+
+    def take_token(self, key, rate, burst, now):
+        with self._condition:
+            tokens, updated_at = self._buckets.get(key, (burst, now))
+            tokens = refill(tokens, updated_at, rate, burst, now)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                return 0.0
+            self._buckets[key] = (tokens, now)
+            return (1 - tokens) / rate if rate > 0 else float('inf')
+
+    def in_flight(self, now):
+        with self._condition:
+            return self._counts(now)
+
+    def wait(self, timeout):
+        with self._condition:
+            self._condition.wait(timeout)
+
+
+class SQLiteStore(AdmissionStore):
+    """State in a SQLite file, shared by every process that opens the same path"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS running (ticket TEXT PRIMARY KEY, workload TEXT, expires_at REAL);
+            CREATE TABLE IF NOT EXISTS waiting (ticket TEXT PRIMARY KEY, workload TEXT, priority INTEGER,
+                                                sequence INTEGER, expires_at REAL);
+            CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL, updated_at REAL);
+        """)
+
+    def _transaction(self, work):
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                result = work(self._conn)
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._conn.execute('COMMIT')
+            return result
+
+    @staticmethod
+    def _counts(conn, now) -> Dict[str, int]:
+        return dict(conn.execute(
+            'SELECT workload, COUNT(*) FROM running WHERE expires_at > ? GROUP BY workload', (now,)
+        ).fetchall())
+
+    def try_admit(self, ticket, workload, priority, sequence, limits, total_limit, now, lease_seconds):
+        def admit(conn):
+            conn.execute('DELETE FROM running WHERE expires_at <= ?', (now,))
+            conn.execute('DELETE FROM waiting WHERE expires_at <= ?', (now,))
+            conn.execute(
+                'INSERT OR REPLACE INTO waiting VALUES (?, ?, ?, ?, ?)',
+                (ticket, workload, priority, sequence, now + WAITER_TTL_SECONDS)
+            )
+            waiters = conn.execute('SELECT ticket, workload, priority, sequence FROM waiting').fetchall()
+            if first_eligible(waiters, self._counts(conn, now), limits, total_limit) != ticket:
+                return False
+            conn.execute('DELETE FROM waiting WHERE ticket = ?', (ticket,))
+            conn.execute('INSERT INTO running VALUES (?, ?, ?)', (ticket, workload, now + lease_seconds))
+            return True
+
+        return self._transaction(admit)
+
+    def release(self, ticket):
+        def release(conn):
+            conn.execute('DELETE FROM running WHERE ticket = ?', (ticket,))
+            conn.execute('DELETE FROM waiting WHERE ticket = ?', (ticket,))
+
+        self._transaction(release)
+
+    def take_token(self, key, rate, burst, now):
+        def take(conn):
+            row = conn.execute('SELECT tokens, updated_at FROM buckets WHERE key = ?', (key,)).fetchone()
+            tokens = refill(*(row or (burst, now)), rate, burst, now)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / rate if rate > 0 else float('inf')
+            conn.execute('INSERT OR REPLACE INTO buckets VALUES (?, ?, ?)', (key, tokens, now))
+            return wait
+
+        return self._transaction(take)
+
+    def in_flight(self, now):
+        return self._transaction(lambda conn: self._counts(conn, now))
+
+
+class DynamoDBStore(AdmissionStore):
+    """State in a DynamoDB table (string partition key ``pk``), shared by every container
+
+    Running and waiting tickets are one item, so admitting a ticket is a single
+    read-modify-write guarded by a version number; a write that loses a race is
+    retried on the fresh state. Each token bucket is its own item, with a ``ttl``
+    attribute so idle callers' buckets are swept by DynamoDB's TTL.
+    """
+
+    SLOTS_KEY = 'admission#slots'
+    MAX_ATTEMPTS = 20
+
+    def __init__(self, table: str, client: Callable[[], Any] = None):
+        self.table = table
+        self._client = client
+
+    def client(self):
+        if self._client is None:
+            import boto3
+            client = boto3.client('dynamodb')
+            self._client = lambda: client
+        return self._client()
+
+    def _update(self, pk: str, change: Callable[[Dict], Tuple[Any, Optional[Dict]]], ttl: float = None):
+        """Apply ``change`` to the item's state; it returns (result, new state or None to leave it)"""
+        client = self.client()
+        for _ in range(self.MAX_ATTEMPTS):
+            item = client.get_item(TableName=self.table, Key={'pk': {'S': pk}}, ConsistentRead=True).get('Item')
+            version = int(item['version']['N']) if item else 0
+            result, state = change(json.loads(item['state']['S']) if item else {})
+            if state is None:
+                return result
+            new_item = {'pk': {'S': pk}, 'state': {'S': json.dumps(state)}, 'version': {'N': str(version + 1)}}
+            if ttl is not None:
+                new_item['ttl'] = {'N': str(int(ttl))}
+            try:
+                client.put_item(
+                    TableName=self.table, Item=new_item,
+                    ConditionExpression='attribute_not_exists(pk) OR version = :version',
+                    ExpressionAttributeValues={':version': {'N': str(version)}},
+                )
+                return result
+            except ClientError as e:
+                if e.response.get('Error', {}).get('Code') != 'ConditionalCheckFailedException':
+                    raise
+        raise AdmissionRejected("Admission state is too contended", retry_after=1.0)
+
+    @staticmethod
+    def _live(state: Dict, now: float) -> Dict:
+        return {
+            'running': {t: entry for t, entry in state.get('running', {}).items() if entry[1] > now},
+            'waiting': {t: entry for t, entry in state.get('waiting', {}).items() if entry[3] > now},
+        }
+
+    @staticmethod
+    def _counts(state: Dict) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for workload, _ in state['running'].values():
+            counts[workload] = counts.get(workload, 0) + 1
+        return counts
+
+    def try_admit(self, ticket, workload, priority, sequence, limits, total_limit, now, lease_seconds):
+        def admit(state):
+            live = self._live(state, now)
+            entry = live['waiting'].get(ticket)
+            live['waiting'][ticket] = [workload, priority, sequence, now + WAITER_TTL_SECONDS]
+            waiters = [(t, w[0], w[1], w[2]) for t, w in live['waiting'].items()]
+            if first_eligible(waiters, self._counts(live), limits, total_limit) != ticket:
+                # Only rewrite the queue to add the ticket or keep it from expiring
+                fresh = entry is not None and entry[3] - now > WAITER_TTL_SECONDS / 2
+                return False, None if fresh else live
+            del live['waiting'][ticket]
+            live['running'][ticket] = [workload, now + lease_seconds]
+            return True, live
+
+        return self._update(self.SLOTS_KEY, admit)
+
+    def release(self, ticket):
+        def release(state):
+            if ticket not in state.get('running', {}) and ticket not in state.get('waiting', {}):
+                return None, None
+            state.get('running', {}).pop(ticket, None)
+            state.get('waiting', {}).pop(ticket, None)
+            return None, state
+
+        self._update(self.SLOTS_KEY, release)
+
+    def take_token(self, key, rate, burst, now):
+        def take(state):
+            tokens = refill(state.get('tokens', burst), state.get('updated_at', now), rate, burst, now)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / rate if rate > 0 else float('inf')
+            return wait, {'tokens': tokens, 'updated_at': now}
+
+        # A bucket left alone this long has refilled, so dropping it changes nothing
+        ttl = now + (burst / rate if rate > 0 else 0) + 3600
+        return self._update(f"admission#bucket#{key}", take, ttl=ttl)
+
+    def in_flight(self, now):
+        item = self.client().get_item(TableName=self.table, Key={'pk': {'S': self.SLOTS_KEY}},
+                                      ConsistentRead=True).get('Item')
+        return self._counts(self._live(json.loads(item['state']['S']) if item else {}, now))
+
+
+def make_store(spec: str, client: Callable[[], Any] = None) -> AdmissionStore:
+    """'memory', 'sqlite:/path/to/file.db' or 'dynamodb:TableName'
+
+    ``client`` returns the dynamodb client a DynamoDBStore uses.
+    """
+    if not spec or spec == 'memory':
+        return MemoryStore()
+    if spec.startswith('sqlite:'):
+        return SQLiteStore(spec[len('sqlite:'):])
+    if spec.startswith('dynamodb:'):
+        return DynamoDBStore(spec[len('dynamodb:'):], client)
+    raise ValueError(f"Unknown admission store: {spec}")
+
+
+class AdmissionController:
+    """Per-class concurrency slots with priority queueing, and per-caller rate limits"""
+
+    def __init__(self, store: AdmissionStore, limits: Dict[str, int] = None, priorities: Dict[str, int] = None,
+                 rates: Dict[str, Tuple[float, float]] = None, total_limit: int = None,
+                 timeout_seconds: float = 30.0, lease_seconds: float = 900.0, poll_seconds: float = 0.05,
+                 clock: Callable[[], float] = time.time):
+        self.store = store
+        self.limits = dict(limits or DEFAULT_LIMITS)
+        self.priorities = dict(priorities or DEFAULT_PRIORITIES)
+        self.rates = dict(rates or DEFAULT_RATES)
+        self.total_limit = total_limit or sum(self.limits.values())
+        self.timeout_seconds = timeout_seconds
+        self.lease_seconds = lease_seconds
+        self.poll_seconds = poll_seconds
+        self.clock = clock
+
+    def acquire(self, workload: str) -> str:
+        """Wait for a slot for one statement and return its ticket"""
+        if workload not in self.limits:
+            raise ValueError(f"Unknown workload class: {workload}")
+        ticket = uuid.uuid4().hex
+        sequence = time.monotonic_ns()
+        started = self.clock()
+        while not self.store.try_admit(ticket, workload, self.priorities[workload], sequence, self.limits,
+                                       self.total_limit, self.clock(), self.lease_seconds):
+            if self.clock() - started >= self.timeout_seconds:
+                self.store.release(ticket)
+                raise AdmissionRejected(
+                    f"Too many {workload} statements in flight; waited {self.timeout_seconds:g}s for a slot",
+                    retry_after=self.poll_seconds * 20
+                )
+            self.store.wait(self.poll_seconds)
+        return ticket
+
+    def release(self, ticket: str):
+        self.store.release(ticket)
+
+    @contextmanager
+    def slot(self, workload: str, metrics=None):
+        """Hold a slot for the block; the wait is timed as the queue phase of ``metrics``"""
+        if metrics is None:
+            ticket = self.acquire(workload)
+        else:
+            with metrics.phase('queue'):
+                ticket = self.acquire(workload)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def check_rate(self, caller: str, workload: str):
+        """Charge the caller one token for a request of this class"""
+        rate, burst = self.rates[workload]
+        wait = self.store.take_token(f"{caller}:{workload}", rate, burst, self.clock())
+        if wait > 0:
+            raise AdmissionRejected(f"Rate limit exceeded for {workload} requests", retry_after=wait)
+
+    def in_flight(self) -> Dict[str, int]:
+        return self.store.in_flight(self.clock())
+
+
+def from_environment(client: Callable[[], Any] = None) -> AdmissionController:
+    """Build the controller from the ADMISSION_* environment variables"""
+    return AdmissionController(
+        make_store(os.environ.get('ADMISSION_STORE', 'memory'), client),
+        limits=parse_settings(os.environ.get('ADMISSION_LIMITS', ''), int, DEFAULT_LIMITS),
+        priorities=parse_settings(os.environ.get('ADMISSION_PRIORITIES', ''), int, DEFAULT_PRIORITIES),
+        rates=parse_settings(os.environ.get('ADMISSION_RATES', ''), parse_rate, DEFAULT_RATES),
+        total_limit=int(os.environ.get('ADMISSION_MAX_CONCURRENCY', '0')) or None,
+        timeout_seconds=float(os.environ.get('ADMISSION_TIMEOUT_SECONDS', '30')),
+        lease_seconds=float(os.environ.get('ADMISSION_LEASE_SECONDS', '900')),
+        poll_seconds=float(os.environ.get('ADMISSION_POLL_SECONDS', '0.05')),
+    )
+
+
+def caller_id(event: Dict) -> str:
+    """Who is calling: the authorizer's Cognito subject or principal, else the source IP"""
+    context = event.get('requestContext') or {}
+    authorizer = context.get('authorizer') or {}
+    claims = authorizer.get('claims') or {}
+    if claims.get('sub'):
+        return claims['sub']
+    if authorizer.get('principalId'):
+        return f"principal:{authorizer['principalId']}"
+    return (context.get('identity') or {}).get('sourceIp') or 'anonymous'
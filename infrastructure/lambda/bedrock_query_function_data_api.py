@@ -3,6 +3,15 @@ import os
 import boto3
 import time
 from typing import Dict, Any
+import admission
+import cost_guard
+import hiring_summary
+import request_metrics
+import routing
+import single_flight
+from admission import AdmissionRejected
+from cost_guard import QueryRejected
+from session_pool import SessionPool
 
 # Environment variables
 SECRET_NAME = os.environ['SECRET_NAME']
@@ -13,10 +22,38 @@ bedrock_client = boto3.client('bedrock-runtime')
 redshift_client = boto3.client('redshift-data')
 secrets_client = boto3.client('secretsmanager')
 
+# Statements wait for a slot of their workload class; callers are rate limited per class
+ADMISSION = admission.from_environment()
+PATH_WORKLOADS = {'/ask': 'ai', '/sql': 'adhoc'}
+
+# Statements reuse warm Data API sessions instead of connecting and authenticating each time
+SESSIONS = SessionPool(int(os.environ.get('DATA_API_SESSION_KEEP_ALIVE_SECONDS', '300')))
+
+# Identical read-only statements already in flight are joined rather than submitted again
+COALESCER = single_flight.from_environment()
+
+# /sql statements are EXPLAINed first: too costly ones are rejected, oversized results get a LIMIT
+SQL_GUARD = os.environ.get('SQL_GUARD', 'true').lower() == 'true'
+SQL_GUARD_SETTINGS = cost_guard.GuardSettings.from_environment()
+
+# /sql may not write hired_employees or hr_data.hiring_summary while the Data API Lambda maintains the summary
+MAINTAIN_HIRING_SUMMARY = os.environ.get('MAINTAIN_HIRING_SUMMARY', 'true').lower() == 'true'
+
 def get_cluster_identifier():
     """Extract cluster identifier from host"""
     return REDSHIFT_HOST.split('.')[0]
 
+# /ask and /sql reads go to the analytics target; anything else stays on the producer
+ROUTER = routing.from_environment(get_cluster_identifier(), REDSHIFT_DB)
+
+def submit_statement(workload: str, sql: str):
+    """Submit to the workload's first available target (/ask and /sql SQL never shares a pooled session)"""
+    def submit(target):
+        request = {**target.connection(secret_arn=SECRET_NAME), 'Sql': sql}
+        return SESSIONS.submit(redshift_client.execute_statement, request, workload)
+    
+    return ROUTER.submit(workload, not routing.read_only(sql), submit)
+
 def get_schema_info():
     """Get database schema information"""
     schema_info = """
@@ -40,18 +77,15 @@ def get_schema_info():
     
     try:
         # Get data counts using Redshift Data API
-        cluster_id = get_cluster_identifier()
-        
         # Count departments
-        dept_response = redshift_client.execute_statement(
-            ClusterIdentifier=cluster_id,
-            Database=REDSHIFT_DB,
-            SecretArn=SECRET_NAME,
-            Sql="SELECT COUNT(*) FROM hr_data.departments"
-        )
-        
-        # Wait for completion and get result
-        dept_count = wait_for_query_result(dept_response['Id'])
+        with ADMISSION.slot('ai', request_metrics.current()):
+            (dept_response, session_id, _), _ = submit_statement('ai', "SELECT COUNT(*) FROM hr_data.departments")
+            
+            # Wait for completion and get result
+            try:
+                dept_count = wait_for_query_result(dept_response['Id'])
+            finally:
+                SESSIONS.release(session_id)
         
         schema_info += f"\nCurrent data counts:\n- Departments: {dept_count}\n- Jobs: Available\n- Employees: Available"
         
@@ -78,61 +112,102 @@ def wait_for_query_result(query_id, max_wait=30):
     
     return "Unknown"
 
-def execute_sql_query(sql_query: str):
-    """Execute SQL query using Redshift Data API"""
-    try:
-        cluster_id = get_cluster_identifier()
-        
-        response = redshift_client.execute_statement(
-            ClusterIdentifier=cluster_id,
-            Database=REDSHIFT_DB,
-            SecretArn=SECRET_NAME,
-            Sql=sql_query
-        )
-        
-        query_id = response['Id']
+def read_statement_result(query_id: str):
+    """Wait for a statement to finish and return its rows, or an error dict"""
+    for _ in range(30):
+        status_response = redshift_client.describe_statement(Id=query_id)
+        status = status_response['Status']
         
-        # Wait for completion
-        for _ in range(30):
-            status_response = redshift_client.describe_statement(Id=query_id)
-            status = status_response['Status']
+        if status == 'FINISHED':
+            result = redshift_client.get_statement_result(Id=query_id)
             
-            if status == 'FINISHED':
-                result = redshift_client.get_statement_result(Id=query_id)
-                
-                # Extract column names
-                columns = [col['name'] for col in result['ColumnMetadata']]
-                
-                # Extract rows
-                rows = []
-                for record in result['Records']:
-                    row = []
-                    for field in record:
-                        if 'stringValue' in field:
-                            row.append(field['stringValue'])
-                        elif 'longValue' in field:
-                            row.append(field['longValue'])
-                        elif 'isNull' in field:
-                            row.append(None)
-                        else:
-                            row.append(str(field))
-                    rows.append(row)
-                
-                return {
-                    "columns": columns,
-                    "rows": rows,
-                    "count": len(rows)
-                }
-            elif status == 'FAILED':
-                return {"error": status_response.get('Error', 'Query failed')}
+            # Extract column names
+            columns = [col['name'] for col in result['ColumnMetadata']]
+            
+            # Extract rows
+            rows = []
+            for record in result['Records']:
+                row = []
+                for field in record:
+                    if 'stringValue' in field:
+                        row.append(field['stringValue'])
+                    elif 'longValue' in field:
+                        row.append(field['longValue'])
+                    elif 'isNull' in field:
+                        row.append(None)
+                    else:
+                        row.append(str(field))
+                rows.append(row)
             
-            time.sleep(1)
+            return {
+                "columns": columns,
+                "rows": rows,
+                "count": len(rows)
+            }
+        elif status == 'FAILED':
+            return {"error": status_response.get('Error', 'Query failed')}
         
-        return {"error": "Query timeout"}
+        time.sleep(1)
+    
+    return {"error": "Query timeout"}
+
+def execute_sql_query(sql_query: str, workload: str = 'adhoc'):
+    """Execute SQL query using Redshift Data API"""
+    try:
+        target = ROUTER.candidates(workload, not routing.read_only(sql_query))[0]
+        key = None
+        if request_metrics.current().route in single_flight.COALESCED_ROUTES:
+            key = single_flight.statement_key(sql_query, scope=f"{target.name}/{SECRET_NAME}")
+        with COALESCER.join(key) as flight:
+            if flight.coalesced:
+                # Another request submitted the same statement; read its result
+                request_metrics.current().count('CoalesceHits')
+                return read_statement_result(flight.statement_id)
+            
+            with ADMISSION.slot(workload, request_metrics.current()):
+                started = time.perf_counter()
+                (response, session_id, reused), target = submit_statement(workload, sql_query)
+                request_metrics.current().count('SessionReuse', int(reused))
+                flight.publish(response['Id'])
+                
+                # Wait for completion
+                try:
+                    result = read_statement_result(response['Id'])
+                finally:
+                    SESSIONS.release(session_id)
+                if 'error' not in result:
+                    ROUTER.record_latency(target, time.perf_counter() - started)
+                return result
         
+    except AdmissionRejected:
+        raise
     except Exception as e:
         return {"error": str(e)}
 
+def explain_plan(sql: str):
+    """Run an EXPLAIN and return its plan lines"""
+    result = execute_sql_query(sql)
+    if 'error' in result:
+        raise ValueError(result['error'])
+    return [str(row[0]) for row in result['rows']]
+
+def execute_guarded_query(sql_query: str):
+    """Run free-form SQL after the EXPLAIN cost guard has allowed or capped it"""
+    if MAINTAIN_HIRING_SUMMARY:
+        hiring_summary.check_adhoc_sql(sql_query)
+    if not SQL_GUARD:
+        return execute_sql_query(sql_query)
+    
+    try:
+        decision = cost_guard.guard(sql_query, explain_plan, SQL_GUARD_SETTINGS)
+    except QueryRejected:
+        raise
+    except ValueError as e:
+        return {"error": str(e)}
+    result = execute_sql_query(decision['sql'])
+    result['guard'] = {key: value for key, value in decision.items() if key != 'sql'}
+    return result
+
 def query_bedrock(question: str, schema_info: str):
     """Query Bedrock model with context"""
     
@@ -170,6 +245,24 @@ Answer:"""
     return result['content'][0]['text']
 
 def lambda_handler(event, context):
+    path = event.get('path')
+    workload = PATH_WORKLOADS.get(path, 'adhoc')
+    route = path.strip('/') if path in PATH_WORKLOADS else 'other'
+    metrics = request_metrics.start(route, getattr(context, 'aws_request_id', None))
+    try:
+        ADMISSION.check_rate(admission.caller_id(event), workload)
+        response = handle_request(event, context)
+    except AdmissionRejected as e:
+        metrics.count('AdmissionRejected')
+        response = {
+            'statusCode': 429,
+            'headers': {'Retry-After': str(max(1, round(e.retry_after)))},
+            'body': json.dumps({'error': str(e)})
+        }
+    metrics.emit(response['statusCode'])
+    return response
+
+def handle_request(event, context):
     try:
         method = event['httpMethod']
         path = event['path']
@@ -206,7 +299,18 @@ def lambda_handler(event, context):
                 }
             
             # Execute SQL query
-            result = execute_sql_query(sql_query)
+            try:
+                result = execute_guarded_query(sql_query)
+            except QueryRejected as e:
+                return {
+                    'statusCode': 400,
+                    'body': json.dumps({'error': str(e), 'estimate': e.estimate})
+                }
+            except hiring_summary.SummaryWriteRejected as e:
+                return {
+                    'statusCode': 400,
+                    'body': json.dumps({'error': str(e)})
+                }
             
             return {
                 'statusCode': 200,
@@ -219,6 +323,8 @@ def lambda_handler(event, context):
                 'body': json.dumps({'error': 'Not found'})
             }
     
+    except AdmissionRejected:
+        raise
     except Exception as e:
         return {
             'statusCode': 500,
@@ -0,0 +1,139 @@
+"""Pre-flight EXPLAIN check for ad-hoc and AI-generated SQL.
+
+Before a free-form statement runs, its plan is fetched with EXPLAIN. The
+estimated rows and row width come from the top node. The estimated cost comes
+from the first node below the leader-node Merge/Network/Sort/Limit steps,
+because Redshift adds a fixed 1e12 to the cost of a leader sort. A nested loop
+join keeps its own 1e12 penalty, so cartesian products are over any sensible
+limit. The statement is then allowed, rejected (cost over the limit), or, for
+a query expected to return more rows than the Lambda can send back, capped
+with a LIMIT. The guard fails closed: a statement is classified by its first
+keyword after any leading comments and parentheses, and one that is not a
+query or DML, or whose plan cannot be read, is rejected rather than run
+unchecked. Parsing and the decision take plain plan lines, so both can be
+tested against captured plans without a cluster.
+"""
+import os
+import re
+from typing import Callable, Dict, List, Optional
+
+NODE_PATTERN = re.compile(r'(?:->\s+)?(?P<node>[^\s-].*?)\s+\(cost=(?P<startup>[\d.]+)\.\.(?P<total>[\d.]+) rows=(?P<rows>\d+) width=(?P<width>\d+)\)')
+# Whitespace, -- and /* */ comments and opening parentheses ahead of the first keyword
+LEADING_PATTERN = re.compile(r'^(?:\s+|--[^\n]*(?:\n|$)|/\*.*?\*/|\()*', re.S)
+QUERY_KEYWORDS = ('SELECT', 'WITH')
+EXPLAINABLE_KEYWORDS = QUERY_KEYWORDS + ('INSERT', 'UPDATE', 'DELETE')
+TRAILING_LIMIT_PATTERN = re.compile(r'\bLIMIT\s+(?P<limit>\d+|ALL)(?:\s+OFFSET\s+(?P<offset>\d+))?\s*$', re.I)
+TRAILING_OFFSET_PATTERN = re.compile(r'\s*\bOFFSET\s+(?P<offset>\d+)\s*$', re.I)
+
+LEADER_NODES = ('XN Merge', 'XN Network', 'XN Sort', 'XN Limit')
+
+# Responses are capped below the 6 MB Lambda payload limit, leaving room for JSON overhead
+DEFAULT_MAX_BYTES = 4 * 1024 * 1024
+
+
+class QueryRejected(ValueError):
+    """Raised when a statement's estimated cost is over the limit or cannot be checked"""
+
+    def __init__(self, message: str, estimate: Optional[Dict]):
+        super().__init__(message)
+        self.estimate = estimate
+
+
+class GuardSettings:
+    def __init__(self, max_cost: float = 1e9, max_rows: int = 10000, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_cost = max_cost
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+
+    @classmethod
+    def from_environment(cls) -> 'GuardSettings':
+        return cls(
+            max_cost=float(os.environ.get('SQL_GUARD_MAX_COST', '1e9')),
+            max_rows=int(os.environ.get('SQL_GUARD_MAX_ROWS', '10000')),
+            max_bytes=int(os.environ.get('SQL_GUARD_MAX_BYTES', str(DEFAULT_MAX_BYTES))),
+        )
+
+
+def parse_plan(lines: List[str]) -> Optional[Dict]:
+    """Estimated cost, rows and width of a plan, or None if it has no node lines"""
+    nodes = [match for match in map(NODE_PATTERN.search, lines) if match]
+    if not nodes:
+        return None
+    top = nodes[0]
+    work = next((node for node in nodes if not node.group('node').startswith(LEADER_NODES)), top)
+    return {
+        'node': top.group('node').strip(),
+        'cost': float(work.group('total')),
+        'rows': int(top.group('rows')),
+        'width': int(top.group('width')),
+        'nested_loop': any('Nested Loop' in line for line in lines),
+    }
+
+
+def row_cap(estimate: Dict, settings: GuardSettings) -> int:
+    """Most rows a response may carry for this row width"""
+    return max(1, min(settings.max_rows, settings.max_bytes // max(estimate['width'], 1)))
+
+
+def leading_keyword(sql: str) -> str:
+    """The statement's first keyword, upper-cased, past leading comments and parentheses"""
+    match = re.match(r'\w+', sql[LEADING_PATTERN.match(sql).end():])
+    return match.group(0).upper() if match else ''
+
+
+def add_limit(sql: str, limit: int) -> str:
+    """Add LIMIT to a query, replacing a trailing LIMIT ALL or larger LIMIT
+
+    The LIMIT goes ahead of a trailing OFFSET, which keeps its value.
+    """
+    sql = sql.strip().rstrip(';').rstrip()
+    existing = TRAILING_LIMIT_PATTERN.search(sql)
+    if existing:
+        if existing.group('limit').upper() != 'ALL' and int(existing.group('limit')) <= limit:
+            return sql
+        offset = f" OFFSET {existing.group('offset')}" if existing.group('offset') else ''
+        return sql[:existing.start()] + f"LIMIT {limit}{offset}"
+    offset = TRAILING_OFFSET_PATTERN.search(sql)
+    if offset:
+        return f"{sql[:offset.start()]}\nLIMIT {limit} OFFSET {offset.group('offset')}"
+    return f"{sql}\nLIMIT {limit}"
+
+
+def decide(sql: str, lines: List[str], settings: GuardSettings) -> Dict:
+    """Allow, cap or reject a statement given its EXPLAIN output
+
+    Returns {'action', 'sql', 'estimate'} and raises QueryRejected when the
+    estimated cost is over the limit or the plan cannot be read.
+    """
+    estimate = parse_plan(lines)
+    if estimate is None:
+        raise QueryRejected("The statement's plan could not be read, so its cost cannot be checked", None)
+
+    if estimate['cost'] > settings.max_cost:
+        reason = 'a nested loop join (check the join predicates)' if estimate['nested_loop'] else 'its size'
+        raise QueryRejected(
+            f"Estimated cost {estimate['cost']:.0f} is over the limit of {settings.max_cost:.0f} because of {reason}",
+            estimate
+        )
+
+    cap = row_cap(estimate, settings)
+    if leading_keyword(sql) in QUERY_KEYWORDS and estimate['rows'] > cap:
+        capped = add_limit(sql, cap)
+        if capped != sql.strip().rstrip(';').rstrip():
+            return {'action': 'capped', 'sql': capped, 'limit': cap, 'estimate': estimate}
+
+    return {'action': 'allowed', 'sql': sql, 'estimate': estimate}
+
+
+def guard(sql: str, explain: Callable[[str], List[str]], settings: GuardSettings) -> Dict:
+    """EXPLAIN the statement with ``explain`` and decide what to run
+
+    Statements other than queries and DML cannot be EXPLAINed and are rejected.
+    """
+    keyword = leading_keyword(sql)
+    if keyword not in EXPLAINABLE_KEYWORDS:
+        raise QueryRejected(
+            f"Only SELECT, WITH, INSERT, UPDATE and DELETE statements can be checked, not {keyword or 'this statement'}",
+            None
+        )
+    return decide(sql, explain(f"EXPLAIN {sql.strip().rstrip(';')}"), settings)
@@ -0,0 +1,151 @@
+"""Warm-container cache of the departments and jobs dimension tables.
+
+Both tables are small and rarely change, so the Lambda keeps an id -> name map
+of each, loaded with a single UNION ALL query. The map is reloaded when it is
+older than the TTL. Between reloads, a fingerprint query (row count, max id
+and total name length per table) runs at most every ``check_seconds``, and the
+map is reloaded as soon as the fingerprint moves. Writes made by this container
+call ``invalidate`` directly.
+"""
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Dimension table -> its name column
+DIMENSIONS = {
+    'departments': 'department',
+    'jobs': 'job',
+}
+
+# hired_employees column -> dimension table it references
+FOREIGN_KEYS = {
+    'department_id': 'departments',
+    'job_id': 'jobs',
+}
+
+LOAD_SQL = ' UNION ALL '.join(
+    f"SELECT '{table}' AS dimension, id, {column} AS name FROM hr_data.{table}"
+    for table, column in DIMENSIONS.items()
+)
+
+FINGERPRINT_SQL = ' UNION ALL '.join(
+    f"SELECT '{table}' AS dimension, COUNT(*) AS row_count, MAX(id) AS max_id, "
+    f"SUM(LENGTH({column})) AS name_length FROM hr_data.{table}"
+    for table, column in DIMENSIONS.items()
+)
+
+
+def fingerprint(names: Dict[str, Dict[int, str]]) -> Tuple:
+    """The FINGERPRINT_SQL values computed from a loaded map"""
+    return tuple(sorted(
+        (table, len(rows), max(rows) if rows else None, sum(len(name or '') for name in rows.values()) if rows else None)
+        for table, rows in names.items()
+    ))
+
+
+class DimensionCache:
+    """id -> name maps for every dimension table, shared by all requests in a container"""
+
+    def __init__(self, query: Callable[[str], Dict[str, Any]], ttl_seconds: float = 300,
+                 check_seconds: float = 60, clock: Callable[[], float] = time.monotonic):
+        self.query = query
+        self.ttl_seconds = ttl_seconds
+        self.check_seconds = check_seconds
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._names: Optional[Dict[str, Dict[int, str]]] = None
+        self._version: Optional[Tuple] = None
+        self._loaded_at = 0.0
+        self._checked_at = 0.0
+
+    def get(self) -> Dict[str, Dict[int, str]]:
+        """Current maps, reloading them when expired or when the tables changed"""
+        with self._lock:
+            now = self.clock()
+            if self._names is None or now - self._loaded_at >= self.ttl_seconds:
+                self._load(now)
+            elif now - self._checked_at >= self.check_seconds:
+                if self._current_version() != self._version:
+                    self._load(now)
+                else:
+                    self._checked_at = now
+            return self._names
+
+    def refresh(self) -> Dict[str, Dict[int, str]]:
+        with self._lock:
+            self._load(self.clock())
+            return self._names
+
+    def invalidate(self):
+        with self._lock:
+            self._names = None
+
+    def _load(self, now: float):
+        names: Dict[str, Dict[int, str]] = {table: {} for table in DIMENSIONS}
+        for dimension, key, name in self.query(LOAD_SQL)['rows']:
+            names[dimension][int(key)] = name
+        self._names = names
+        self._version = fingerprint(names)
+        self._loaded_at = self._checked_at = now
+
+    def _current_version(self) -> Tuple:
+        rows = self.query(FINGERPRINT_SQL)['rows']
+        return tuple(sorted(
+            (table, int(count), int(max_id) if max_id is not None else None,
+             int(length) if length is not None else None)
+            for table, count, max_id, length in rows
+        ))
+
+    def foreign_key_errors(self, data: List[Dict]) -> List[str]:
+        """Errors for rows whose department_id/job_id is not a known dimension id
+
+        A miss triggers one reload before rows are rejected, so an id added by
+        another container since the last load is not reported.
+        """
+        def missing(names):
+            return [
+                (i, column, row[column])
+                for i, row in enumerate(data)
+                for column, table in FOREIGN_KEYS.items()
+                if row.get(column) is not None and as_id(row[column]) not in names[table]
+            ]
+
+        misses = missing(self.get())
+        if misses:
+            misses = missing(self.refresh())
+        return [f"Row {i}: {column} {value} does not exist in {FOREIGN_KEYS[column]}" for i, column, value in misses]
+
+    def attach(self, result: Dict[str, Any], id_column: str, dimension: str, name_column: str,
+               replace: bool = False) -> Dict[str, Any]:
+        """Add the dimension name for id_column to every row of a report result
+
+        The name goes right after the id column, or in its place with replace.
+        Rows whose id has no dimension entry are dropped, as the SQL JOIN would.
+        """
+        names = self.get()[dimension]
+        index = result['columns'].index(id_column)
+        columns = list(result['columns'])
+        if replace:
+            columns[index] = name_column
+        else:
+            columns.insert(index + 1, name_column)
+
+        rows = []
+        for row in result['rows']:
+            name = names.get(as_id(row[index]))
+            if name is None:
+                continue
+            row = list(row)
+            if replace:
+                row[index] = name
+            else:
+                row.insert(index + 1, name)
+            rows.append(row)
+        return dict(result, columns=columns, rows=rows, count=len(rows))
+
+
+def as_id(value) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
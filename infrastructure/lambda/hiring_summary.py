@@ -0,0 +1,162 @@
+"""SQL for hr_data.hiring_summary, the hire counts behind the reports.
+
+The table holds one row per (month, department_id, job_id) with the number of
+hires, plus the year and quarter of that month so reports can group without
+EXTRACT. It is kept in step with hired_employees by delta statements that run
+in the same batch transaction as the write they account for, and it can be
+rebuilt from scratch. A chunked load runs many such transactions at once, so
+its chunks record their deltas in a per-request table instead, and the
+summary takes them in a single MERGE once every chunk is done. Hires without a
+datetime, department_id or job_id are left out, as the joins in the raw
+reports leave them out.
+
+Free-form SQL that writes hired_employees or the summary cannot carry a
+delta, so the /sql routes refuse it (check_adhoc_sql).
+"""
+import re
+from datetime import date
+from typing import List
+
+SUMMARY_TABLE = 'hr_data.hiring_summary'
+KEY_COLUMNS = ('month_start', 'department_id', 'job_id')
+SUMMARY_COLUMNS = ('month_start', 'year', 'quarter', 'month', 'department_id', 'job_id', 'hires')
+
+
+def aggregate_sql(source: str, weight: str = '1') -> str:
+    """Summary rows for the hires in ``source``, each counted as ``weight``"""
+    return f"""
+        SELECT
+            CAST(DATE_TRUNC('month', datetime) AS DATE) AS month_start,
+            EXTRACT(YEAR FROM datetime) AS year,
+            EXTRACT(QUARTER FROM datetime) AS quarter,
+            EXTRACT(MONTH FROM datetime) AS month,
+            department_id,
+            job_id,
+            SUM({weight}) AS hires
+        FROM {source}
+        WHERE datetime IS NOT NULL AND department_id IS NOT NULL AND job_id IS NOT NULL
+        GROUP BY 1, 2, 3, 4, 5, 6
+    """
+
+
+def delta_sql(stage: str, replaces: bool = False) -> str:
+    """Summary rows for the change the hires staged in ``stage`` make
+
+    With ``replaces`` the staged rows may overwrite existing ids (an upsert), so
+    the rows they replace are counted out.
+    """
+    source = f"(SELECT datetime, department_id, job_id, 1 AS weight FROM {stage}"
+    if replaces:
+        source += (
+            " UNION ALL SELECT datetime, department_id, job_id, -1 AS weight FROM hr_data.hired_employees"
+            f" WHERE id IN (SELECT id FROM {stage})"
+        )
+    source += ") delta_rows"
+    return aggregate_sql(source, 'weight')
+
+
+def merge_statements(delta: str) -> List[str]:
+    """Add the summary rows of the ``delta`` query to the summary"""
+    matches = ' AND '.join(f"{SUMMARY_TABLE}.{column} = d.{column}" for column in KEY_COLUMNS)
+    return [
+        f"""
+        MERGE INTO {SUMMARY_TABLE} USING ({delta}) d ON {matches}
+        WHEN MATCHED THEN UPDATE SET hires = {SUMMARY_TABLE}.hires + d.hires
+        WHEN NOT MATCHED THEN INSERT ({', '.join(SUMMARY_COLUMNS)}) VALUES ({', '.join(f'd.{c}' for c in SUMMARY_COLUMNS)})
+        """,
+        f"DELETE FROM {SUMMARY_TABLE} WHERE hires = 0"
+    ]
+
+
+def delta_statements(stage: str, replaces: bool = False) -> List[str]:
+    """Add the hires staged in ``stage`` to the summary
+
+    Must run before the staged rows are written to hired_employees. The lock
+    queues concurrent loads at the summary, as in apply_delta_statements.
+    """
+    return [f"LOCK {SUMMARY_TABLE}", *merge_statements(delta_sql(stage, replaces))]
+
+
+def create_delta_table_statements(delta_table: str) -> List[str]:
+    """Create the table a chunked load's chunks record their summary deltas in"""
+    return [f"CREATE TABLE {delta_table} (LIKE {SUMMARY_TABLE})"]
+
+
+def record_delta_statements(stage: str, delta_table: str, replaces: bool = False) -> List[str]:
+    """Record the summary change of the hires staged in ``stage`` in ``delta_table``
+
+    Like delta_statements it must run before the staged rows are written, but
+    it only appends to the request's own table, so concurrent chunks never
+    read and write the summary at the same time.
+    """
+    return [f"INSERT INTO {delta_table} ({', '.join(SUMMARY_COLUMNS)}) {delta_sql(stage, replaces)}"]
+
+
+def apply_delta_statements(delta_table: str) -> List[str]:
+    """Add every recorded delta to the summary in one MERGE and drop the delta table
+
+    The lock makes concurrent loads take their turn at the summary instead of
+    failing each other with serializable isolation violations.
+    """
+    delta = f"""
+        SELECT {', '.join(SUMMARY_COLUMNS[:-1])}, SUM(hires) AS hires
+        FROM {delta_table}
+        GROUP BY {', '.join(str(i) for i in range(1, len(SUMMARY_COLUMNS)))}
+    """
+    return [
+        f"LOCK {SUMMARY_TABLE}",
+        *merge_statements(delta),
+        f"DROP TABLE {delta_table}"
+    ]
+
+
+def rebuild_statements() -> List[str]:
+    """Recompute the whole summary from hired_employees"""
+    return [
+        f"DELETE FROM {SUMMARY_TABLE}",
+        f"INSERT INTO {SUMMARY_TABLE} ({', '.join(SUMMARY_COLUMNS)}) {aggregate_sql('hr_data.hired_employees')}"
+    ]
+
+
+DRIFT_SQL = f"""
+    WITH expected AS ({aggregate_sql('hr_data.hired_employees')})
+    SELECT
+        COUNT(*) AS drifted_groups,
+        COALESCE(SUM(COALESCE(e.hires, 0) - COALESCE(s.hires, 0)), 0) AS missing_hires
+    FROM expected e
+    FULL OUTER JOIN {SUMMARY_TABLE} s
+        ON {' AND '.join(f's.{column} = e.{column}' for column in KEY_COLUMNS)}
+    WHERE e.hires IS NULL OR s.hires IS NULL OR e.hires <> s.hires
+"""
+
+
+class SummaryWriteRejected(ValueError):
+    """Raised for free-form SQL that would change hired_employees or the summary"""
+
+
+# INSERT/UPDATE/DELETE/MERGE/COPY/TRUNCATE/ALTER/DROP naming hired_employees or the summary,
+# bare, schema-qualified or database.schema-qualified, quoted or not
+SUMMARY_WRITE_PATTERN = re.compile(
+    r'\b(?:INSERT\s+INTO|UPDATE|DELETE(?:\s+FROM)?|MERGE\s+INTO|COPY|TRUNCATE(?:\s+TABLE)?|ALTER\s+TABLE|DROP\s+TABLE(?:\s+IF\s+EXISTS)?)'
+    r'\s+(?:(?:"[^"]+"|\w+)\s*\.\s*)?(?:"?hr_data"?\s*\.\s*)?"?(hired_employees|hiring_summary)\b',
+    re.I
+)
+
+
+def check_adhoc_sql(sql: str):
+    """Refuse free-form SQL that writes hired_employees or the summary
+
+    Such a write would leave the summary, and every report that reads it, out
+    of step with hired_employees. Writes go through /data, which maintains it.
+    """
+    match = SUMMARY_WRITE_PATTERN.search(sql)
+    if match:
+        raise SummaryWriteRejected(
+            f"Writes to hr_data.{match.group(1).lower()} are not allowed through /sql; "
+            "load hired_employees through /data so hr_data.hiring_summary stays in step"
+        )
+
+
+def month_aligned(window_start: str, window_end: str) -> bool:
+    """Whether a report window starts and ends on month boundaries"""
+    return all(date.fromisoformat(bound[:10]).day == 1 for bound in (window_start, window_end))
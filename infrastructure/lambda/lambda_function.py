@@ -1,10 +1,32 @@
 import json
 import os
+import base64
+import bisect
+import hashlib
+import re
+import gzip
+import time
+import threading
+import uuid
 import boto3
-from datetime import datetime
+from botocore.exceptions import ClientError
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timezone
+from decimal import Decimal
 from typing import List, Dict, Any
-import fastavro
 import io
+import admission
+import cost_guard
+import hiring_summary
+import request_metrics
+import routing
+import single_flight
+from admission import AdmissionRejected
+from cost_guard import QueryRejected
+from dimension_cache import DIMENSIONS, DimensionCache
+from report_registry import ReportRegistry, ReportParameterError, UnknownReportError, default_reports_dir
+from session_pool import SessionPool
 
 # Environment variables
 SECRET_NAME = os.environ['SECRET_NAME']
@@ -12,83 +34,355 @@ REDSHIFT_HOST = os.environ['REDSHIFT_HOST']
 REDSHIFT_DB = os.environ['REDSHIFT_DB']
 S3_BUCKET = os.environ['S3_BUCKET']
 
-# Initialize clients
-redshift_data = boto3.client('redshift-data')
-s3_client = boto3.client('s3')
-secrets_client = boto3.client('secretsmanager')
+# Ingestion tuning: statement byte budget per chunk and concurrent batches in flight
+INGEST_CHUNK_BYTES = int(os.environ.get('INGEST_CHUNK_BYTES', '90000'))
+INGEST_MAX_IN_FLIGHT = int(os.environ.get('INGEST_MAX_IN_FLIGHT', '4'))
+MAX_INLINE_ROWS = 1000
+
+# Report definitions are parsed once per container from the annotated .sql files
+REPORTS = ReportRegistry.load(os.environ.get('REPORTS_DIR') or default_reports_dir())
+
+# Warm-container report results: (report, variant, parameters) -> (expires_at, result), least
+# recently used first. Custom windows make the key space unbounded, so the cache holds at most
+# REPORT_CACHE_MAX_ENTRIES results and drops expired ones as it goes
+REPORT_CACHE_MAX_ENTRIES = int(os.environ.get('REPORT_CACHE_MAX_ENTRIES', '256'))
+_report_cache: 'OrderedDict[tuple, tuple]' = OrderedDict()
+_report_cache_lock = threading.Lock()
+
+# departments/jobs id -> name maps, for foreign-key checks on ingest and names=lambda reports
+VALIDATE_FOREIGN_KEYS = os.environ.get('VALIDATE_FOREIGN_KEYS', 'true').lower() == 'true'
+DIMENSION_CACHE = DimensionCache(
+    lambda sql: execute_sql_query(sql),
+    ttl_seconds=int(os.environ.get('DIMENSION_TTL_SECONDS', '300')),
+    check_seconds=int(os.environ.get('DIMENSION_CHECK_SECONDS', '60'))
+)
+REPORT_NAME_MODES = ('redshift', 'lambda')
+REPORT_SOURCES = ('auto', 'summary')
+
+# hr_data.hiring_summary is kept in step with hired_employees and serves month-aligned reports
+MAINTAIN_HIRING_SUMMARY = os.environ.get('MAINTAIN_HIRING_SUMMARY', 'true').lower() == 'true'
+
+# Statements wait for a slot of their workload class; callers are rate limited per class.
+# get_client is looked up when the store first needs a dynamodb client.
+ADMISSION = admission.from_environment(lambda: get_client('dynamodb'))
+ROUTE_WORKLOADS = {
+    'reports': 'report',
+    'data': 'ingest',
+    'backup': 'ingest',
+    'restore': 'ingest',
+    'backups': 'ingest',
+    'summary': 'ingest',
+    'sql': 'adhoc',
+}
+
+# Identical read-only statements already in flight are joined rather than submitted again
+COALESCER = single_flight.from_environment(lambda: get_client('dynamodb'))
+
+# /sql statements are EXPLAINed first: too costly ones are rejected, oversized results get a LIMIT
+SQL_GUARD = os.environ.get('SQL_GUARD', 'true').lower() == 'true'
+SQL_GUARD_SETTINGS = cost_guard.GuardSettings.from_environment()
+
+# Reads for reports, /sql and dashboards go to the analytics target; writes stay on the producer
+ROUTER = routing.from_environment(REDSHIFT_HOST.split('.')[0], REDSHIFT_DB)
+
+# Statements reuse warm Data API sessions instead of connecting and authenticating each time
+SESSIONS = SessionPool(int(os.environ.get('DATA_API_SESSION_KEEP_ALIVE_SECONDS', '300')))
+
+# Clients are created on first use so a route only pays for the services it touches
+CREDENTIALS_TTL_SECONDS = int(os.environ.get('CREDENTIALS_TTL_SECONDS', '300'))
+
+_clients: Dict[str, Any] = {}
+_clients_lock = threading.Lock()
+_credentials: Dict[str, Any] = {}
+
+def get_client(service: str):
+    """Return the memoized boto3 client for a service, creating it on first use"""
+    client = _clients.get(service)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(service)
+            if client is None:
+                client = _clients[service] = boto3.client(service)
+    return client
 
 def get_db_credentials():
-    """Get database credentials from Secrets Manager"""
-    secret = secrets_client.get_secret_value(SecretId=SECRET_NAME)
-    return json.loads(secret['SecretString'])
+    """Get database credentials from Secrets Manager, cached for CREDENTIALS_TTL_SECONDS"""
+    if _credentials and _credentials['expires_at'] > time.time():
+        return _credentials['value']
+    
+    with request_metrics.current().phase('credentials'):
+        secret = get_client('secretsmanager').get_secret_value(SecretId=SECRET_NAME)
+    _credentials['value'] = json.loads(secret['SecretString'])
+    _credentials['expires_at'] = time.time() + CREDENTIALS_TTL_SECONDS
+    return _credentials['value']
 
-def execute_sql_query(sql_query):
-    """Execute SQL query using Redshift Data API"""
+ROUTE_SERVICES = {
+    'data': ('redshift-data', 'secretsmanager'),
+    'reports': ('redshift-data', 'secretsmanager'),
+    'sql': ('redshift-data', 'secretsmanager'),
+    'backup': ('redshift-data', 'secretsmanager', 's3'),
+    'restore': ('redshift-data', 'secretsmanager', 's3'),
+    'backups': ('s3',),
+    'summary': ('redshift-data', 'secretsmanager'),
+    'targets': (),
+}
+
+def prime(routes=('data', 'reports', 'sql', 'backup', 'restore')):
+    """Build the clients, credentials and imports the given routes need ahead of a request"""
+    for route in routes:
+        for service in ROUTE_SERVICES[route]:
+            get_client(service)
+    if isinstance(ADMISSION.store, admission.DynamoDBStore) or isinstance(COALESCER.registry, single_flight.DynamoDBRegistry):
+        get_client('dynamodb')
+    get_db_credentials()
+    if 'backup' in routes or 'restore' in routes:
+        import fastavro  # noqa: F401
+
+def install_priming_hooks():
+    """Prime at init when PRIME_ON_INIT is set, or around SnapStart snapshots when available
+    
+    PRIME_ON_INIT takes a comma-separated route list (or "all"). Under SnapStart the
+    priming runs before the snapshot is taken and cached credentials are dropped on
+    restore so they are never shared between restored environments.
+    """
+    setting = os.environ.get('PRIME_ON_INIT', '').strip()
+    if not setting:
+        return
+    routes = tuple(ROUTE_SERVICES) if setting == 'all' else tuple(r.strip() for r in setting.split(','))
+    
     try:
-        credentials = get_db_credentials()
-        
-        response = redshift_data.execute_statement(
-            ClusterIdentifier=REDSHIFT_HOST.split('.')[0],
-            Database=REDSHIFT_DB,
-            DbUser=credentials['username'],
-            Sql=sql_query
-        )
-        
-        query_id = response['Id']
-        
-        # Wait for query completion
+        from snapshot_restore_py import register_before_snapshot, register_after_restore
+    except ImportError:
+        prime(routes)
+        return
+    
+    register_before_snapshot(lambda: prime(routes))
+    register_after_restore(_credentials.clear)
+
+def wait_for_statement(query_id):
+    """Poll a Data API statement until it finishes and return its description"""
+    metrics = request_metrics.current()
+    delay = 0.05
+    with metrics.phase('poll'):
         while True:
-            status_response = redshift_data.describe_statement(Id=query_id)
+            status_response = get_client('redshift-data').describe_statement(Id=query_id)
+            metrics.count('PollCount')
             status = status_response['Status']
             
             if status == 'FINISHED':
-                break
+                return status_response
             elif status in ['FAILED', 'ABORTED']:
                 error = status_response.get('Error', 'Unknown error')
                 raise Exception(f"Query failed: {error}")
+            
+            # Back off so concurrent statements don't exhaust the DescribeStatement quota
+            time.sleep(delay)
+            delay = min(delay * 2, 1.0)
+
+def build_parameters(values: Dict[str, Any]) -> List[Dict[str, str]]:
+    """Convert named values to Data API Parameters (values are sent as text)"""
+    return [{'name': name, 'value': str(value)} for name, value in values.items()]
+
+def decode_field(field: Dict[str, Any]):
+    """Convert a Data API field to a plain Python value"""
+    if 'stringValue' in field:
+        return field['stringValue']
+    elif 'longValue' in field:
+        return field['longValue']
+    elif 'doubleValue' in field:
+        return field['doubleValue']
+    elif 'booleanValue' in field:
+        return field['booleanValue']
+    elif 'isNull' in field:
+        return None
+    else:
+        return str(field)
+
+def fetch_result_pages(query_id: str) -> List[Dict[str, Any]]:
+    """Fetch every page of a statement result, following NextToken"""
+    client = get_client('redshift-data')
+    page = client.get_statement_result(Id=query_id)
+    pages = [page]
+    while page.get('NextToken'):
+        page = client.get_statement_result(Id=query_id, NextToken=page['NextToken'])
+        pages.append(page)
+    return pages
+
+def fetch_result(statement_id: str, metadata: bool = False) -> Dict[str, Any]:
+    """Fetch and decode the result set of a finished statement or sub-statement
+    
+    ``metadata`` adds the Data API ColumnMetadata (types, precision, scale).
+    """
+    metrics = request_metrics.current()
+    with metrics.phase('fetch'):
+        pages = fetch_result_pages(statement_id)
+    
+    with metrics.phase('decode'):
+        columns = [col['name'] for col in pages[0]['ColumnMetadata']]
+        rows = [
+            [decode_field(field) for field in record]
+            for page in pages
+            for record in page['Records']
+        ]
+    metrics.count('ResultRows', len(rows))
+    
+    result = {
+        'columns': columns,
+        'rows': rows,
+        'count': len(rows)
+    }
+    if metadata:
+        result['metadata'] = pages[0]['ColumnMetadata']
+    return result
+
+def current_workload() -> str:
+    """Workload class of the request being handled"""
+    return ROUTE_WORKLOADS.get(request_metrics.current().route, 'adhoc')
+
+def admitted(workload: str = None):
+    """Hold an admission slot while a statement is submitted and runs"""
+    return ADMISSION.slot(workload or current_workload(), request_metrics.current())
+
+def run_statement(operation: str, statement: Dict[str, Any], writes: bool, on_submit=None):
+    """Submit a statement to its workload's target and wait for it to finish
+    
+    Holds an admission slot and a warm session until the statement is done,
+    fails over to the next target when one cannot take it, and records the
+    target's latency. Returns the statement ID and its final description.
+    """
+    metrics = request_metrics.current()
+    credentials = get_db_credentials()
+    client = get_client('redshift-data')
+    
+    workload = current_workload()
+    
+    def submit(target):
+        request = {**target.connection(credentials['username'], SECRET_NAME), **statement}
+        return SESSIONS.submit(getattr(client, operation), request, workload)
+    
+    with admitted(workload):
+        started = time.perf_counter()
+        with metrics.phase('submit'):
+            (response, session_id, reused), target = ROUTER.submit(workload, writes, submit)
+        metrics.count('StatementCount')
+        metrics.count('SessionReuse', int(reused))
+        metrics.annotate(target=target.name)
+        if on_submit:
+            on_submit(response['Id'])
+        
+        # Wait for query completion
+        try:
+            status_response = wait_for_statement(response['Id'])
+        finally:
+            SESSIONS.release(session_id)
+        ROUTER.record_latency(target, time.perf_counter() - started)
+    return response['Id'], status_response
+
+def execute_sql_query(sql_query, parameters: Dict[str, Any] = None, compile_stats: bool = False,
+                      metadata: bool = False):
+    """Execute SQL query using Redshift Data API"""
+    metrics = request_metrics.current()
+    try:
+        credentials = get_db_credentials()
+        
+        statement = {'Sql': sql_query}
+        if parameters:
+            statement['Parameters'] = build_parameters(parameters)
+        writes = not routing.read_only(sql_query)
+        
+        target = ROUTER.candidates(current_workload(), writes)[0]
+        key = None
+        if metrics.route in single_flight.COALESCED_ROUTES:
+            key = single_flight.statement_key(sql_query, parameters, f"{target.name}/{credentials['username']}")
+        with COALESCER.join(key) as flight:
+            if flight.coalesced:
+                # Another request submitted the same statement; poll and read its result
+                metrics.count('CoalesceHits')
+                query_id = flight.statement_id
+                status_response = wait_for_statement(query_id)
+            else:
+                query_id, status_response = run_statement('execute_statement', statement, writes, flight.publish)
         
         # Check if query has results (SELECT queries)
         has_result_set = status_response.get('HasResultSet', False)
         
         if has_result_set:
             # Get results for SELECT queries
-            result_response = redshift_data.get_statement_result(Id=query_id)
-            
-            # Format results
-            columns = [col['name'] for col in result_response['ColumnMetadata']]
-            rows = []
-            
-            for record in result_response['Records']:
-                row = []
-                for field in record:
-                    if 'stringValue' in field:
-                        row.append(field['stringValue'])
-                    elif 'longValue' in field:
-                        row.append(field['longValue'])
-                    elif 'doubleValue' in field:
-                        row.append(field['doubleValue'])
-                    elif 'booleanValue' in field:
-                        row.append(field['booleanValue'])
-                    elif 'isNull' in field:
-                        row.append(None)
-                    else:
-                        row.append(str(field))
-                rows.append(row)
-            
-            return {
-                'columns': columns,
-                'rows': rows,
-                'count': len(rows)
-            }
+            result = fetch_result(query_id, metadata=metadata)
         else:
             # For INSERT, UPDATE, DELETE queries - return success status
-            return {
+            result = {
                 'columns': [],
                 'rows': [],
                 'count': 0,
                 'message': 'Query executed successfully'
             }
         
+        if compile_stats:
+            result['compile_stats'] = get_compile_stats(status_response.get('RedshiftQueryId'))
+        
+        return result
+        
+    except AdmissionRejected:
+        raise
+    except Exception as e:
+        raise Exception(f"Database query error: {str(e)}")
+
+def get_compile_stats(redshift_query_id) -> Dict[str, Any]:
+    """Report how many segments Redshift compiled for a query and how long it took"""
+    if not redshift_query_id:
+        return {'available': False}
+    
+    try:
+        # SVL_COMPILE exists on provisioned clusters; compile = 0 means the segment came from cache
+        result = execute_sql_query(
+            """
+            SELECT COUNT(*), SUM(compile), SUM(CASE WHEN compile = 1 THEN DATEDIFF(microsecond, starttime, endtime) ELSE 0 END)
+            FROM svl_compile
+            WHERE query = :query_id
+            """,
+            {'query_id': redshift_query_id}
+        )
+        segments, compiled, micros = result['rows'][0]
+    except Exception:
+        # Serverless only exposes the SYS monitoring views
+        try:
+            result = execute_sql_query(
+                "SELECT 0, 0, SUM(compile_time) FROM sys_query_history WHERE query_id = :query_id",
+                {'query_id': redshift_query_id}
+            )
+            segments, compiled, micros = result['rows'][0]
+        except Exception as e:
+            return {'available': False, 'error': str(e)}
+    
+    return {
+        'available': True,
+        'redshift_query_id': redshift_query_id,
+        'segments': int(segments or 0),
+        'compiled_segments': int(compiled or 0),
+        'compile_ms': round(int(micros or 0) / 1000, 3)
+    }
+
+def merge_compile_stats(stats: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Sum compile stats across the statements of one operation"""
+    available = [s for s in stats if s.get('available')]
+    return {
+        'available': bool(available),
+        'statements': len(stats),
+        'segments': sum(s['segments'] for s in available),
+        'compiled_segments': sum(s['compiled_segments'] for s in available),
+        'compile_ms': round(sum(s['compile_ms'] for s in available), 3)
+    }
+
+def execute_batch_statements(sql_statements: List[str]):
+    """Execute several SQL statements as a single transaction using Redshift Data API"""
+    try:
+        writes = not all(routing.read_only(sql) for sql in sql_statements)
+        statement_id, _ = run_statement('batch_execute_statement', {'Sqls': sql_statements}, writes)
+        return statement_id
+        
+    except AdmissionRejected:
+        raise
     except Exception as e:
         raise Exception(f"Database query error: {str(e)}")
 
@@ -119,208 +413,1275 @@ def validate_hired_employees(data: List[Dict]) -> List[str]:
             errors.append(f"Row {i}: name is required and max 255 chars")
     return errors
 
-def insert_batch_data(table: str, data: List[Dict]):
-    """Insert batch data using Redshift Data API"""
+TABLE_COLUMNS = {
+    'departments': ['id', 'department'],
+    'jobs': ['id', 'job'],
+    'hired_employees': ['id', 'name', 'datetime', 'department_id', 'job_id'],
+}
+
+INSERT_MODES = ('append', 'upsert')
+
+def explain_plan(sql: str) -> List[str]:
+    """Run an EXPLAIN and return its plan lines"""
+    return [str(row[0]) for row in execute_sql_query(sql)['rows']]
+
+def execute_guarded_query(sql_query: str) -> Dict[str, Any]:
+    """Run free-form SQL after the EXPLAIN cost guard has allowed or capped it"""
+    if MAINTAIN_HIRING_SUMMARY:
+        hiring_summary.check_adhoc_sql(sql_query)
+    if not SQL_GUARD:
+        return execute_sql_query(sql_query)
     
-    # Build INSERT statement
-    if table == 'departments':
-        columns = ['id', 'department']
-    elif table == 'jobs':
-        columns = ['id', 'job']
-    elif table == 'hired_employees':
-        columns = ['id', 'name', 'datetime', 'department_id', 'job_id']
-    else:
+    decision = cost_guard.guard(sql_query, explain_plan, SQL_GUARD_SETTINGS)
+    result = execute_sql_query(decision['sql'])
+    result['guard'] = {key: value for key, value in decision.items() if key != 'sql'}
+    return result
+
+def get_table_columns(table: str) -> List[str]:
+    """Return the ordered column list for a table in the hr_data schema"""
+    columns = TABLE_COLUMNS.get(table)
+    if not columns:
         raise ValueError(f"Invalid table: {table}")
+    return columns
+
+def sql_literal(value) -> str:
+    """Render a Python value as a Redshift SQL literal"""
+    if value is None or value == 'NULL':
+        return 'NULL'
+    elif isinstance(value, str):
+        return f"'{value.replace(chr(39), chr(39)+chr(39))}'"
+    else:
+        return str(value)
+
+def render_row(table: str, columns: List[str], record: Dict) -> str:
+    """Render one record as a parenthesised VALUES row"""
+    if table == 'hired_employees' and 'datetime' not in record:
+        record['datetime'] = 'CURRENT_TIMESTAMP'
     
-    # Generate VALUES clause
-    values_list = []
-    for record in data:
+    values = []
+    for col in columns:
+        if col == 'datetime' and record.get(col) == 'CURRENT_TIMESTAMP':
+            values.append('CURRENT_TIMESTAMP')
+        else:
+            values.append(sql_literal(record.get(col, 'NULL')))
+    return f"({', '.join(values)})"
+
+def build_values_clause(table: str, columns: List[str], data: List[Dict]) -> str:
+    """Build the VALUES rows for a batch of records"""
+    return ', '.join(render_row(table, columns, record) for record in data)
+
+def build_parameterized_insert(table: str, columns: List[str], data: List[Dict], target: str = None):
+    """Build an INSERT whose text depends only on row count and NULL layout
+    
+    Values travel as Data API Parameters so repeated loads of the same shape
+    reuse Redshift's compiled segments instead of producing a unique query
+    string per call. NULLs and empty strings are inlined because the Data API
+    does not accept them as parameter values. ``target`` loads another table
+    with the same columns, such as a restore staging table.
+    """
+    rows = []
+    parameters = {}
+    for i, record in enumerate(data):
         if table == 'hired_employees' and 'datetime' not in record:
             record['datetime'] = 'CURRENT_TIMESTAMP'
         
-        values = []
+        placeholders = []
         for col in columns:
-            if col == 'datetime' and record.get(col) == 'CURRENT_TIMESTAMP':
-                values.append('CURRENT_TIMESTAMP')
+            value = record.get(col)
+            if col == 'datetime' and value == 'CURRENT_TIMESTAMP':
+                placeholders.append('CURRENT_TIMESTAMP')
+            elif value is None or value == 'NULL':
+                placeholders.append('NULL')
+            elif value == '':
+                placeholders.append("''")
             else:
-                value = record.get(col, 'NULL')
-                if value is None or value == 'NULL':
-                    values.append('NULL')
-                elif isinstance(value, str):
-                    values.append(f"'{value.replace(chr(39), chr(39)+chr(39))}'")
-                else:
-                    values.append(str(value))
-        values_list.append(f"({', '.join(values)})")
-    
-    sql = f"""
-    INSERT INTO hr_data.{table} ({', '.join(columns)})
-    VALUES {', '.join(values_list)}
+                name = f"r{i}_{col}"
+                parameters[name] = value
+                placeholders.append(f":{name}")
+        rows.append(f"({', '.join(placeholders)})")
+    
+    sql = f"INSERT INTO hr_data.{target or table} ({', '.join(columns)}) VALUES {', '.join(rows)}"
+    return sql, parameters
+
+def insert_batch_data(table: str, data: List[Dict], compile_stats: bool = False):
+    """Insert batch data using Redshift Data API"""
+    
+    columns = get_table_columns(table)
+    
+    if not maintains_summary(table):
+        sql, parameters = build_parameterized_insert(table, columns, data)
+        result = execute_sql_query(sql, parameters, compile_stats=compile_stats)
+        check_appended_ids(table, data)
+        table_changed(table)
+        return result
+    
+    # The summary delta has to commit with the rows, but batches take no Parameters:
+    # the rows keep their parameterized INSERT into a staging table of this request's
+    # own, and one batch moves them into the table with their delta
+    stage = f"{table}_stage_{uuid.uuid4().hex[:12]}"
+    execute_batch_statements([f"CREATE TABLE hr_data.{stage} (LIKE hr_data.{table})"])
+    try:
+        sql, parameters = build_parameterized_insert(table, columns, data, target=stage)
+        result = execute_sql_query(sql, parameters, compile_stats=compile_stats)
+        statement_id = execute_batch_statements(build_stage_insert_statements(table, f"hr_data.{stage}"))
+    except Exception:
+        execute_batch_statements([f"DROP TABLE IF EXISTS hr_data.{stage}"])
+        raise
+    if compile_stats:
+        result['compile_stats'] = merge_compile_stats([result['compile_stats'], batch_compile_stats(statement_id)])
+    
+    check_appended_ids(table, data)
+    table_changed(table)
+    return result
+
+def maintains_summary(table: str) -> bool:
+    """Whether writes to this table must also update hr_data.hiring_summary"""
+    return MAINTAIN_HIRING_SUMMARY and table == 'hired_employees'
+
+def batch_compile_stats(statement_id: str) -> Dict[str, Any]:
+    """Compile stats summed over the sub-statements of a batch"""
+    description = get_client('redshift-data').describe_statement(Id=statement_id)
+    return merge_compile_stats([
+        get_compile_stats(sub.get('RedshiftQueryId')) for sub in description.get('SubStatements', [])
+    ])
+
+def summary_statements(stage: str, replaces: bool, delta_table: str = None) -> List[str]:
+    """The summary delta of staged rows: applied now, or recorded in a chunked load's delta table"""
+    if delta_table:
+        return hiring_summary.record_delta_statements(stage, delta_table, replaces=replaces)
+    return hiring_summary.delta_statements(stage, replaces=replaces)
+
+def build_stage_insert_statements(table: str, stage: str, delta_table: str = None) -> List[str]:
+    """Append the rows loaded into ``stage`` with their summary delta, and drop it"""
+    column_list = ', '.join(get_table_columns(table))
+    return [
+        *summary_statements(stage, False, delta_table),
+        f"INSERT INTO hr_data.{table} ({column_list}) SELECT {column_list} FROM {stage}",
+        f"DROP TABLE {stage}"
+    ]
+
+def build_insert_statements(table: str, values_clause: str, delta_table: str = None) -> List[str]:
+    """Build the statements that append pre-rendered VALUES rows
+    
+    hired_employees rows go through a temp table so the summary delta can be
+    aggregated from them in the same transaction.
     """
+    column_list = ', '.join(get_table_columns(table))
+    if not maintains_summary(table):
+        return [f"INSERT INTO hr_data.{table} ({column_list}) VALUES {values_clause}"]
     
-    execute_sql_query(sql)
+    stage = f"{table}_stage"
+    return [
+        f"CREATE TEMP TABLE {stage} (LIKE hr_data.{table})",
+        f"INSERT INTO {stage} ({column_list}) VALUES {values_clause}",
+        *build_stage_insert_statements(table, stage, delta_table)
+    ]
 
-def backup_table(table: str):
-    """Backup table to S3 in AVRO format using Redshift Data API"""
+def dedupe_by_id(data: List[Dict]) -> List[Dict]:
+    """Keep the last record for each id"""
+    # A restore chain can mix string-typed older backups with typed ones, so compare ids as text
+    return list({str(record['id']): record for record in data}.values())
+
+def build_merge_statements(table: str, values_clause: str, delta_table: str = None) -> List[str]:
+    """Build the staging load and MERGE statements for pre-rendered VALUES rows"""
     
-    # Get table data
-    result = execute_sql_query(f"SELECT * FROM hr_data.{table}")
+    columns = get_table_columns(table)
     
-    # Convert to AVRO format
-    if result['rows']:
-        # Create AVRO schema
-        fields = []
-        for col in result['columns']:
-            fields.append({"name": col, "type": ["null", "string"]})
-        
-        schema = {
-            "type": "record",
-            "name": table,
-            "fields": fields
-        }
-        
-        # Convert rows to records
-        records = []
-        for row in result['rows']:
-            record = {}
-            for i, col in enumerate(result['columns']):
-                record[col] = str(row[i]) if row[i] is not None else None
-            records.append(record)
-        
-        # Write to AVRO
-        buffer = io.BytesIO()
-        fastavro.writer(buffer, schema, records)
-        buffer.seek(0)
-        
-        backup_key = f"backups/{table}/{datetime.now().isoformat()}.avro"
-        s3_client.put_object(Bucket=S3_BUCKET, Key=backup_key, Body=buffer.getvalue())
-        
-        return backup_key
+    stage = f"{table}_stage"
+    column_list = ', '.join(columns)
+    update_list = ', '.join(f"{col} = s.{col}" for col in columns if col != 'id')
+    source_list = ', '.join(f"s.{col}" for col in columns)
+    
+    # The summary delta reads the rows being replaced, so it runs before the MERGE
+    summary = summary_statements(stage, True, delta_table) if maintains_summary(table) else []
+    
+    return [
+        f"CREATE TEMP TABLE {stage} (LIKE hr_data.{table})",
+        f"INSERT INTO {stage} ({column_list}) VALUES {values_clause}",
+        *summary,
+        f"""
+        MERGE INTO hr_data.{table} USING {stage} s ON hr_data.{table}.id = s.id
+        WHEN MATCHED THEN UPDATE SET {update_list}
+        WHEN NOT MATCHED THEN INSERT ({column_list}) VALUES ({source_list})
+        """,
+        f"DROP TABLE {stage}"
+    ]
+
+def build_upsert_statements(table: str, data: List[Dict]) -> List[str]:
+    """Build the staging load and MERGE statements for an upsert keyed on id"""
+    
+    columns = get_table_columns(table)
+    
+    # MERGE rejects duplicate source keys, so the last occurrence of an id wins
+    records = dedupe_by_id(data)
+    
+    return build_merge_statements(table, build_values_clause(table, columns, records))
+
+def upsert_batch_data(table: str, data: List[Dict]):
+    """Insert or update batch data keyed on id in one transaction"""
+    execute_batch_statements(build_upsert_statements(table, data))
+    break_backup_chain(table)
+    table_changed(table)
+
+def table_changed(table: str):
+    """Drop this container's dimension cache after writing to departments or jobs"""
+    if table in DIMENSIONS:
+        DIMENSION_CACHE.invalidate()
+
+def decode_payload(raw, content_type: str = '') -> Dict:
+    """Decode a JSON, NDJSON or gzip-compressed request payload"""
+    if isinstance(raw, str):
+        raw = raw.encode('utf-8')
+    
+    if raw[:2] == b'\x1f\x8b':
+        raw = gzip.decompress(raw)
+    
+    text = raw.decode('utf-8')
+    if 'ndjson' not in content_type and 'jsonlines' not in content_type:
+        try:
+            payload = json.loads(text)
+            return {'data': payload} if isinstance(payload, list) else payload
+        except json.JSONDecodeError:
+            # More than one JSON document usually means newline-delimited records
+            if '\n' not in text.strip():
+                raise
+    
+    return {'data': [json.loads(line) for line in text.splitlines() if line.strip()]}
+
+def parse_request_body(event) -> Dict:
+    """Parse the API Gateway request body into a dict"""
+    raw = event.get('body')
+    if not raw:
+        return {}
+    
+    if event.get('isBase64Encoded'):
+        raw = base64.b64decode(raw)
+    
+    request_headers = {k.lower(): v for k, v in (event.get('headers') or {}).items()}
+    return decode_payload(raw, request_headers.get('content-type', ''))
+
+def load_s3_rows(key: str) -> List[Dict]:
+    """Load ingestion rows from a JSON, NDJSON or gzip object in the API's bucket
+    
+    Only S3_BUCKET is read: a caller-chosen bucket would let any caller read
+    whatever the Lambda's role can.
+    """
+    with request_metrics.current().phase('s3_read'):
+        response = get_client('s3').get_object(Bucket=S3_BUCKET, Key=key)
+        raw = response['Body'].read()
+    content_type = 'ndjson' if '.ndjson' in key or '.jsonl' in key else response.get('ContentType', '')
+    return decode_payload(raw, content_type).get('data', [])
+
+def needs_chunking(data: List[Dict], body: Dict) -> bool:
+    """Decide whether a payload is too large for a single INSERT statement"""
+    if body.get('s3_key') or len(data) > MAX_INLINE_ROWS:
+        return True
+    return len(json.dumps(data, default=str)) > INGEST_CHUNK_BYTES
+
+def chunk_rows(table: str, data: List[Dict], max_bytes: int = None) -> List[Dict]:
+    """Split records into VALUES chunks that each fit a statement byte budget"""
+    
+    columns = get_table_columns(table)
+    max_bytes = max_bytes or INGEST_CHUNK_BYTES
+    
+    chunks = []
+    rows = []
+    size = 0
+    for record in data:
+        row = render_row(table, columns, record)
+        row_bytes = len(row.encode('utf-8')) + 2
+        if rows and size + row_bytes > max_bytes:
+            chunks.append({'rows': len(rows), 'bytes': size, 'values': ', '.join(rows)})
+            rows = []
+            size = 0
+        rows.append(row)
+        size += row_bytes
+    
+    if rows:
+        chunks.append({'rows': len(rows), 'bytes': size, 'values': ', '.join(rows)})
+    
+    return chunks
+
+def submit_chunk(table: str, mode: str, index: int, chunk: Dict, delta_table: str = None) -> Dict:
+    """Run one chunk as its own batch transaction and report its outcome"""
+    
+    if mode == 'upsert':
+        statements = build_merge_statements(table, chunk['values'], delta_table)
+    else:
+        statements = build_insert_statements(table, chunk['values'], delta_table)
+    
+    started = time.time()
+    status = {'chunk': index, 'rows': chunk['rows'], 'bytes': chunk['bytes']}
+    try:
+        status['statement_id'] = execute_batch_statements(statements)
+        status['status'] = 'FINISHED'
+    except Exception as e:
+        status['status'] = 'FAILED'
+        status['error'] = str(e)
+    status['elapsed_ms'] = round((time.time() - started) * 1000, 1)
+    
+    return status
+
+def ingest_rows(table: str, data: List[Dict], mode: str = 'append') -> Dict[str, Any]:
+    """Load an arbitrarily large set of rows as concurrent byte-budgeted chunks"""
+    
+    if mode == 'upsert':
+        # Dedupe across the whole payload so concurrent chunks never touch the same id
+        data = dedupe_by_id(data)
+    
+    chunks = chunk_rows(table, data)
+    
+    # Chunks run concurrently, so each records its summary delta and the summary
+    # takes them all at once; concurrent MERGEs into it would fail each other
+    delta_table = f"hr_data.hiring_summary_delta_{uuid.uuid4().hex[:12]}" if maintains_summary(table) else None
+    if delta_table:
+        execute_batch_statements(hiring_summary.create_delta_table_statements(delta_table))
+    
+    started = time.time()
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, min(INGEST_MAX_IN_FLIGHT, len(chunks)))) as executor:
+            results = list(executor.map(lambda item: submit_chunk(table, mode, *item, delta_table), enumerate(chunks)))
+    finally:
+        # A failed chunk rolled back its delta with its rows; the finished ones' deltas are applied
+        if delta_table:
+            execute_batch_statements(hiring_summary.apply_delta_statements(delta_table))
+    elapsed = max(time.time() - started, 1e-6)
+    if mode == 'upsert':
+        break_backup_chain(table)
     else:
-        raise Exception(f"No data found in table {table}")
+        check_appended_ids(table, data)
+    table_changed(table)
+    
+    loaded_rows = sum(r['rows'] for r in results if r['status'] == 'FINISHED')
+    loaded_bytes = sum(r['bytes'] for r in results if r['status'] == 'FINISHED')
+    
+    return {
+        'rows': len(data),
+        'loaded_rows': loaded_rows,
+        'failed_chunks': sum(1 for r in results if r['status'] == 'FAILED'),
+        'elapsed_seconds': round(elapsed, 3),
+        'rows_per_second': round(loaded_rows / elapsed, 1),
+        'bytes_per_second': round(loaded_bytes / elapsed, 1),
+        'chunks': results
+    }
+
+BACKUP_MODES = ('full', 'incremental')
+
+# AVRO block codec and target block size (fastavro's sync_interval, in bytes of encoded
+# records per block). snappy needs cramjam and zstandard needs backports.zstd.
+BACKUP_CODECS = ('null', 'deflate', 'snappy', 'zstandard')
+BACKUP_CODEC = os.environ.get('BACKUP_CODEC', 'deflate')
+BACKUP_BLOCK_SIZE = int(os.environ.get('BACKUP_BLOCK_SIZE', '16000'))
+MIN_BLOCK_SIZE = 1024
+MAX_BLOCK_SIZE = 64 * 1024 * 1024
+
+# Backups are AVRO files by default. Parquet backups can be queried in place (Redshift
+# Spectrum, DuckDB, Athena) and need pyarrow, which is only imported when one is written or read.
+BACKUP_FORMATS = ('avro', 'parquet')
+BACKUP_FORMAT = os.environ.get('BACKUP_FORMAT', 'avro')
+PARQUET_ROW_GROUP_ROWS = int(os.environ.get('PARQUET_ROW_GROUP_ROWS', '100000'))
+
+# Parquet compression for each backup codec
+PARQUET_COMPRESSION = {'null': 'none', 'deflate': 'gzip', 'snappy': 'snappy', 'zstandard': 'zstd'}
+
+# Sort keys from the table DDL. Parquet backups are written in this order, so each row
+# group's min/max statistics cover a narrow range that readers can skip on.
+SORT_KEYS = {
+    'departments': ['id'],
+    'jobs': ['id'],
+    'hired_employees': ['datetime', 'department_id'],
+}
+
+# Timestamp column a table's Parquet backups are partitioned on by year (year=2021/)
+PARTITION_COLUMNS = {'hired_employees': 'datetime'}
 
-def restore_table(table: str, backup_key: str):
-    """Restore table from S3 AVRO backup using Redshift Data API"""
+# Column whose high-water mark bounds an incremental backup. Rows past the last exported id
+# are the new rows, but an id watermark cannot see rows updated in place or appended at or
+# below it, so an upsert, a restore or such an append breaks the table's chain
+# (break_backup_chain) and its next incremental backup is full.
+WATERMARK_COLUMN = 'id'
+
+# Tables that take new rows as new ids and can be backed up incrementally. departments
+# and jobs are small dimensions maintained by upsert and are always backed up in full.
+APPEND_ONLY_TABLES = ('hired_employees',)
+
+def parse_backup_format(options: Dict[str, Any]) -> str:
+    backup_format = options.get('format') or BACKUP_FORMAT
+    if backup_format not in BACKUP_FORMATS:
+        raise ValueError(f"Invalid format: {backup_format}. Expected one of {', '.join(BACKUP_FORMATS)}")
+    return backup_format
+
+def parse_backup_options(options: Dict[str, Any]):
+    """Return the (codec, block_size) requested for a backup, validating both"""
+    codec = options.get('codec') or BACKUP_CODEC
+    if codec not in BACKUP_CODECS:
+        raise ValueError(f"Invalid codec: {codec}. Expected one of {', '.join(BACKUP_CODECS)}")
     
-    # Get backup from S3
-    response = s3_client.get_object(Bucket=S3_BUCKET, Key=backup_key)
-    buffer = io.BytesIO(response['Body'].read())
+    try:
+        block_size = int(options.get('block_size') or BACKUP_BLOCK_SIZE)
+    except (TypeError, ValueError):
+        raise ValueError(f"block_size must be an integer, got {options.get('block_size')}")
+    if not MIN_BLOCK_SIZE <= block_size <= MAX_BLOCK_SIZE:
+        raise ValueError(f"block_size must be between {MIN_BLOCK_SIZE} and {MAX_BLOCK_SIZE} bytes")
+    return codec, block_size
+
+# Redshift column types (Data API typeName) and the AVRO type a backup stores them as;
+# anything not listed, including numerics without a known precision, is kept as a string
+AVRO_TYPES = {
+    'int2': 'int',
+    'int4': 'int',
+    'int8': 'long',
+    'float4': 'float',
+    'float8': 'double',
+    'bool': 'boolean',
+    'date': {'type': 'int', 'logicalType': 'date'},
+    'timestamp': {'type': 'long', 'logicalType': 'local-timestamp-micros'},
+    'timestamptz': {'type': 'long', 'logicalType': 'timestamp-micros'},
+}
+
+def avro_field_type(column: Dict[str, Any]):
+    """AVRO type for one column of a result's ColumnMetadata"""
+    type_name = (column.get('typeName') or '').lower()
+    if type_name in ('numeric', 'decimal') and column.get('precision'):
+        return {'type': 'bytes', 'logicalType': 'decimal',
+                'precision': column['precision'], 'scale': column.get('scale') or 0}
+    return AVRO_TYPES.get(type_name, 'string')
+
+def avro_schema(table: str, columns: List[str], metadata: List[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """AVRO record schema for a backup
     
-    # Read AVRO data
+    Fields are typed from the result's ColumnMetadata, so integers, timestamps
+    and decimals are stored in binary. Without metadata every column is a
+    nullable string, which is how backups were written before.
+    """
+    fields = []
+    for i, col in enumerate(columns):
+        field_type = avro_field_type(metadata[i]) if metadata else "string"
+        fields.append({"name": col, "type": ["null", field_type]})
+    
+    return {
+        "type": "record",
+        "name": table,
+        "fields": fields
+    }
+
+def avro_value(value, field_type):
+    """Convert a decoded Data API value (numerics and timestamps arrive as text) for an AVRO field"""
+    if value is None:
+        return None
+    if field_type == 'string':
+        return str(value)
+    if field_type in ('int', 'long'):
+        return int(value)
+    if field_type in ('float', 'double'):
+        return float(value)
+    if field_type == 'boolean':
+        return value if isinstance(value, bool) else str(value).lower() in ('true', 't', '1')
+    
+    logical_type = field_type['logicalType']
+    if logical_type == 'decimal':
+        return Decimal(str(value))
+    if logical_type == 'date':
+        return value if isinstance(value, date) else date.fromisoformat(value)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if logical_type == 'timestamp-micros' and value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value
+
+def schema_hash(schema: Dict[str, Any]) -> str:
+    """Short stable fingerprint of a schema, to spot backups taken before a column change"""
+    return hashlib.sha256(json.dumps(schema, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+def write_avro_backup(table: str, columns: List[str], rows: List[List], backup_key: str,
+                      codec: str = BACKUP_CODEC, block_size: int = BACKUP_BLOCK_SIZE,
+                      metadata: List[Dict[str, Any]] = None) -> int:
+    """Write query rows to S3 as an AVRO file typed from the result's ColumnMetadata
+    
+    The codec and block size are also stored as S3 object metadata. Returns the
+    size of the object written.
+    """
+    import fastavro
+    
+    schema = avro_schema(table, columns, metadata)
+    field_types = [field['type'][1] for field in schema['fields']]
+    
+    # Convert rows to records
     records = []
-    for record in fastavro.reader(buffer):
+    for row in rows:
+        record = {}
+        for i, col in enumerate(columns):
+            record[col] = avro_value(row[i], field_types[i])
         records.append(record)
     
-    if records:
-        # Clear existing data first
-        delete_sql = f"DELETE FROM hr_data.{table}"
-        execute_sql_query(delete_sql)
-        
-        # Insert backup data in smaller batches
-        columns = list(records[0].keys())
-        batch_size = 100  # Process in smaller batches
+    # Write to AVRO
+    buffer = io.BytesIO()
+    fastavro.writer(buffer, schema, records, codec=codec, sync_interval=block_size)
+    body = buffer.getvalue()
+    
+    with request_metrics.current().phase('s3_write'):
+        get_client('s3').put_object(Bucket=S3_BUCKET, Key=backup_key, Body=body,
+                                    Metadata={'codec': codec, 'block-size': str(block_size)})
+    return len(body)
+
+def read_avro_backup(backup_key: str) -> List[Dict]:
+    """Read every record of an AVRO backup file from S3"""
+    import fastavro
+    
+    with request_metrics.current().phase('s3_read'):
+        response = get_client('s3').get_object(Bucket=S3_BUCKET, Key=backup_key)
+        buffer = io.BytesIO(response['Body'].read())
+    return list(fastavro.reader(buffer))
+
+def parquet_type(field_type):
+    """Arrow type for an AVRO field type, so both formats store a column the same way"""
+    import pyarrow as pa
+    
+    if field_type == 'string':
+        return pa.string()
+    if not isinstance(field_type, dict):
+        return {'int': pa.int32(), 'long': pa.int64(), 'float': pa.float32(), 'double': pa.float64(),
+                'boolean': pa.bool_()}[field_type]
+    
+    logical_type = field_type['logicalType']
+    if logical_type == 'decimal':
+        return pa.decimal128(field_type['precision'], field_type['scale'])
+    if logical_type == 'date':
+        return pa.date32()
+    return pa.timestamp('us', tz='UTC' if logical_type == 'timestamp-micros' else None)
+
+def partition_path(table: str, record: Dict[str, Any]) -> str:
+    """Hive-style partition directory of a record, '' for unpartitioned tables"""
+    column = PARTITION_COLUMNS.get(table)
+    if column is None:
+        return ''
+    value = record[column]
+    return f"year={value.year if value is not None else '__HIVE_DEFAULT_PARTITION__'}/"
+
+def write_parquet_backup(table: str, columns: List[str], rows: List[List], backup_prefix: str,
+                         codec: str = BACKUP_CODEC, metadata: List[Dict[str, Any]] = None,
+                         row_group_rows: int = None) -> Dict[str, Any]:
+    """Write query rows to S3 as Parquet files under a Hive-style partition layout
+    
+    Rows are sorted by the table's sort key and split into row groups of
+    row_group_rows, each with min/max statistics per column, so engines reading
+    the files in place (Spectrum, DuckDB) prune partitions and row groups on
+    predicates instead of scanning the whole backup. Returns the keys written and
+    their total size.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    
+    schema = avro_schema(table, columns, metadata)
+    field_types = [field['type'][1] for field in schema['fields']]
+    arrow_schema = pa.schema([pa.field(col, parquet_type(field_type)) for col, field_type in zip(columns, field_types)])
+    
+    records = [{col: avro_value(row[i], field_types[i]) for i, col in enumerate(columns)} for row in rows]
+    sort_key = [col for col in SORT_KEYS.get(table, [WATERMARK_COLUMN]) if col in columns]
+    records.sort(key=lambda record: [(record[col] is None, record[col]) for col in sort_key])
+    
+    partitions: Dict[str, List[Dict]] = {}
+    for record in records:
+        partitions.setdefault(partition_path(table, record), []).append(record)
+    
+    files = []
+    size = 0
+    for partition, partition_records in sorted(partitions.items()):
+        buffer = io.BytesIO()
+        pq.write_table(
+            pa.Table.from_pylist(partition_records, schema=arrow_schema),
+            buffer,
+            row_group_size=row_group_rows or PARQUET_ROW_GROUP_ROWS,
+            compression=PARQUET_COMPRESSION[codec],
+            write_statistics=True,
+            sorting_columns=[pq.SortingColumn(columns.index(col)) for col in sort_key],
+        )
+        body = buffer.getvalue()
+        key = f"{backup_prefix}{partition}part-00000.parquet"
+        with request_metrics.current().phase('s3_write'):
+            get_client('s3').put_object(Bucket=S3_BUCKET, Key=key, Body=body,
+                                        Metadata={'codec': codec, 'sort-key': ','.join(sort_key)})
+        files.append(key)
+        size += len(body)
+    return {'files': files, 'size_bytes': size}
+
+def read_parquet_backup(backup_key: str) -> List[Dict]:
+    """Read every record of a Parquet backup file from S3"""
+    import pyarrow.parquet as pq
+    
+    with request_metrics.current().phase('s3_read'):
+        response = get_client('s3').get_object(Bucket=S3_BUCKET, Key=backup_key)
+        buffer = io.BytesIO(response['Body'].read())
+    return pq.read_table(buffer).to_pylist()
+
+def read_backup_file(backup_key: str) -> List[Dict]:
+    if backup_key.endswith('.parquet'):
+        return read_parquet_backup(backup_key)
+    return read_avro_backup(backup_key)
+
+def write_manifest(manifest_key: str, manifest: Dict[str, Any]):
+    with request_metrics.current().phase('s3_write'):
+        get_client('s3').put_object(Bucket=S3_BUCKET, Key=manifest_key, Body=json.dumps(manifest),
+                                    ContentType='application/json')
+
+def read_manifest(manifest_key: str) -> Dict[str, Any]:
+    with request_metrics.current().phase('s3_read'):
+        response = get_client('s3').get_object(Bucket=S3_BUCKET, Key=manifest_key)
+        return json.loads(response['Body'].read())
+
+CATALOG_MAX_ATTEMPTS = 5
+
+def catalog_key(table: str) -> str:
+    return f"backups/{table}/catalog.json"
+
+def read_catalog(table: str):
+    """Return a table's backup catalog and its ETag (None when there is no catalog yet)"""
+    try:
+        with request_metrics.current().phase('s3_read'):
+            response = get_client('s3').get_object(Bucket=S3_BUCKET, Key=catalog_key(table))
+            return json.loads(response['Body'].read()), response['ETag']
+    except ClientError as e:
+        if e.response['Error']['Code'] not in ('NoSuchKey', '404'):
+            raise
+        return {'table': table, 'entries': []}, None
+
+def update_catalog(table: str, change) -> Dict[str, Any]:
+    """Apply change to the table's catalog in place and write it back
+    
+    The catalog is rewritten with a conditional put (If-Match on the ETag read, or
+    If-None-Match for a new catalog), so a concurrent writer can never drop an
+    entry; on a conflict the catalog is re-read and the change applied again.
+    """
+    for _ in range(CATALOG_MAX_ATTEMPTS):
+        catalog, etag = read_catalog(table)
+        change(catalog)
+        condition = {'IfMatch': etag} if etag else {'IfNoneMatch': '*'}
+        try:
+            with request_metrics.current().phase('s3_write'):
+                get_client('s3').put_object(Bucket=S3_BUCKET, Key=catalog_key(table), Body=json.dumps(catalog),
+                                            ContentType='application/json', **condition)
+            return catalog
+        except ClientError as e:
+            if e.response['Error']['Code'] not in ('PreconditionFailed', 'ConditionalRequestConflict'):
+                raise
+    raise Exception(f"Backup catalog for {table} kept changing; gave up after {CATALOG_MAX_ATTEMPTS} attempts")
+
+def add_catalog_entry(table: str, entry: Dict[str, Any]) -> Dict[str, Any]:
+    """Append a backup to the table's catalog"""
+    def append(catalog):
+        catalog['entries'].append(entry)
+        catalog['entries'].sort(key=lambda e: e['created_at'])
+    return update_catalog(table, append)
+
+def break_backup_chain(table: str):
+    """Make the table's next incremental backup a full one
+    
+    Called after rows were updated in place (an upsert) or replaced (a restore),
+    which the id watermark of an incremental backup cannot see.
+    """
+    if table in APPEND_ONLY_TABLES:
+        stamp = datetime.now().isoformat()
+        update_catalog(table, lambda catalog: catalog.update(chain_broken_at=stamp))
+
+def check_appended_ids(table: str, data: List[Dict]):
+    """Break the table's chain when appended ids are at or below its newest backup's watermark
+    
+    An incremental backup exports the rows past that watermark, so it would never
+    see such rows. Called once the append has committed.
+    """
+    if table not in APPEND_ONLY_TABLES or not data:
+        return
+    latest = find_backup(table)
+    if latest is None:
+        return
+    watermark = latest.get('high_watermark')
+    if watermark is None:
+        # Catalog entries written before the watermark was recorded there
+        watermark = read_manifest(latest['key'])['high_watermark']
+    if min(int(record[WATERMARK_COLUMN]) for record in data) <= watermark:
+        break_backup_chain(table)
+
+def chain_broken_since(table: str, base: Dict[str, Any]) -> bool:
+    """Whether rows changed in place after the base backup started reading the table"""
+    broken_at = read_catalog(table)[0].get('chain_broken_at')
+    started_at = base.get('started_at') or base['created_at']
+    return broken_at is not None and parse_timestamp(broken_at) >= parse_timestamp(started_at)
+
+def parse_timestamp(value: str) -> datetime:
+    """Parse an ISO timestamp as naive UTC (backup timestamps are written in UTC)"""
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise ValueError(f"Invalid timestamp: {value}. Expected ISO 8601, e.g. 2024-01-01T12:00:00")
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def find_backup(table: str, as_of: str = None):
+    """Return the newest catalog entry, or the newest taken at or before as_of"""
+    entries = read_catalog(table)[0]['entries']
+    if as_of is None:
+        return entries[-1] if entries else None
+    
+    index = bisect.bisect_right(entries, parse_timestamp(as_of), key=lambda e: parse_timestamp(e['created_at']))
+    return entries[index - 1] if index else None
+
+def latest_manifest_key(table: str):
+    """Return the newest backup manifest key for a table, or None
+    
+    Comes from the catalog; tables backed up before the catalog existed fall back
+    to listing the backup prefix.
+    """
+    latest = find_backup(table)
+    if latest is not None:
+        return latest['key']
+    
+    client = get_client('s3')
+    request = {'Bucket': S3_BUCKET, 'Prefix': f"backups/{table}/"}
+    latest = None
+    while True:
+        with request_metrics.current().phase('s3_read'):
+            page = client.list_objects_v2(**request)
+        for item in page.get('Contents', []):
+            if item['Key'].endswith('.manifest.json') and (latest is None or item['Key'] > latest):
+                latest = item['Key']
+        if not page.get('IsTruncated'):
+            return latest
+        request['ContinuationToken'] = page['NextContinuationToken']
+
+def backup_table(table: str, mode: str = 'full', codec: str = BACKUP_CODEC,
+                 block_size: int = BACKUP_BLOCK_SIZE, backup_format: str = BACKUP_FORMAT) -> Dict[str, Any]:
+    """Backup table to S3 in AVRO or Parquet format using Redshift Data API
+    
+    A full backup exports every row. An incremental backup exports only rows past the
+    watermark of the newest manifest and chains to it; with no earlier manifest, or
+    when rows were upserted or restored since that backup started, it falls back to a
+    full backup. Returns the manifest written (or the newest one when there is nothing
+    new to export).
+    """
+    base_key = latest_manifest_key(table) if mode == 'incremental' else None
+    base = read_manifest(base_key) if base_key else None
+    if base is not None and chain_broken_since(table, base):
+        base_key, base = None, None
+    
+    # A change committed after this point may be missing from the backup, so a
+    # chain break is compared against when the read started, not when it finished
+    started_at = datetime.now().isoformat()
+    if base is None:
+        mode = 'full'
+        result = execute_sql_query(f"SELECT * FROM hr_data.{table}", metadata=True)
+        if not result['rows']:
+            raise Exception(f"No data found in table {table}")
+    else:
+        result = execute_sql_query(
+            f"SELECT * FROM hr_data.{table} WHERE {WATERMARK_COLUMN} > :watermark",
+            {'watermark': base['high_watermark']},
+            metadata=True
+        )
+        if not result['rows']:
+            return dict(base, manifest_key=base_key, rows=0)
+    
+    stamp = datetime.now().isoformat()
+    # backups/{table}/parquet/{stamp}/year=2021/part-00000.parquet or backups/{table}/{stamp}.avro
+    backup_key = f"backups/{table}/parquet/{stamp}/" if backup_format == 'parquet' else f"backups/{table}/{stamp}.avro"
+    return write_table_backup(table, result, backup_key, f"backups/{table}/{stamp}.manifest.json", codec,
+                              block_size, backup_format, started_at, stamp, mode, base_key, base)
+
+def write_table_backup(table: str, result: Dict[str, Any], backup_key: str, manifest_key: str, codec: str,
+                       block_size: int, backup_format: str, started_at: str, stamp: str, mode: str = 'full',
+                       base_key: str = None, base: Dict[str, Any] = None) -> Dict[str, Any]:
+    """Write exported rows, their manifest and the table's catalog entry; returns the manifest
+    
+    backup_key is the AVRO file, or for Parquet the prefix the partition files go under.
+    """
+    watermark_index = result['columns'].index(WATERMARK_COLUMN)
+    schema = avro_schema(table, result['columns'], result['metadata'])
+    if backup_format == 'parquet':
+        written = write_parquet_backup(table, result['columns'], result['rows'], backup_key, codec,
+                                       result['metadata'])
+        files, size = written['files'], written['size_bytes']
+    else:
+        size = write_avro_backup(table, result['columns'], result['rows'], backup_key, codec, block_size,
+                                 result['metadata'])
+        files = [backup_key]
+    
+    manifest = {
+        'table': table,
+        'mode': mode,
+        'format': backup_format,
+        'backup_key': backup_key,
+        'files': files,
+        'base': base_key,
+        'watermark_column': WATERMARK_COLUMN,
+        'low_watermark': base['high_watermark'] if base else None,
+        # A snapshot can hold an empty table
+        'high_watermark': max((int(row[watermark_index]) for row in result['rows']), default=0),
+        'rows': len(result['rows']),
+        'codec': codec,
+        'block_size': block_size,
+        'size_bytes': size,
+        'schema_hash': schema_hash(schema),
+        'started_at': started_at,
+        'created_at': stamp
+    }
+    write_manifest(manifest_key, manifest)
+    add_catalog_entry(table, {
+        'key': manifest_key,
+        'created_at': stamp,
+        'mode': mode,
+        'format': backup_format,
+        'rows': manifest['rows'],
+        'schema_hash': manifest['schema_hash'],
+        'high_watermark': manifest['high_watermark'],
+        'codec': codec,
+        'size_bytes': size
+    })
+    return dict(manifest, manifest_key=manifest_key)
+
+def resolve_backup_chain(backup_key: str) -> List[str]:
+    """Return the backup files to replay for a backup, oldest first
+    
+    A manifest key expands to the files of its full base followed by those of every
+    delta up to it; a bare key (backups taken before manifests existed, or a
+    snapshot's table file) restores on its own when it holds a whole table.
+    """
+    if not backup_key.endswith('.manifest.json'):
+        check_raw_backup_key(backup_key)
+        return [backup_key]
+    
+    chain = []
+    seen = set()
+    while backup_key:
+        if backup_key in seen:
+            raise Exception(f"Backup manifest chain loops at {backup_key}")
+        seen.add(backup_key)
+        manifest = read_manifest(backup_key)
+        # Manifests written before Parquet backups name a single AVRO file
+        chain.append(manifest.get('files') or [manifest['backup_key']])
+        backup_key = manifest['base']
+    return [key for files in chain[::-1] for key in files]
+
+# backups/{table}/parquet/{stamp}/..., whose manifest is backups/{table}/{stamp}.manifest.json
+PARQUET_KEY_PATTERN = re.compile(r'^backups/([^/]+)/parquet/([^/]+)/')
+
+def check_raw_backup_key(backup_key: str):
+    """Reject a bare backup key that is not one AVRO file holding the whole table
+    
+    A delta's file has only the rows past its base's watermark, so restoring it
+    alone would drop every other row, and a Parquet backup is a prefix of
+    partition files; both restore through their manifest.
+    """
+    parquet = PARQUET_KEY_PATTERN.match(backup_key)
+    if parquet:
+        raise ValueError(f"{backup_key} is part of a Parquet backup; restore from its manifest_key "
+                         f"backups/{parquet.group(1)}/{parquet.group(2)}.manifest.json")
+    if not backup_key.endswith('.avro'):
+        raise ValueError(f"{backup_key} is neither a backup manifest nor an AVRO backup file")
+    try:
+        manifest = read_manifest(backup_key[:-len('.avro')] + '.manifest.json')
+    except ClientError as e:
+        if e.response['Error']['Code'] not in ('NoSuchKey', '404'):
+            raise
+        return
+    if manifest.get('mode') == 'incremental':
+        raise ValueError(f"{backup_key} holds an incremental delta only; "
+                         f"restore from its manifest_key {backup_key[:-len('.avro')]}.manifest.json")
+
+RESTORE_BATCH_ROWS = 100
+
+def restore_table(table: str, backup_key: str, compile_stats: bool = False):
+    """Restore table from an S3 AVRO or Parquet backup (or a manifest chain) using Redshift Data API"""
+    
+    # Fetch the base and every delta concurrently, then replay them in chain order
+    files = resolve_backup_chain(backup_key)
+    with ThreadPoolExecutor(max_workers=INGEST_MAX_IN_FLIGHT) as pool:
+        records = [record for batch in pool.map(read_backup_file, files) for record in batch]
+    if len(files) > 1:
+        records = dedupe_by_id(records)
+    
+    if not records:
+        raise ValueError(f"{backup_key} holds no rows; nothing was restored")
+    return reload_table(table, records, compile_stats=compile_stats)
+
+def staging_table(table: str, suffix: str) -> str:
+    """Name of one restore's staging table; the suffix keeps concurrent restores apart"""
+    return f"{table}_restore_{suffix}"
+
+def build_staging_statements(table: str, suffix: str) -> List[str]:
+    """Create an empty restore staging table with the live table's DIST/SORT keys
+    
+    CREATE TABLE ... LIKE copies the distribution style, keys, sort keys and
+    NOT NULL attributes but not the primary key, so that is added back.
+    """
+    stage = staging_table(table, suffix)
+    return [
+        f"CREATE TABLE hr_data.{stage} (LIKE hr_data.{table})",
+        f"ALTER TABLE hr_data.{stage} ADD PRIMARY KEY (id)"
+    ]
+
+def build_swap_statements(table: str, suffix: str, access: List[str] = ()) -> List[str]:
+    """Rename the staging table over the live one, drop the old blocks and re-apply access
+    
+    Grants and datashare membership belong to the table object, not its name, so
+    the renamed-in table starts with neither; ``access`` (from table_access) puts
+    them back in the same transaction, before any consumer can see the new table.
+    """
+    return [
+        f"ALTER TABLE hr_data.{table} RENAME TO {table}_retired_{suffix}",
+        f"ALTER TABLE hr_data.{staging_table(table, suffix)} RENAME TO {table}",
+        f"DROP TABLE hr_data.{table}_retired_{suffix}",
+        *access
+    ]
+
+GRANTEE_PREFIXES = {'user': '', 'group': 'GROUP ', 'role': 'ROLE '}
+
+def grant_statement(table: str, privilege: str, identity_type: str, identity_name: str) -> str:
+    """GRANT that gives an identity one privilege on a table"""
+    if identity_name.lower() == 'public':
+        grantee = 'PUBLIC'
+    else:
+        grantee = f'{GRANTEE_PREFIXES[identity_type.lower()]}"{identity_name}"'
+    return f"GRANT {privilege} ON hr_data.{table} TO {grantee}"
+
+def table_access(tables: List[str]) -> Dict[str, List[str]]:
+    """The statements that re-apply each live table's grants and outbound datashare membership"""
+    names = ', '.join(f"'{table}'" for table in tables)
+    objects = ', '.join(f"'hr_data.{table}'" for table in tables)
+    result = execute_sql_query(f"""
+        SELECT relation_name, privilege_type, identity_type, identity_name, NULL AS share_name
+        FROM svv_relation_privileges
+        WHERE namespace_name = 'hr_data' AND relation_name IN ({names})
+        UNION ALL
+        SELECT SPLIT_PART(object_name, '.', 2), NULL, NULL, NULL, share_name
+        FROM svv_datashare_objects
+        WHERE share_type = 'OUTBOUND' AND object_type = 'table' AND object_name IN ({objects})
+    """)
+    
+    access = {table: [] for table in tables}
+    # Grants first: a table joins a datashare only once its consumers' access is in place
+    for table, privilege, identity_type, identity_name, share in sorted(result['rows'], key=lambda row: row[4] is not None):
+        if share is None:
+            access[table].append(grant_statement(table, privilege, identity_type, identity_name))
+        else:
+            access[table].append(f"ALTER DATASHARE {share} ADD TABLE hr_data.{table}")
+    return access
+
+def stage_records(table: str, records: List[Dict], suffix: str, compile_stats: bool = False):
+    """Load backup records into the table's restore staging table"""
+    execute_batch_statements(build_staging_statements(table, suffix))
+    
+    # Insert backup data in fixed-size batches so every full batch shares one statement shape
+    columns = list(records[0].keys()) if records else []
+    
+    def insert_batch(start):
+        batch = records[start:start + RESTORE_BATCH_ROWS]
+        sql, parameters = build_parameterized_insert(table, columns, batch, target=staging_table(table, suffix))
+        return execute_sql_query(sql, parameters, compile_stats=compile_stats)
+    
+    with ThreadPoolExecutor(max_workers=INGEST_MAX_IN_FLIGHT) as pool:
+        results = list(pool.map(insert_batch, range(0, len(records), RESTORE_BATCH_ROWS)))
+    
+    if compile_stats:
+        return merge_compile_stats([result['compile_stats'] for result in results])
+
+def reload_tables(records_by_table: Dict[str, List[Dict]], compile_stats: bool = False) -> Dict[str, Any]:
+    """Replace the contents of tables with backup records
+    
+    Each table is loaded into a staging copy of its own (named per restore, so
+    concurrent restores never share one) while readers keep seeing the live
+    table, then every staging table is renamed in within one transaction. Nobody
+    sees a partial table, and dropping the old table frees its blocks without the
+    ghost rows a DELETE leaves for VACUUM. (ALTER TABLE APPEND would avoid the
+    rename but cannot run inside a transaction block.) The live tables' grants and
+    datashare membership are re-applied in that transaction, so datashare
+    consumers keep reading them, and a restored hired_employees also has its
+    summary rebuilt there.
+    """
+    suffix = uuid.uuid4().hex[:12]
+    stats = {}
+    try:
+        for table, records in records_by_table.items():
+            stats[table] = stage_records(table, records, suffix, compile_stats=compile_stats)
         
-        for i in range(0, len(records), batch_size):
-            batch = records[i:i + batch_size]
-            values_list = []
-            
-            for record in batch:
-                values = []
-                for col in columns:
-                    value = record.get(col)
-                    if value is None:
-                        values.append('NULL')
-                    elif isinstance(value, str):
-                        values.append(f"'{value.replace(chr(39), chr(39)+chr(39))}'")
-                    else:
-                        values.append(str(value))
-                values_list.append(f"({', '.join(values)})")
-            
-            if values_list:  # Only execute if we have data
-                sql = f"""
-                INSERT INTO hr_data.{table} ({', '.join(columns)})
-                VALUES {', '.join(values_list)}
-                """
-                execute_sql_query(sql)
-
-def execute_report_query(query_name: str, year: int) -> Dict[str, Any]:
-    """Execute predefined report queries using Redshift Data API"""
-    
-    query_templates = {
-        'quarterly_hiring_report': f"""
-            SELECT 
-                d.department,
-                j.job,
-                SUM(CASE WHEN EXTRACT(QUARTER FROM e.datetime) = 1 THEN 1 ELSE 0 END) AS Q1,
-                SUM(CASE WHEN EXTRACT(QUARTER FROM e.datetime) = 2 THEN 1 ELSE 0 END) AS Q2,
-                SUM(CASE WHEN EXTRACT(QUARTER FROM e.datetime) = 3 THEN 1 ELSE 0 END) AS Q3,
-                SUM(CASE WHEN EXTRACT(QUARTER FROM e.datetime) = 4 THEN 1 ELSE 0 END) AS Q4
-            FROM hr_data.hired_employees e
-            JOIN hr_data.departments d ON e.department_id = d.id
-            JOIN hr_data.jobs j ON e.job_id = j.id
-            WHERE EXTRACT(YEAR FROM e.datetime) = {year}
-            GROUP BY d.department, j.job
-            ORDER BY d.department, j.job
-        """,
-        'departments_above_avg_hiring': f"""
-            WITH CTE1 AS (
-                SELECT
-                    d.id AS department_id,
-                    d.department AS department_name,
-                    COUNT(DISTINCT e.id) AS hired,
-                    AVG(COUNT(DISTINCT e.id)) OVER() AS avg_hired
-                FROM hr_data.hired_employees e
-                JOIN hr_data.departments d ON e.department_id = d.id
-                WHERE EXTRACT(YEAR FROM e.datetime) = {year}
-                    AND d.department IS NOT NULL
-                GROUP BY d.id, d.department
-            )
-            SELECT 
-                department_id,
-                department_name,
-                hired,
-                ROUND(avg_hired, 2) AS avg_hired
-            FROM CTE1
-            WHERE hired > avg_hired
-            ORDER BY hired DESC
-        """
+        access = table_access(list(records_by_table))
+        statements = [sql for table in records_by_table for sql in build_swap_statements(table, suffix, access[table])]
+        if any(maintains_summary(table) for table in records_by_table):
+            statements += hiring_summary.rebuild_statements()
+        execute_batch_statements(statements)
+    except Exception:
+        # Staging tables are per restore, so a failed one cleans up after itself;
+        # the restore's own error is the one to report
+        try:
+            execute_batch_statements([f"DROP TABLE IF EXISTS hr_data.{staging_table(table, suffix)}"
+                                      for table in records_by_table])
+        except Exception:
+            pass
+        raise
+    for table in records_by_table:
+        break_backup_chain(table)
+        table_changed(table)
+    return stats
+
+def reload_table(table: str, records: List[Dict], compile_stats: bool = False):
+    """Replace the contents of one table with backup records"""
+    return reload_tables({table: records}, compile_stats=compile_stats)[table]
+
+def backup_all_tables(codec: str = BACKUP_CODEC, block_size: int = BACKUP_BLOCK_SIZE,
+                      backup_format: str = BACKUP_FORMAT) -> Dict[str, Any]:
+    """Back up every hr_data table from one consistent snapshot
+    
+    The SELECTs run as one batch statement, i.e. one transaction, so all three tables
+    are read at the same snapshot. The sub-statement results are then fetched and
+    written to S3 concurrently and covered by a single manifest. Each table also gets
+    a full-backup manifest and catalog entry of its own, so a snapshot shows up in the
+    table's catalog, restores through /restore/{table} and bases incremental backups.
+    """
+    tables = list(TABLE_COLUMNS)
+    started_at = datetime.now().isoformat()
+    statement_id = execute_batch_statements([f"SELECT * FROM hr_data.{table}" for table in tables])
+    stamp = datetime.now().isoformat()
+    
+    def export(index: int) -> Dict[str, Any]:
+        table = tables[index]
+        result = fetch_result(f"{statement_id}:{index + 1}", metadata=True)
+        # backups/snapshots/{stamp}/{table}.avro or backups/snapshots/{stamp}/{table}/part-00000.parquet
+        prefix = f"backups/snapshots/{stamp}/{table}"
+        backup_key = f"{prefix}/" if backup_format == 'parquet' else f"{prefix}.avro"
+        written = write_table_backup(table, result, backup_key, f"{prefix}.manifest.json", codec, block_size,
+                                     backup_format, started_at, stamp)
+        return {'table': table, 'backup_key': backup_key, 'files': written['files'],
+                'manifest_key': written['manifest_key'], 'rows': written['rows'], 'size_bytes': written['size_bytes']}
+    
+    with ThreadPoolExecutor(max_workers=len(tables)) as pool:
+        entries = list(pool.map(export, range(len(tables))))
+    
+    manifest_key = f"backups/snapshots/{stamp}.manifest.json"
+    manifest = {'mode': 'snapshot', 'format': backup_format, 'tables': entries, 'codec': codec,
+                'block_size': block_size, 'created_at': stamp}
+    write_manifest(manifest_key, manifest)
+    return dict(manifest, manifest_key=manifest_key)
+
+def restore_all_tables(manifest_key: str, compile_stats: bool = False):
+    """Reload every table of a snapshot backup, parents before hired_employees"""
+    manifest = read_manifest(manifest_key)
+    if manifest.get('mode') != 'snapshot':
+        raise ValueError(f"{manifest_key} is not a snapshot manifest")
+    
+    entries = sorted(manifest['tables'], key=lambda entry: list(TABLE_COLUMNS).index(entry['table']))
+    
+    def load(entry):
+        # Snapshots written before Parquet support name a single AVRO file
+        return [record for key in entry.get('files') or [entry['backup_key']] for record in read_backup_file(key)]
+    
+    with ThreadPoolExecutor(max_workers=len(entries)) as pool:
+        loaded = list(pool.map(load, entries))
+    
+    # All three tables switch in the same transaction, so the set stays consistent
+    stats = reload_tables({entry['table']: records for entry, records in zip(entries, loaded)},
+                          compile_stats=compile_stats)
+    
+    if compile_stats:
+        return stats
+
+def attach_dimension_names(report, result: Dict[str, Any]) -> Dict[str, Any]:
+    """Turn an ids-variant report result into the named result the joined SQL returns"""
+    for id_column, dimension, name_column, replace in report.attach:
+        result = DIMENSION_CACHE.attach(result, id_column, dimension, name_column, replace)
+    if report.sort:
+        indexes = [result['columns'].index(column) for column in report.sort]
+        result['rows'].sort(key=lambda row: [row[i] for i in indexes])
+    return result
+
+def summary_variant(name: str, parameters: Dict[str, Any], requested: bool = False):
+    """The report's summary variant when it answers these parameters
+    
+    The summary counts whole months, so only windows that start and end on a
+    month boundary (years, quarters and month ranges) can use it. An @opt_in
+    variant, whose counts can differ from the report's, is only used when
+    ``requested``.
+    """
+    report = REPORTS.variants.get((name, 'summary'))
+    if not (MAINTAIN_HIRING_SUMMARY and report and 'window_start' in parameters):
+        return None
+    if report.opt_in and not requested:
+        return None
+    if not hiring_summary.month_aligned(parameters['window_start'], parameters['window_end']):
+        return None
+    return report
+
+def rebuild_hiring_summary(repair: bool = True) -> Dict[str, Any]:
+    """Compare hr_data.hiring_summary with hired_employees and rebuild it when they drifted"""
+    drifted_groups, missing_hires = execute_sql_query(hiring_summary.DRIFT_SQL)['rows'][0]
+    result = {
+        'drifted_groups': int(drifted_groups),
+        'missing_hires': int(missing_hires),
+        'repaired': False
     }
+    if repair and result['drifted_groups']:
+        execute_batch_statements(hiring_summary.rebuild_statements())
+        _report_cache.clear()
+        result['repaired'] = True
+    return result
+
+def execute_report_query(query_name: str, year: int = None, compile_stats: bool = False,
+                         use_cache: bool = True, params: Dict[str, Any] = None,
+                         names: str = 'redshift', source: str = 'auto') -> Dict[str, Any]:
+    """Execute a registered report using Redshift Data API
     
-    query = query_templates.get(query_name)
-    if not query:
-        raise ValueError(f"Unknown query: {query_name}")
+    With names='lambda' the report's ids variant runs instead: Redshift groups by
+    dimension ids and the names come from the warm dimension cache, so the
+    departments and jobs tables are not re-joined on every call. Otherwise a
+    month-aligned window is answered by the report's summary variant, which
+    reads hr_data.hiring_summary instead of every hire in the window;
+    source='summary' also allows a variant that is @opt_in.
+    """
+    if names not in REPORT_NAME_MODES:
+        raise ReportParameterError(f"names must be one of {', '.join(REPORT_NAME_MODES)}")
+    if source not in REPORT_SOURCES:
+        raise ReportParameterError(f"source must be one of {', '.join(REPORT_SOURCES)}")
+    variant = 'ids' if names == 'lambda' else None
+    
+    report = REPORTS.get(query_name, variant)
+    params = dict(params or {})
+    if year is not None:
+        params['year'] = year
+    parameters = report.bind(params)
+    
+    summary = None if variant else summary_variant(report.name, parameters, requested=source == 'summary')
+    if summary:
+        report, variant = summary, 'summary'
+    
+    cache_key = (report.name, variant, tuple(sorted(parameters.items())))
+    cached = cached_report(cache_key) if use_cache and not compile_stats else None
+    if cached is not None:
+        return cached
     
-    return execute_sql_query(query)
+    result = execute_sql_query(report.sql, parameters, compile_stats=compile_stats)
+    if variant:
+        result = attach_dimension_names(report, result)
+    
+    if report.cache_ttl > 0 and not compile_stats:
+        cache_report(cache_key, time.time() + report.cache_ttl, result)
+    
+    return result
 
-def lambda_handler(event, context):
-    # CORS headers
-    headers = {
-        'Access-Control-Allow-Origin': '*',
-        'Access-Control-Allow-Headers': 'Content-Type',
-        'Access-Control-Allow-Methods': 'GET, POST, OPTIONS'
+def cached_report(cache_key: tuple):
+    """A report result cached in this container that has not expired, or None"""
+    with _report_cache_lock:
+        cached = _report_cache.get(cache_key)
+        if cached is None:
+            return None
+        if cached[0] <= time.time():
+            del _report_cache[cache_key]
+            return None
+        _report_cache.move_to_end(cache_key)
+        return cached[1]
+
+def cache_report(cache_key: tuple, expires_at: float, result: Dict[str, Any]):
+    """Cache a report result, evicting expired results and then the least recently used"""
+    with _report_cache_lock:
+        _report_cache[cache_key] = (expires_at, result)
+        _report_cache.move_to_end(cache_key)
+        if len(_report_cache) > REPORT_CACHE_MAX_ENTRIES:
+            now = time.time()
+            for key in [key for key, (expires, _) in _report_cache.items() if expires <= now]:
+                del _report_cache[key]
+        while len(_report_cache) > REPORT_CACHE_MAX_ENTRIES:
+            _report_cache.popitem(last=False)
+
+install_priming_hooks()
+
+def serialize(payload) -> str:
+    """JSON-encode a response body, timed as the serialize phase"""
+    with request_metrics.current().phase('serialize'):
+        return json.dumps(payload)
+
+def route_name(event) -> str:
+    """Low-cardinality route label for metrics (the first path segment)"""
+    if event.get('httpMethod') == 'OPTIONS':
+        return 'options'
+    segment = (event.get('path') or '').strip('/').split('/')[0]
+    return segment if segment in ROUTE_SERVICES else 'other'
+
+def throttled(error: AdmissionRejected) -> Dict[str, Any]:
+    """429 response for a request turned away by admission control"""
+    request_metrics.current().count('AdmissionRejected')
+    return {
+        'statusCode': 429,
+        'headers': {**CORS_HEADERS, 'Retry-After': str(max(1, round(error.retry_after)))},
+        'body': serialize({'error': str(error)})
     }
+
+def lambda_handler(event, context):
+    metrics = request_metrics.start(route_name(event), getattr(context, 'aws_request_id', None))
+    metrics.annotate(method=event.get('httpMethod'), path=event.get('path'))
+    try:
+        if event.get('httpMethod') != 'OPTIONS':
+            ADMISSION.check_rate(admission.caller_id(event), current_workload())
+        response = handle_request(event, context)
+    except AdmissionRejected as e:
+        response = throttled(e)
+    metrics.emit(response['statusCode'])
+    return response
+
+CORS_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Headers': 'Content-Type',
+    'Access-Control-Allow-Methods': 'GET, POST, OPTIONS'
+}
+
+def handle_request(event, context):
+    headers = dict(CORS_HEADERS)
     
     try:
         method = event['httpMethod']
         path = event['path']
-        body = json.loads(event.get('body', '{}')) if event.get('body') else {}
+        body = parse_request_body(event)
         
         # Handle OPTIONS request for CORS
         if method == 'OPTIONS':
             return {
                 'statusCode': 200,
                 'headers': headers,
-                'body': json.dumps({'message': 'CORS preflight'})
+                'body': serialize({'message': 'CORS preflight'})
             }
         
         if method == 'POST' and path.startswith('/data/'):
             table = path.split('/')[-1]
-            data = body.get('data', [])
+            query_params = event.get('queryStringParameters') or {}
+            mode = body.get('mode') or query_params.get('mode', 'append')
+            
+            if mode not in INSERT_MODES:
+                return {
+                    'statusCode': 400,
+                    'headers': headers,
+                    'body': serialize({'error': f"Invalid mode: {mode}. Expected one of {', '.join(INSERT_MODES)}"})
+                }
+            
+            if table not in TABLE_COLUMNS:
+                return {
+                    'statusCode': 400,
+                    'headers': headers,
+                    'body': serialize({'error': 'Invalid table name'})
+                }
+            
+            if 's3_bucket' in body:
+                return {
+                    'statusCode': 400,
+                    'headers': headers,
+                    'body': serialize({'error': 's3_bucket is not accepted; s3_key is read from the API\'s bucket'})
+                }
             
-            if not data or len(data) > 1000:
+            if body.get('s3_key'):
+                data = load_s3_rows(body['s3_key'])
+            else:
+                data = body.get('data', [])
+            
+            if not data:
                 return {
                     'statusCode': 400,
                     'headers': headers,
-                    'body': json.dumps({'error': 'Data must contain 1-1000 rows'})
+                    'body': serialize({'error': 'Data must contain at least one row'})
                 }
             
             # Validate data
@@ -328,53 +1689,233 @@ def lambda_handler(event, context):
                 errors = validate_departments(data)
             elif table == 'jobs':
                 errors = validate_jobs(data)
-            elif table == 'hired_employees':
+            else:
                 errors = validate_hired_employees(data)
+                if not errors and VALIDATE_FOREIGN_KEYS:
+                    errors = DIMENSION_CACHE.foreign_key_errors(data)
+            
+            if errors:
+                return {
+                    'statusCode': 400,
+                    'headers': headers,
+                    'body': serialize({'errors': errors})
+                }
+            
+            if needs_chunking(data, body):
+                result = ingest_rows(table, data, mode)
+                verb = 'Upserted' if mode == 'upsert' else 'Inserted'
+                result['message'] = f"{verb} {result['loaded_rows']} of {len(data)} rows into {table}"
+                return {
+                    'statusCode': 207 if result['failed_chunks'] else 200,
+                    'headers': headers,
+                    'body': serialize(result)
+                }
+            
+            if mode == 'upsert':
+                upsert_batch_data(table, data)
+                return {
+                    'statusCode': 200,
+                    'headers': headers,
+                    'body': serialize({'message': f'Upserted {len(data)} rows into {table}'})
+                }
+            
+            compile_stats = bool(body.get('compile_stats'))
+            result = insert_batch_data(table, data, compile_stats=compile_stats)
+            response_body = {'message': f'Inserted {len(data)} rows into {table}'}
+            if compile_stats:
+                response_body['compile_stats'] = result['compile_stats']
+            return {
+                'statusCode': 200,
+                'headers': headers,
+                'body': serialize(response_body)
+            }
+        
+        elif method == 'GET' and path.startswith('/backups/'):
+            table = path.rstrip('/').split('/')[-1]
+            if table not in TABLE_COLUMNS:
+                return {
+                    'statusCode': 400,
+                    'headers': headers,
+                    'body': serialize({'error': 'Invalid table name'})
+                }
+            
+            query_params = event.get('queryStringParameters') or {}
+            as_of = query_params.get('as_of')
+            if not as_of and query_params.get('latest', '').lower() != 'true':
+                catalog, _ = read_catalog(table)
+                return {
+                    'statusCode': 200,
+                    'headers': headers,
+                    'body': serialize(catalog)
+                }
+            
+            try:
+                entry = find_backup(table, as_of)
+            except ValueError as e:
+                return {
+                    'statusCode': 400,
+                    'headers': headers,
+                    'body': serialize({'error': str(e)})
+                }
+            if entry is None:
+                return {
+                    'statusCode': 404,
+                    'headers': headers,
+                    'body': serialize({'error': f"No backup of {table}" + (f" at or before {as_of}" if as_of else '')})
+                }
+            return {
+                'statusCode': 200,
+                'headers': headers,
+                'body': serialize({'table': table, 'backup': entry})
+            }
+        
+        elif method == 'POST' and path.rstrip('/') == '/summary/rebuild':
+            dry_run = str(body.get('dry_run') or (event.get('queryStringParameters') or {}).get('dry_run', '')).lower() == 'true'
+            result = rebuild_hiring_summary(repair=not dry_run)
+            if result['repaired']:
+                message = 'Hiring summary rebuilt'
+            elif result['drifted_groups']:
+                message = 'Hiring summary has drifted'
             else:
+                message = 'Hiring summary is up to date'
+            return {
+                'statusCode': 200,
+                'headers': headers,
+                'body': serialize({'message': message, **result})
+            }
+        
+        elif method == 'POST' and path.rstrip('/') == '/backup':
+            try:
+                options = {**(event.get('queryStringParameters') or {}), **body}
+                codec, block_size = parse_backup_options(options)
+                backup_format = parse_backup_format(options)
+            except ValueError as e:
                 return {
                     'statusCode': 400,
                     'headers': headers,
-                    'body': json.dumps({'error': 'Invalid table name'})
+                    'body': serialize({'error': str(e)})
                 }
             
-            if errors:
+            manifest = backup_all_tables(codec, block_size, backup_format)
+            return {
+                'statusCode': 200,
+                'headers': headers,
+                'body': serialize({'message': 'Snapshot backup created', **manifest})
+            }
+        
+        elif method == 'POST' and path.rstrip('/') == '/restore':
+            backup_key = body.get('backup_key')
+            if not backup_key:
                 return {
                     'statusCode': 400,
                     'headers': headers,
-                    'body': json.dumps({'errors': errors})
+                    'body': serialize({'error': 'backup_key is required'})
                 }
             
-            insert_batch_data(table, data)
+            compile_stats = bool(body.get('compile_stats'))
+            try:
+                stats = restore_all_tables(backup_key, compile_stats=compile_stats)
+            except ValueError as e:
+                return {
+                    'statusCode': 400,
+                    'headers': headers,
+                    'body': serialize({'error': str(e)})
+                }
+            response_body = {'message': f'Tables {", ".join(TABLE_COLUMNS)} restored from {backup_key}'}
+            if compile_stats:
+                response_body['compile_stats'] = stats
             return {
                 'statusCode': 200,
                 'headers': headers,
-                'body': json.dumps({'message': f'Inserted {len(data)} rows into {table}'})
+                'body': serialize(response_body)
             }
         
         elif method == 'POST' and path.startswith('/backup/'):
             table = path.split('/')[-1]
-            backup_key = backup_table(table)
+            if table not in TABLE_COLUMNS:
+                return {
+                    'statusCode': 400,
+                    'headers': headers,
+                    'body': serialize({'error': 'Invalid table name'})
+                }
+            
+            mode = body.get('mode') or (event.get('queryStringParameters') or {}).get('mode', 'full')
+            if mode not in BACKUP_MODES:
+                return {
+                    'statusCode': 400,
+                    'headers': headers,
+                    'body': serialize({'error': f"Invalid mode: {mode}. Expected one of {', '.join(BACKUP_MODES)}"})
+                }
+            if mode == 'incremental' and table not in APPEND_ONLY_TABLES:
+                return {
+                    'statusCode': 400,
+                    'headers': headers,
+                    'body': serialize({'error': f"Incremental backups need an append-only table; back up {table} in full"})
+                }
+            
+            try:
+                options = {**(event.get('queryStringParameters') or {}), **body}
+                codec, block_size = parse_backup_options(options)
+                backup_format = parse_backup_format(options)
+            except ValueError as e:
+                return {
+                    'statusCode': 400,
+                    'headers': headers,
+                    'body': serialize({'error': str(e)})
+                }
+            
+            manifest = backup_table(table, mode, codec, block_size, backup_format)
+            # manifest_key is the restore handle: backup_key is only this backup's own data
+            # (a delta's new rows, or a Parquet prefix)
+            message = (f"Backup created; restore it with manifest_key {manifest['manifest_key']}" if manifest['rows']
+                       else f'No rows past watermark {manifest["high_watermark"]}')
             return {
                 'statusCode': 200,
                 'headers': headers,
-                'body': json.dumps({'message': f'Backup created', 'backup_key': backup_key})
+                'body': serialize({'message': message, **manifest})
             }
         
         elif method == 'POST' and path.startswith('/restore/'):
             table = path.split('/')[-1]
+            if table not in TABLE_COLUMNS:
+                return {
+                    'statusCode': 400,
+                    'headers': headers,
+                    'body': serialize({'error': 'Invalid table name'})
+                }
+            
             backup_key = body.get('backup_key')
             if not backup_key:
                 return {
                     'statusCode': 400,
                     'headers': headers,
-                    'body': json.dumps({'error': 'backup_key is required'})
+                    'body': serialize({'error': 'backup_key is required'})
                 }
             
-            restore_table(table, backup_key)
+            compile_stats = bool(body.get('compile_stats'))
+            try:
+                stats = restore_table(table, backup_key, compile_stats=compile_stats)
+            except ValueError as e:
+                return {
+                    'statusCode': 400,
+                    'headers': headers,
+                    'body': serialize({'error': str(e)})
+                }
+            response_body = {'message': f'Table {table} restored from {backup_key}'}
+            if compile_stats:
+                response_body['compile_stats'] = stats
             return {
                 'statusCode': 200,
                 'headers': headers,
-                'body': json.dumps({'message': f'Table {table} restored from {backup_key}'})
+                'body': serialize(response_body)
+            }
+        
+        elif method == 'GET' and path == '/targets':
+            # Health and recent statement latency of each routing target in this container
+            return {
+                'statusCode': 200,
+                'headers': headers,
+                'body': serialize({'targets': ROUTER.stats()})
             }
         
         elif method == 'POST' and path == '/sql':
@@ -385,87 +1926,98 @@ def lambda_handler(event, context):
                 return {
                     'statusCode': 400,
                     'headers': headers,
-                    'body': json.dumps({'error': 'SQL query is required'})
+                    'body': serialize({'error': 'SQL query is required'})
                 }
             
             try:
-                result = execute_sql_query(sql_query)
+                result = execute_guarded_query(sql_query)
                 return {
                     'statusCode': 200,
                     'headers': headers,
-                    'body': json.dumps(result)
+                    'body': serialize(result)
+                }
+            except QueryRejected as e:
+                return {
+                    'statusCode': 400,
+                    'headers': headers,
+                    'body': serialize({'error': str(e), 'estimate': e.estimate})
                 }
+            except AdmissionRejected:
+                raise
             except Exception as e:
                 return {
                     'statusCode': 400,
                     'headers': headers,
-                    'body': json.dumps({'error': str(e)})
+                    'body': serialize({'error': str(e)})
                 }
         
         elif method == 'GET' and path.startswith('/reports/'):
-            # Handle report endpoints
+            # Handle report endpoints: /reports/{report} or /reports/{report}/{year}
             path_parts = path.strip('/').split('/')
-            print(f"DEBUG: path_parts = {path_parts}")  # Debug logging
+            query_params = dict(event.get('queryStringParameters') or {})
             
-            if len(path_parts) >= 3:
-                report_type = path_parts[1]  # This should be the report name
-                year = path_parts[2]         # This should be the year
-            else:
+            if len(path_parts) < 2 or len(path_parts) > 3:
                 return {
                     'statusCode': 400,
                     'headers': headers,
-                    'body': json.dumps({'error': f'Invalid path format. Expected /reports/report_type/year, got {path}'})
+                    'body': serialize({'error': f'Invalid path format. Expected /reports/report_type/year, got {path}'})
                 }
             
-            print(f"DEBUG: report_type = {report_type}, year = {year}")  # Debug logging
+            report_type = path_parts[1]  # This should be the report name
+            if len(path_parts) == 3:
+                query_params['year'] = path_parts[2]
             
-            # Validate year
-            try:
-                year_int = int(year)
-                if year_int < 2020 or year_int > 2030:
-                    raise ValueError("Year must be between 2020 and 2030")
-            except ValueError as e:
-                return {
-                    'statusCode': 400,
-                    'headers': headers,
-                    'body': json.dumps({'error': f'Invalid year parameter: {str(e)}'})
-                }
+            compile_stats = query_params.pop('compile_stats', '').lower() == 'true'
+            use_cache = query_params.pop('cache', 'true').lower() != 'false'
+            names = query_params.pop('names', 'redshift').lower()
+            source = query_params.pop('source', 'auto').lower()
             
             # Execute report query
             try:
-                print(f"DEBUG: Executing query {report_type} for year {year_int}")  # Debug logging
-                result = execute_report_query(report_type, year_int)
-                print(f"DEBUG: Query result: {result}")  # Debug logging
+                request_metrics.current().annotate(report=report_type, params=query_params)
+                result = execute_report_query(report_type, compile_stats=compile_stats,
+                                              use_cache=use_cache, params=query_params, names=names,
+                                              source=source)
                 return {
                     'statusCode': 200,
                     'headers': headers,
-                    'body': json.dumps(result)
+                    'body': serialize(result)
                 }
-            except ValueError as e:
-                print(f"DEBUG: ValueError: {str(e)}")  # Debug logging
+            except UnknownReportError as e:
                 return {
                     'statusCode': 404,
                     'headers': headers,
-                    'body': json.dumps({'error': str(e)})
+                    'body': serialize({'error': str(e), 'reports': REPORTS.names()})
+                }
+            except ReportParameterError as e:
+                return {
+                    'statusCode': 400,
+                    'headers': headers,
+                    'body': serialize({'error': str(e)})
                 }
+            except AdmissionRejected:
+                raise
             except Exception as e:
-                print(f"DEBUG: Exception: {str(e)}")  # Debug logging
+                request_metrics.current().annotate(error=str(e))
                 return {
                     'statusCode': 500,
                     'headers': headers,
-                    'body': json.dumps({'error': f'Query execution failed: {str(e)}'})
+                    'body': serialize({'error': f'Query execution failed: {str(e)}'})
                 }
         
         else:
             return {
                 'statusCode': 404,
                 'headers': headers,
-                'body': json.dumps({'error': 'Not found'})
+                'body': serialize({'error': 'Not found'})
             }
     
+    except AdmissionRejected:
+        raise
     except Exception as e:
+        request_metrics.current().annotate(error=str(e))
         return {
             'statusCode': 500,
             'headers': headers,
-            'body': json.dumps({'error': str(e)})
+            'body': serialize({'error': str(e)})
         }
@@ -0,0 +1,240 @@
+"""Report definitions loaded from annotated .sql files.
+
+Each report is a single SQL file whose leading comment block declares how it
+is called, for example::
+
+    -- @report quarterly_hiring_report
+    -- @description Hires per department and job, pivoted by quarter
+    -- @window
+    -- @param min_hires int 0..100000 default=0
+    -- @cache_ttl 300
+
+``@window`` makes the report accept ``year``, ``quarter``, ``start`` and
+``end`` and binds them to ``:window_start``/``:window_end`` (see
+report_windows.py). ``@param name type [min..max] [default=value]`` declares
+any other ``:name`` placeholder; supported types are int, float, date and
+string. Files without an ``@report`` line are ignored.
+
+A file may instead register a variant of a report with ``@variant ids``. Such a
+variant groups by dimension ids and leaves the names to the Lambda:
+``@attach department_id departments department [replace]`` names the id column
+to look up, and ``@sort col ...`` restores the ordering the joined SQL had.
+``@variant summary`` answers the same report from hr_data.hiring_summary.
+``@opt_in`` marks a variant that only runs when the caller asks for it,
+because its results can differ from the report's.
+"""
+import os
+import re
+from datetime import date
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from report_windows import resolve_window
+
+DEFAULT_CACHE_TTL = 300
+
+HEADER_PATTERN = re.compile(r'^\s*--\s*@(\w+)\s*(.*?)\s*$')
+PLACEHOLDER_PATTERN = re.compile(r'(?<![:\w]):([A-Za-z_]\w*)')
+WINDOW_PLACEHOLDERS = {'window_start', 'window_end'}
+
+
+class UnknownReportError(LookupError):
+    """Raised when a report name is not registered"""
+
+
+class ReportParameterError(ValueError):
+    """Raised when report parameters are missing, malformed or out of range"""
+
+
+def parse_date(value: str) -> str:
+    return date.fromisoformat(value).isoformat()
+
+
+TYPE_PARSERS: Dict[str, Callable[[str], Any]] = {
+    'int': int,
+    'float': float,
+    'date': parse_date,
+    'string': str,
+}
+
+
+def make_binder(name: str, type_name: str, bounds: Optional[str], default: Optional[str]) -> Callable:
+    """Build the converter for one declared parameter"""
+    if type_name not in TYPE_PARSERS:
+        raise ValueError(f"Unsupported parameter type for {name}: {type_name}")
+    parse = TYPE_PARSERS[type_name]
+    low = high = None
+    if bounds:
+        low_text, high_text = bounds.split('..')
+        low = parse(low_text) if low_text else None
+        high = parse(high_text) if high_text else None
+    default_value = parse(default) if default is not None else None
+
+    def bind(raw: Optional[str]):
+        if raw is None or raw == '':
+            if default_value is None:
+                raise ReportParameterError(f"{name} is required")
+            return default_value
+        try:
+            value = parse(raw)
+        except ValueError:
+            raise ReportParameterError(f"{name} must be of type {type_name}")
+        if (low is not None and value < low) or (high is not None and value > high):
+            raise ReportParameterError(f"{name} must be between {low} and {high}")
+        return value
+
+    return bind
+
+
+class ReportDefinition:
+    """One registered report: its SQL, declared parameters and cache policy"""
+
+    def __init__(self, name: str, sql: str, params: Dict[str, Callable], windowed: bool,
+                 cache_ttl: int, description: str = '', source: str = '', variant: Optional[str] = None,
+                 attach: Optional[List[Tuple[str, str, str, bool]]] = None, sort: Optional[List[str]] = None,
+                 opt_in: bool = False):
+        self.name = name
+        self.sql = sql
+        self.params = params
+        self.windowed = windowed
+        self.cache_ttl = cache_ttl
+        self.description = description
+        self.source = source
+        self.variant = variant
+        self.attach = attach or []
+        self.sort = sort or []
+        self.opt_in = opt_in
+
+    def accepted_parameters(self) -> List[str]:
+        names = list(self.params)
+        if self.windowed:
+            names += ['year', 'quarter', 'start', 'end']
+        return names
+
+    def bind(self, raw: Dict[str, Any]) -> Dict[str, Any]:
+        """Validate request values and return the Data API parameters for this report"""
+        raw = {k: (str(v) if v is not None else None) for k, v in raw.items()}
+        unknown = set(k for k, v in raw.items() if v is not None) - set(self.accepted_parameters())
+        if unknown:
+            raise ReportParameterError(f"Unknown parameters for {self.name}: {', '.join(sorted(unknown))}")
+
+        bound = {name: binder(raw.get(name)) for name, binder in self.params.items()}
+
+        if self.windowed:
+            try:
+                year = int(raw['year']) if raw.get('year') else None
+                quarter = int(raw['quarter']) if raw.get('quarter') else None
+                window_start, window_end = resolve_window(year, quarter, raw.get('start'), raw.get('end'))
+            except ValueError as e:
+                raise ReportParameterError(f"Invalid report window: {str(e)}")
+            bound['window_start'] = window_start
+            bound['window_end'] = window_end
+
+        return bound
+
+
+def parse_report(text: str, source: str = '') -> Optional[ReportDefinition]:
+    """Parse one annotated .sql file, or return None when it is not a report"""
+    name = None
+    description = ''
+    windowed = False
+    cache_ttl = DEFAULT_CACHE_TTL
+    params: Dict[str, Callable] = {}
+    variant = None
+    attach: List[Tuple[str, str, str, bool]] = []
+    sort: List[str] = []
+    opt_in = False
+
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        match = HEADER_PATTERN.match(line)
+        if not match:
+            if line.lstrip().startswith('--'):
+                continue
+            break
+        directive, argument = match.groups()
+        if directive == 'report':
+            name = argument
+        elif directive == 'description':
+            description = argument
+        elif directive == 'window':
+            windowed = True
+        elif directive == 'cache_ttl':
+            cache_ttl = int(argument)
+        elif directive == 'variant':
+            variant = argument
+        elif directive == 'opt_in':
+            opt_in = True
+        elif directive == 'attach':
+            parts = argument.split()
+            if len(parts) not in (3, 4) or (len(parts) == 4 and parts[3] != 'replace'):
+                raise ValueError(f"{source}: @attach expects id_column dimension name_column [replace]")
+            attach.append((parts[0], parts[1], parts[2], len(parts) == 4))
+        elif directive == 'sort':
+            sort = argument.split()
+        elif directive == 'param':
+            parts = argument.split()
+            param_name, type_name = parts[0], parts[1]
+            bounds = next((p for p in parts[2:] if '..' in p), None)
+            default = next((p.split('=', 1)[1] for p in parts[2:] if p.startswith('default=')), None)
+            params[param_name] = make_binder(param_name, type_name, bounds, default)
+
+    if not name:
+        return None
+
+    sql = text.strip().rstrip(';')
+    placeholders = set(PLACEHOLDER_PATTERN.findall('\n'.join(
+        line for line in sql.splitlines() if not line.lstrip().startswith('--')
+    )))
+    declared = set(params) | (WINDOW_PLACEHOLDERS if windowed else set())
+    if placeholders - declared:
+        raise ValueError(f"{source or name}: undeclared parameters {', '.join(sorted(placeholders - declared))}")
+
+    return ReportDefinition(name, sql, params, windowed, cache_ttl, description, source, variant, attach, sort, opt_in)
+
+
+class ReportRegistry:
+    """All reports found in a directory of .sql files"""
+
+    def __init__(self, reports: Dict[str, ReportDefinition],
+                 variants: Optional[Dict[Tuple[str, str], ReportDefinition]] = None):
+        self.reports = reports
+        self.variants = variants or {}
+
+    @classmethod
+    def load(cls, directory: str) -> 'ReportRegistry':
+        reports = {}
+        variants = {}
+        for filename in sorted(os.listdir(directory)):
+            if not filename.endswith('.sql'):
+                continue
+            path = os.path.join(directory, filename)
+            with open(path) as f:
+                report = parse_report(f.read(), source=filename)
+            if report:
+                target, key = (variants, (report.name, report.variant)) if report.variant else (reports, report.name)
+                if key in target:
+                    raise ValueError(f"Duplicate report {report.name} in {filename}")
+                target[key] = report
+        return cls(reports, variants)
+
+    def get(self, name: str, variant: Optional[str] = None) -> ReportDefinition:
+        report = self.reports.get(name)
+        if not report:
+            raise UnknownReportError(f"Unknown query: {name}")
+        if variant:
+            report = self.variants.get((name, variant))
+            if not report:
+                raise ReportParameterError(f"Report {name} has no {variant} variant")
+        return report
+
+    def names(self) -> List[str]:
+        return sorted(self.reports)
+
+
+def default_reports_dir() -> str:
+    """Packaged reports directory, falling back to database/queries in a checkout"""
+    packaged = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'reports')
+    if os.path.isdir(packaged):
+        return packaged
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'database', 'queries')
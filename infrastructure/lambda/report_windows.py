@@ -0,0 +1,62 @@
+"""Half-open time windows for report predicates.
+
+Reports filter ``hired_employees`` on ``datetime >= start AND datetime < end``
+rather than ``EXTRACT(YEAR FROM datetime) = year``. Comparing the bare sort key
+column against constants lets Redshift use zone maps to skip blocks outside
+the window; wrapping the column in a function forces a full scan.
+"""
+from datetime import date
+from typing import Optional, Tuple
+
+MIN_YEAR = 2020
+MAX_YEAR = 2030
+
+
+def format_bound(day: date) -> str:
+    """Render a window bound as a UTC timestamptz literal"""
+    return f"{day.isoformat()} 00:00:00+00"
+
+
+def year_window(year: int) -> Tuple[str, str]:
+    """Window covering one calendar year"""
+    if year < MIN_YEAR or year > MAX_YEAR:
+        raise ValueError(f"Year must be between {MIN_YEAR} and {MAX_YEAR}")
+    return format_bound(date(year, 1, 1)), format_bound(date(year + 1, 1, 1))
+
+
+def quarter_window(year: int, quarter: int) -> Tuple[str, str]:
+    """Window covering one calendar quarter"""
+    if quarter < 1 or quarter > 4:
+        raise ValueError("Quarter must be between 1 and 4")
+    year_window(year)
+    start = date(year, 3 * quarter - 2, 1)
+    end = date(year + 1, 1, 1) if quarter == 4 else date(year, 3 * quarter + 1, 1)
+    return format_bound(start), format_bound(end)
+
+
+def date_window(start: str, end: str) -> Tuple[str, str]:
+    """Window between two ISO dates, end exclusive"""
+    start_day = date.fromisoformat(start)
+    end_day = date.fromisoformat(end)
+    if end_day <= start_day:
+        raise ValueError("end must be after start")
+    return format_bound(start_day), format_bound(end_day)
+
+
+def resolve_window(year: Optional[int] = None, quarter: Optional[int] = None,
+                   start: Optional[str] = None, end: Optional[str] = None) -> Tuple[str, str]:
+    """Pick the window described by a report request
+
+    An explicit start/end range wins, then a quarter of the given year, then
+    the whole year.
+    """
+    if start or end:
+        if not (start and end):
+            raise ValueError("start and end must be given together")
+        return date_window(start, end)
+    if year is None:
+        raise ValueError("year or start/end is required")
+    if quarter is not None:
+        return quarter_window(year, quarter)
+    return year_window(year)
+
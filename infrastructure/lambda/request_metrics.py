@@ -0,0 +1,117 @@
+"""Per-request phase timing published as CloudWatch Embedded Metric Format.
+
+One RequestMetrics object lives for the duration of an invocation. Code on the
+request path records into it with ``current().phase('submit')`` or
+``current().count('PollCount')``; worker threads share the same object. At the
+end of the invocation ``emit`` prints a single EMF line (CloudWatch turns it
+into metrics without any API calls) and, for a sample of requests plus every
+server error, a structured log line with the same timings.
+"""
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'HRDataApi')
+LOG_SAMPLE_RATE = float(os.environ.get('LOG_SAMPLE_RATE', '0.05'))
+
+PHASE_METRICS = {
+    'queue': 'QueueWaitMs',
+    'credentials': 'CredentialsMs',
+    'submit': 'SubmitMs',
+    'poll': 'PollWaitMs',
+    'fetch': 'ResultFetchMs',
+    'decode': 'DecodeMs',
+    'serialize': 'SerializeMs',
+    's3_read': 'S3ReadMs',
+    's3_write': 'S3WriteMs',
+}
+
+
+class RequestMetrics:
+    """Timings, counters and log context for one invocation"""
+
+    def __init__(self, route: str, request_id: Optional[str] = None):
+        self.route = route
+        self.request_id = request_id
+        self.started = time.perf_counter()
+        self.timings: Dict[str, float] = {}
+        self.counters: Dict[str, float] = {}
+        self.context: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name: str):
+        """Time a block and add it to the phase total"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000
+            with self._lock:
+                self.timings[name] = self.timings.get(name, 0.0) + elapsed
+
+    def count(self, name: str, value: float = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def annotate(self, **values):
+        """Attach context that only goes to the structured log"""
+        with self._lock:
+            self.context.update(values)
+
+    def to_emf(self, status_code: int) -> Dict[str, Any]:
+        total_ms = (time.perf_counter() - self.started) * 1000
+        values = {PHASE_METRICS.get(name, f'{name}Ms'): round(ms, 3) for name, ms in self.timings.items()}
+        values.update(self.counters)
+        values['TotalMs'] = round(total_ms, 3)
+        values['ServerError'] = 1 if status_code >= 500 else 0
+
+        units = [
+            {'Name': name, 'Unit': 'Milliseconds' if name.endswith('Ms') else 'Count'}
+            for name in values
+        ]
+        return {
+            '_aws': {
+                'Timestamp': int(time.time() * 1000),
+                'CloudWatchMetrics': [{
+                    'Namespace': METRICS_NAMESPACE,
+                    'Dimensions': [['Route']],
+                    'Metrics': units,
+                }],
+            },
+            'Route': self.route,
+            'StatusCode': status_code,
+            'RequestId': self.request_id,
+            **values,
+        }
+
+    def emit(self, status_code: int, sample_rate: Optional[float] = None):
+        """Print the EMF record, plus a structured log for sampled requests and server errors"""
+        record = self.to_emf(status_code)
+        print(json.dumps(record))
+
+        rate = LOG_SAMPLE_RATE if sample_rate is None else sample_rate
+        if status_code >= 500 or random.random() < rate:
+            log = {k: v for k, v in record.items() if k != '_aws'}
+            log.update(self.context)
+            log['level'] = 'ERROR' if status_code >= 500 else 'INFO'
+            print(json.dumps(log, default=str))
+        return record
+
+
+_current = RequestMetrics('idle')
+
+
+def start(route: str, request_id: Optional[str] = None) -> RequestMetrics:
+    """Begin collecting for a new invocation"""
+    global _current
+    _current = RequestMetrics(route, request_id)
+    return _current
+
+
+def current() -> RequestMetrics:
+    return _current
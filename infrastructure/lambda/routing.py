@@ -0,0 +1,229 @@
+"""Routing of statements to Redshift compute targets by workload.
+
+A target is a provisioned cluster (ClusterIdentifier), a Redshift Serverless
+workgroup (WorkgroupName), or a data-sharing consumer of either. A consumer is
+configured like any other target, with the database created from the
+datashare, and is marked read-only. Each workload class maps to an ordered
+list of targets: by default reports, /ask and ad-hoc reads go to "analytics"
+first and fall back to "producer", while ingest, backups and restores run on
+"producer" only. A statement that is not a plain SELECT always goes to a
+writable target.
+
+A target that keeps failing to accept statements is taken out of rotation for
+a cooldown, and the next target in the list gets its traffic. Only failures
+of the target itself count (unreachable endpoint, paused or missing cluster
+or workgroup, service errors); a statement whose SQL fails says nothing about
+the target's health. Each target keeps a window of recent statement latencies
+for the stats the Lambdas report.
+"""
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Tuple
+
+from botocore.exceptions import ClientError, ConnectionError as BotoConnectionError, HTTPClientError
+
+READ_ONLY_PATTERN = re.compile(r'^\s*(EXPLAIN\s+)?(SELECT|WITH)\b', re.I)
+# SELECT ... INTO creates a table; string literals are blanked first so their text cannot match
+INTO_PATTERN = re.compile(r'\bINTO\b', re.I)
+STRING_LITERAL_PATTERN = re.compile(r"'(?:[^']|'')*'")
+
+DEFAULT_ROUTES = {
+    'report': ['analytics', 'producer'],
+    'ai': ['analytics', 'producer'],
+    'adhoc': ['analytics', 'producer'],
+    'ingest': ['producer'],
+}
+
+SERVICE_ERROR_CODES = ('InternalServerException', 'ServiceUnavailableException', 'ServiceUnavailable')
+UNAVAILABLE_MESSAGES = ('not available', 'unavailable', 'paused', 'not found', 'does not exist', "doesn't exist",
+                        'resizing', 'modifying')
+
+
+def read_only(sql: str) -> bool:
+    """Whether a statement only reads: a SELECT, WITH or EXPLAIN of one, without INTO"""
+    return bool(READ_ONLY_PATTERN.match(sql)) and not INTO_PATTERN.search(STRING_LITERAL_PATTERN.sub("''", sql))
+
+
+def target_unavailable(error: Exception) -> bool:
+    """Whether an error from submitting a statement means the target could not take it"""
+    if isinstance(error, (BotoConnectionError, HTTPClientError)):
+        return True
+    if not isinstance(error, ClientError):
+        return False
+    code = error.response.get('Error', {}).get('Code')
+    message = error.response.get('Error', {}).get('Message', '').lower()
+    if code in SERVICE_ERROR_CODES:
+        return True
+    # Session errors are handled by the session pool; the target itself may be fine
+    return code == 'ValidationException' and 'session' not in message and any(
+        text in message for text in UNAVAILABLE_MESSAGES
+    )
+
+
+class Target:
+    """One place statements can run"""
+
+    def __init__(self, name: str, database: str, cluster: str = None, workgroup: str = None,
+                 secret_arn: str = None, writable: bool = True):
+        if bool(cluster) == bool(workgroup):
+            raise ValueError(f"Target {name} needs exactly one of cluster or workgroup")
+        self.name = name
+        self.database = database
+        self.cluster = cluster
+        self.workgroup = workgroup
+        self.secret_arn = secret_arn
+        self.writable = writable
+
+    @classmethod
+    def from_dict(cls, name: str, settings: Dict[str, Any], defaults: Dict[str, Any]) -> 'Target':
+        settings = {**defaults, **settings}
+        return cls(
+            name,
+            settings['database'],
+            cluster=settings.get('cluster'),
+            workgroup=settings.get('workgroup'),
+            secret_arn=settings.get('secret_arn'),
+            writable=not settings.get('consumer', False),
+        )
+
+    def connection(self, db_user: str = None, secret_arn: str = None) -> Dict[str, str]:
+        """Data API connection fields: DbUser temporary credentials on clusters, else the secret"""
+        request = {'Database': self.database}
+        if self.workgroup:
+            request['WorkgroupName'] = self.workgroup
+        else:
+            request['ClusterIdentifier'] = self.cluster
+        secret = self.secret_arn or (None if db_user and self.cluster else secret_arn)
+        if secret:
+            request['SecretArn'] = secret
+        elif db_user:
+            request['DbUser'] = db_user
+        return request
+
+
+class TargetStats:
+    """Health and recent latencies of one target"""
+
+    def __init__(self, window: int):
+        self.latencies: Deque[float] = deque(maxlen=window)
+        self.statements = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.unhealthy_until = 0.0
+
+    def summary(self, now: float) -> Dict[str, Any]:
+        ordered = sorted(self.latencies)
+
+        def percentile(fraction):
+            return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000, 3) if ordered else None
+
+        return {
+            'healthy': self.unhealthy_until <= now,
+            'statements': self.statements,
+            'failures': self.failures,
+            'mean_ms': round(sum(ordered) / len(ordered) * 1000, 3) if ordered else None,
+            'p50_ms': percentile(0.5),
+            'p95_ms': percentile(0.95),
+        }
+
+
+class Router:
+    """Pick targets per workload class, fail over between them and keep their stats"""
+
+    def __init__(self, targets: Dict[str, Target], routes: Dict[str, List[str]] = None,
+                 failure_threshold: int = 3, cooldown_seconds: float = 30.0, window: int = 200,
+                 clock: Callable[[], float] = time.time):
+        self.targets = targets
+        # Routes naming a target that is not configured skip it, so one target serves everything
+        self.routes = {
+            workload: [name for name in names if name in targets] or [next(iter(targets))]
+            for workload, names in (routes or DEFAULT_ROUTES).items()
+        }
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._stats = {name: TargetStats(window) for name in targets}
+
+    def candidates(self, workload: str, writes: bool = False) -> List[Target]:
+        """Targets for a statement in failover order, healthy ones first"""
+        names = self.routes.get(workload) or list(self.targets)
+        targets = [self.targets[name] for name in names if self.targets[name].writable or not writes]
+        if not targets:
+            targets = [target for target in self.targets.values() if target.writable]
+        now = self.clock()
+        with self._lock:
+            return sorted(targets, key=lambda target: self._stats[target.name].unhealthy_until > now)
+
+    def submit(self, workload: str, writes: bool, call: Callable[[Target], Any]) -> Tuple[Any, Target]:
+        """Run ``call`` against the first target that accepts it"""
+        error = None
+        for target in self.candidates(workload, writes):
+            try:
+                return call(target), target
+            except Exception as e:
+                if not target_unavailable(e):
+                    raise
+                self.record_failure(target)
+                error = e
+        raise error
+
+    def record_failure(self, target: Target):
+        with self._lock:
+            stats = self._stats[target.name]
+            stats.failures += 1
+            stats.consecutive_failures += 1
+            if stats.consecutive_failures >= self.failure_threshold:
+                stats.unhealthy_until = self.clock() + self.cooldown_seconds
+
+    def record_latency(self, target: Target, seconds: float):
+        with self._lock:
+            stats = self._stats[target.name]
+            stats.statements += 1
+            stats.consecutive_failures = 0
+            stats.latencies.append(seconds)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        now = self.clock()
+        with self._lock:
+            return {name: {'target': self.describe(self.targets[name]), **stats.summary(now)}
+                    for name, stats in self._stats.items()}
+
+    @staticmethod
+    def describe(target: Target) -> Dict[str, Any]:
+        kind = 'workgroup' if target.workgroup else 'cluster'
+        return {kind: target.workgroup or target.cluster, 'database': target.database, 'writable': target.writable}
+
+
+def parse_routes(text: str) -> Dict[str, List[str]]:
+    """'report=analytics|producer,ingest=producer' on top of the default routes"""
+    routes = {workload: list(names) for workload, names in DEFAULT_ROUTES.items()}
+    for item in filter(None, (part.strip() for part in (text or '').split(','))):
+        workload, _, names = item.partition('=')
+        if workload.strip() not in DEFAULT_ROUTES:
+            raise ValueError(f"Unknown workload class: {workload.strip()}")
+        routes[workload.strip()] = [name.strip() for name in names.split('|') if name.strip()]
+    return routes
+
+
+def from_environment(default_cluster: str, default_database: str) -> Router:
+    """Build the router from ROUTING_TARGETS (JSON) and ROUTING_RULES
+
+    Without ROUTING_TARGETS a single "producer" target on the default cluster
+    serves every workload.
+    """
+    defaults = {'database': default_database}
+    configured = json.loads(os.environ.get('ROUTING_TARGETS') or '{}')
+    targets = {name: Target.from_dict(name, settings, defaults) for name, settings in configured.items()}
+    if 'producer' not in targets:
+        targets = {'producer': Target('producer', default_database, cluster=default_cluster), **targets}
+    return Router(
+        targets,
+        parse_routes(os.environ.get('ROUTING_RULES', '')),
+        failure_threshold=int(os.environ.get('ROUTING_FAILURE_THRESHOLD', '3')),
+        cooldown_seconds=float(os.environ.get('ROUTING_COOLDOWN_SECONDS', '30')),
+    )
@@ -0,0 +1,129 @@
+"""Warm Redshift Data API sessions kept per container and database user.
+
+A statement submitted without a session makes the Data API open a connection
+and authenticate before it runs. Submitting with SessionKeepAliveSeconds keeps
+that connection open after the statement finishes and returns its SessionId;
+later statements sent with the SessionId skip the setup.
+
+A session runs one statement at a time, so the pool hands each idle session to
+one caller, which gives it back once its statement has finished. Concurrent
+callers (ingest chunks, backup exports) open further sessions. A session is
+only reused while it is sure to be alive: within the keep-alive window of its
+last statement, less a safety margin. If the Data API reports it gone or busy
+anyway, it is dropped and the statement is sent on a new session, and if the
+account is out of sessions the statement runs without one.
+
+Session state (SET timezone, SET search_path, TEMP tables) outlives the
+statement that created it, so sessions are pooled per workload class as well
+as per target and user, and statements of the classes that run user-written
+SQL (ad-hoc /sql and generated /ask queries) never use a pooled session. A
+pipeline statement can therefore only land on a session that pipeline
+statements of its own class have used.
+"""
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from botocore.exceptions import ClientError
+
+# Request fields that pick the target; a statement sent with a SessionId omits them
+CONNECTION_KEYS = ('ClusterIdentifier', 'WorkgroupName', 'Database', 'DbUser', 'SecretArn')
+
+# Sessions are not reused in the last part of their keep-alive window
+EXPIRY_MARGIN = 0.1
+
+# Workload classes whose SQL comes from users (or a model) and may change session state
+UNPOOLED_WORKLOADS = ('adhoc', 'ai')
+
+
+def session_error(error: ClientError) -> bool:
+    """Whether a Data API error means the session is gone or busy rather than the SQL failing"""
+    code = error.response.get('Error', {}).get('Code')
+    message = error.response.get('Error', {}).get('Message', '')
+    return code in ('ValidationException', 'ResourceNotFoundException') and 'session' in message.lower()
+
+
+class SessionPool:
+    """Idle sessions per workload class, target and database user"""
+
+    def __init__(self, keep_alive_seconds: int, clock: Callable[[], float] = time.time,
+                 unpooled_workloads: Tuple[str, ...] = UNPOOLED_WORKLOADS):
+        self.keep_alive_seconds = keep_alive_seconds
+        self.clock = clock
+        self.unpooled_workloads = unpooled_workloads
+        self._lock = threading.Lock()
+        self._idle: Dict[Tuple, List[Tuple[str, float]]] = {}
+        self._scopes: Dict[str, Tuple] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.keep_alive_seconds > 0
+
+    def acquire(self, scope: Tuple) -> Optional[str]:
+        """Take an idle session that is still inside its keep-alive window"""
+        now = self.clock()
+        with self._lock:
+            idle = self._idle.get(scope, [])
+            while idle:
+                session_id, usable_until = idle.pop()
+                if usable_until > now:
+                    return session_id
+                self._scopes.pop(session_id, None)
+        return None
+
+    def release(self, session_id: Optional[str]):
+        """Return a session once its statement has finished"""
+        if not session_id:
+            return
+        usable_until = self.clock() + self.keep_alive_seconds * (1 - EXPIRY_MARGIN)
+        with self._lock:
+            scope = self._scopes.get(session_id)
+            if scope is not None:
+                self._idle.setdefault(scope, []).append((session_id, usable_until))
+
+    def discard(self, session_id: Optional[str]):
+        with self._lock:
+            scope = self._scopes.pop(session_id, None)
+            if scope is not None:
+                self._idle[scope] = [entry for entry in self._idle.get(scope, []) if entry[0] != session_id]
+
+    def clear(self):
+        with self._lock:
+            self._idle.clear()
+            self._scopes.clear()
+
+    def submit(self, call: Callable[..., Dict[str, Any]], request: Dict[str, Any],
+               workload: str = None) -> Tuple[Dict[str, Any], Optional[str], bool]:
+        """Submit a statement of a workload class through ``call`` on a warm session when one is idle
+
+        ``request`` carries the connection fields. Returns the response, the
+        session the statement holds (to be released when it finishes) and
+        whether that session was reused.
+        """
+        if not self.enabled or workload in self.unpooled_workloads:
+            return call(**request), None, False
+
+        scope = (workload,) + tuple(request.get(key) for key in CONNECTION_KEYS)
+        statement = {key: value for key, value in request.items() if key not in CONNECTION_KEYS}
+        session_id = self.acquire(scope)
+        if session_id:
+            try:
+                return call(SessionId=session_id, **statement), session_id, True
+            except ClientError as e:
+                if not session_error(e):
+                    self.release(session_id)
+                    raise
+                self.discard(session_id)
+
+        try:
+            response = call(SessionKeepAliveSeconds=self.keep_alive_seconds, **request)
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') != 'ActiveSessionsExceededException':
+                raise
+            return call(**request), None, False
+
+        session_id = response.get('SessionId')
+        if session_id:
+            with self._lock:
+                self._scopes[session_id] = scope
+        return response, session_id, False
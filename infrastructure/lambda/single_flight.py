@@ -0,0 +1,327 @@
+"""Single-flight coalescing of identical read-only statements.
+
+When a dashboard loads, many requests submit the same report query or the same
+SELECT at once. The first request to claim a statement key becomes its leader:
+it submits the statement and publishes the Data API statement ID under the key.
+Requests that find the key already claimed attach to that ID and poll and fetch
+its result instead of submitting their own copy. A Data API result can be read
+by any caller with the same database user, so the ID is all a follower needs.
+
+Keys cover the target, the database user, the SQL with its whitespace
+normalized (quoted literals are left alone) and the parameter values. Only
+statements routing.read_only accepts are coalesced; two identical inserts, or
+two SELECT ... INTOs, are still two. The Lambdas only coalesce report and /sql
+reads (COALESCED_ROUTES): a backup, or a read that follows a write in the same
+request, must see the latest rows rather than a statement submitted earlier.
+
+Claims live in an InFlightRegistry. A Lambda container serves one request at
+a time, so identical statements from different callers only meet in a store
+every container sees: DynamoDBRegistry keeps each claim as a DynamoDB item
+holding the leader's statement ID, and is what the deployed functions use.
+MemoryRegistry only joins threads of one process and SQLiteRegistry processes
+on one host; both are for local testing. A claim is removed when the leader's
+statement finishes. Claims carry a lease, so one left behind by a crashed
+leader expires and the next request submits the statement again.
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+from botocore.exceptions import ClientError
+
+import routing
+
+# Routes whose reads may share another request's statement
+COALESCED_ROUTES = ('reports', 'sql')
+# Quoted literals and identifiers are kept verbatim; whitespace runs between them collapse
+TOKEN_PATTERN = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|\s+|[^'\"\s]+")
+
+
+def normalize_sql(sql: str) -> str:
+    """Collapse whitespace outside quoted literals and drop a trailing semicolon"""
+    tokens = [' ' if token.isspace() else token for token in TOKEN_PATTERN.findall(sql)]
+    return ''.join(tokens).strip().rstrip(';').rstrip()
+
+
+def statement_key(sql: str, parameters: Optional[Dict[str, Any]] = None, scope: str = '') -> Optional[str]:
+    """Coalescing key of a statement, or None when it must always run on its own"""
+    if not routing.read_only(sql):
+        return None
+    payload = json.dumps([scope, normalize_sql(sql), sorted((parameters or {}).items())], default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class InFlightRegistry(ABC):
+    """Shared claims: statement key -> (leader, statement ID once submitted)"""
+
+    @abstractmethod
+    def claim(self, key: str, owner: str, now: float, lease_seconds: float) -> Optional[Tuple[str, Optional[str]]]:
+        """Claim the key for owner; return None if it was free, else the live (leader, statement_id)"""
+
+    @abstractmethod
+    def publish(self, key: str, owner: str, statement_id: str, now: float, lease_seconds: float):
+        """Record the leader's statement ID so followers can attach to it"""
+
+    @abstractmethod
+    def finish(self, key: str, owner: str):
+        """Drop the leader's claim"""
+
+    def wait(self, timeout: float):
+        """Block until a claim may have changed"""
+        time.sleep(timeout)
+
+
+class MemoryRegistry(InFlightRegistry):
+    """Claims for one process; followers are woken as soon as a statement ID is published"""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._claims: Dict[str, Tuple[str, Optional[str], float]] = {}
+
+    def claim(self, key, owner, now, lease_seconds):
+        with self._condition:
+            entry = self._claims.get(key)
+            if entry and entry[2] > now:
+                return entry[0], entry[1]
+            self._claims[key] = (owner, None, now + lease_seconds)
+            return None
+
+    def publish(self, key, owner, statement_id, now, lease_seconds):
+        with self._condition:
+            entry = self._claims.get(key)
+            if entry and entry[0] == owner:
+                self._claims[key] = (owner, statement_id, now + lease_seconds)
+            self._condition.notify_all()
+
+    def finish(self, key, owner):
+        with self._condition:
+            entry = self._claims.get(key)
+            if entry and entry[0] == owner:
+                del self._claims[key]
+            self._condition.notify_all()
+
+    def wait(self, timeout):
+        with self._condition:
+            self._condition.wait(timeout)
+
+
+class SQLiteRegistry(InFlightRegistry):
+    """Claims in a SQLite file, shared by every process that opens the same path"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS in_flight (key TEXT PRIMARY KEY, owner TEXT, statement_id TEXT, expires_at REAL)'
+        )
+
+    def _transaction(self, work):
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                result = work(self._conn)
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._conn.execute('COMMIT')
+            return result
+
+    def claim(self, key, owner, now, lease_seconds):
+        def claim(conn):
+            row = conn.execute(
+                'SELECT owner, statement_id FROM in_flight WHERE key = ? AND expires_at > ?', (key, now)
+            ).fetchone()
+            if row:
+                return row[0], row[1]
+            conn.execute('INSERT OR REPLACE INTO in_flight VALUES (?, ?, NULL, ?)', (key, owner, now + lease_seconds))
+            return None
+
+        return self._transaction(claim)
+
+    def publish(self, key, owner, statement_id, now, lease_seconds):
+        self._transaction(lambda conn: conn.execute(
+            'UPDATE in_flight SET statement_id = ?, expires_at = ? WHERE key = ? AND owner = ?',
+            (statement_id, now + lease_seconds, key, owner)
+        ))
+
+    def finish(self, key, owner):
+        self._transaction(lambda conn: conn.execute(
+            'DELETE FROM in_flight WHERE key = ? AND owner = ?', (key, owner)
+        ))
+
+
+def conditional_check_failed(error: ClientError) -> bool:
+    return error.response.get('Error', {}).get('Code') == 'ConditionalCheckFailedException'
+
+
+class DynamoDBRegistry(InFlightRegistry):
+    """Claims as items of a DynamoDB table (string partition key ``pk``), shared by every container
+
+    A claim is a conditional put that only succeeds when the key is free or its
+    lease has run out; publish and finish are conditional on the owner. Items
+    carry a ``ttl`` attribute so DynamoDB sweeps abandoned claims, but expiry is
+    checked on every read since the sweep lags.
+    """
+
+    def __init__(self, table: str, client: Callable[[], Any] = None):
+        self.table = table
+        self._client = client
+
+    def client(self):
+        if self._client is None:
+            import boto3
+            client = boto3.client('dynamodb')
+            self._client = lambda: client
+        return self._client()
+
+    @staticmethod
+    def _item(key: str, owner: str, expires_at: float, statement_id: str = None) -> Dict[str, Dict[str, str]]:
+        item = {
+            'pk': {'S': f"flight#{key}"},
+            'owner': {'S': owner},
+            'expires_at': {'N': repr(expires_at)},
+            'ttl': {'N': str(int(expires_at) + 3600)},
+        }
+        if statement_id:
+            item['statement_id'] = {'S': statement_id}
+        return item
+
+    def claim(self, key, owner, now, lease_seconds):
+        client = self.client()
+        while True:
+            try:
+                client.put_item(
+                    TableName=self.table, Item=self._item(key, owner, now + lease_seconds),
+                    ConditionExpression='attribute_not_exists(pk) OR expires_at <= :now',
+                    ExpressionAttributeValues={':now': {'N': repr(now)}},
+                )
+                return None
+            except ClientError as e:
+                if not conditional_check_failed(e):
+                    raise
+            item = client.get_item(TableName=self.table, Key={'pk': {'S': f"flight#{key}"}},
+                                   ConsistentRead=True).get('Item')
+            # A claim that finished or expired since the put is free to take again
+            if item and float(item['expires_at']['N']) > now:
+                return item['owner']['S'], item.get('statement_id', {}).get('S')
+
+    def publish(self, key, owner, statement_id, now, lease_seconds):
+        try:
+            self.client().put_item(
+                TableName=self.table, Item=self._item(key, owner, now + lease_seconds, statement_id),
+                ConditionExpression='#owner = :owner',
+                ExpressionAttributeNames={'#owner': 'owner'},
+                ExpressionAttributeValues={':owner': {'S': owner}},
+            )
+        except ClientError as e:
+            # The claim expired and another leader took the key; its followers poll that one
+            if not conditional_check_failed(e):
+                raise
+
+    def finish(self, key, owner):
+        try:
+            self.client().delete_item(
+                TableName=self.table, Key={'pk': {'S': f"flight#{key}"}},
+                ConditionExpression='#owner = :owner',
+                ExpressionAttributeNames={'#owner': 'owner'},
+                ExpressionAttributeValues={':owner': {'S': owner}},
+            )
+        except ClientError as e:
+            if not conditional_check_failed(e):
+                raise
+
+
+def make_registry(spec: str, client: Callable[[], Any] = None) -> Optional[InFlightRegistry]:
+    """'memory', 'sqlite:/path/to/file.db', 'dynamodb:TableName', or 'off' to disable coalescing
+
+    ``client`` returns the dynamodb client a DynamoDBRegistry uses.
+    """
+    if spec == 'off':
+        return None
+    if not spec or spec == 'memory':
+        return MemoryRegistry()
+    if spec.startswith('sqlite:'):
+        return SQLiteRegistry(spec[len('sqlite:'):])
+    if spec.startswith('dynamodb:'):
+        return DynamoDBRegistry(spec[len('dynamodb:'):], client)
+    raise ValueError(f"Unknown in-flight registry: {spec}")
+
+
+class Flight:
+    """One request's part in a coalesced statement
+
+    ``statement_id`` is set when the request attached to another leader's
+    statement. A leader submits the statement itself and calls ``publish``.
+    """
+
+    def __init__(self, coalescer: 'SingleFlight', key: str, owner: str, statement_id: Optional[str] = None):
+        self._coalescer = coalescer
+        self.key = key
+        self.owner = owner
+        self.statement_id = statement_id
+
+    @property
+    def coalesced(self) -> bool:
+        return self.statement_id is not None
+
+    def publish(self, statement_id: str):
+        if self.key is not None:
+            self._coalescer.registry.publish(self.key, self.owner, statement_id, self._coalescer.clock(),
+                                             self._coalescer.lease_seconds)
+
+
+class SingleFlight:
+    """Lead or follow the in-flight statement for a key"""
+
+    def __init__(self, registry: Optional[InFlightRegistry], pending_seconds: float = 60.0,
+                 lease_seconds: float = 900.0, poll_seconds: float = 0.05,
+                 clock: Callable[[], float] = time.time):
+        self.registry = registry
+        # A leader still waiting for an admission slot keeps its claim this long
+        self.pending_seconds = pending_seconds
+        self.lease_seconds = lease_seconds
+        self.poll_seconds = poll_seconds
+        self.clock = clock
+
+    @contextmanager
+    def join(self, key: Optional[str]) -> Iterator[Flight]:
+        """Yield a Flight for the key; a leader's claim is dropped when the block exits"""
+        owner = uuid.uuid4().hex
+        if key is None or self.registry is None:
+            yield Flight(self, None, owner)
+            return
+
+        while True:
+            entry = self.registry.claim(key, owner, self.clock(), self.pending_seconds)
+            if entry is None:
+                break
+            statement_id = entry[1]
+            if statement_id:
+                yield Flight(self, key, owner, statement_id)
+                return
+            # The leader has not submitted yet; its claim expires if it never does
+            self.registry.wait(self.poll_seconds)
+
+        try:
+            yield Flight(self, key, owner)
+        finally:
+            self.registry.finish(key, owner)
+
+
+def from_environment(client: Callable[[], Any] = None) -> SingleFlight:
+    """Build the coalescer from the COALESCE_* environment variables"""
+    return SingleFlight(
+        make_registry(os.environ.get('COALESCE_STORE', 'memory'), client),
+        pending_seconds=float(os.environ.get('COALESCE_PENDING_SECONDS', '60')),
+        lease_seconds=float(os.environ.get('COALESCE_LEASE_SECONDS', '900')),
+        poll_seconds=float(os.environ.get('COALESCE_POLL_SECONDS', '0.05')),
+    )
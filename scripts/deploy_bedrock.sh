@@ -13,6 +13,13 @@ echo "Building and deploying Bedrock Query Lambda function..."
 SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 cd "$SCRIPT_DIR/../infrastructure/lambda"
 
+# Admission control shares the Data API stack's coordination table
+COORDINATION_TABLE=$(aws cloudformation describe-stacks \
+  --stack-name redshift-data-api \
+  --region "us-east-1" \
+  --query "Stacks[0].Outputs[?OutputKey=='CoordinationTableName'].OutputValue" \
+  --output text)
+
 sam build -t bedrock_template.yaml
 sam deploy \
   --template-file .aws-sam/build/template.yaml \
@@ -23,6 +30,7 @@ sam deploy \
   --parameter-overrides \
     SecretName=$SECRET_NAME \
     RedshiftHost=$REDSHIFT_HOST \
-    RedshiftDB="demo_db"
+    RedshiftDB="demo_db" \
+    CoordinationTable=$COORDINATION_TABLE
 
 echo "Deployment complete!"
@@ -13,6 +13,10 @@ echo "Building and deploying Lambda function..."
 SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 cd "$SCRIPT_DIR/../infrastructure/lambda"
 
+# Package the report definitions next to the handler
+rm -rf reports
+cp -r ../../database/queries reports
+
 sam build -t template.yaml
 sam deploy \
   --template-file .aws-sam/build/template.yaml \
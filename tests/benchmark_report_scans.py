@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Compare blocks scanned by report queries using EXTRACT(YEAR ...) filters
+against the half-open datetime range predicates the reports now generate.
+
+Runs against a live cluster through the Redshift Data API:
+
+    CLUSTER_ID=redshift-cluster-demo DB_NAME=demo_db DB_USER=awsuser \\
+        python tests/benchmark_report_scans.py 2020 2021 2022
+"""
+
+import os
+import sys
+import time
+
+import boto3
+
+CLUSTER_ID = os.environ.get('CLUSTER_ID', 'redshift-cluster-demo')
+DB_NAME = os.environ.get('DB_NAME', 'demo_db')
+DB_USER = os.environ.get('DB_USER', 'awsuser')
+
+redshift_data = boto3.client('redshift-data')
+
+REPORT_SQL = """
+    SELECT
+        d.department,
+        j.job,
+        SUM(CASE WHEN EXTRACT(QUARTER FROM e.datetime) = 1 THEN 1 ELSE 0 END) AS Q1,
+        SUM(CASE WHEN EXTRACT(QUARTER FROM e.datetime) = 2 THEN 1 ELSE 0 END) AS Q2,
+        SUM(CASE WHEN EXTRACT(QUARTER FROM e.datetime) = 3 THEN 1 ELSE 0 END) AS Q3,
+        SUM(CASE WHEN EXTRACT(QUARTER FROM e.datetime) = 4 THEN 1 ELSE 0 END) AS Q4
+    FROM hr_data.hired_employees e
+    JOIN hr_data.departments d ON e.department_id = d.id
+    JOIN hr_data.jobs j ON e.job_id = j.id
+    WHERE {predicate}
+    GROUP BY d.department, j.job
+"""
+
+PREDICATES = {
+    'extract': "EXTRACT(YEAR FROM e.datetime) = {year}",
+    'range': "e.datetime >= '{year}-01-01 00:00:00+00' AND e.datetime < '{next_year}-01-01 00:00:00+00'",
+}
+
+
+def wait(statement_id):
+    while True:
+        description = redshift_data.describe_statement(Id=statement_id)
+        if description['Status'] == 'FINISHED':
+            return description
+        if description['Status'] in ('FAILED', 'ABORTED'):
+            raise Exception(description.get('Error', 'Query failed'))
+        time.sleep(0.5)
+
+
+def run(sql):
+    response = redshift_data.execute_statement(
+        ClusterIdentifier=CLUSTER_ID, Database=DB_NAME, DbUser=DB_USER, Sql=sql
+    )
+    description = wait(response['Id'])
+    if description.get('HasResultSet'):
+        return redshift_data.get_statement_result(Id=response['Id'])['Records']
+    return []
+
+
+def run_uncached(sql):
+    """Run a query with the result cache off and return its Redshift query id"""
+    response = redshift_data.batch_execute_statement(
+        ClusterIdentifier=CLUSTER_ID, Database=DB_NAME, DbUser=DB_USER,
+        Sqls=['SET enable_result_cache_for_session TO off', sql]
+    )
+    description = wait(response['Id'])
+    return description['SubStatements'][-1]['RedshiftQueryId'], description['SubStatements'][-1]['Duration']
+
+
+def scan_stats(query_id):
+    """Blocks read and range-restricted scan flag for the hired_employees scan"""
+    # System views are populated shortly after the query completes
+    for _ in range(10):
+        records = run(f"""
+            SELECT m.query_blocks_read, s.rows_pre_filter, s.rrscan
+            FROM svl_query_metrics_summary m
+            JOIN (
+                SELECT query,
+                       SUM(rows_pre_filter) AS rows_pre_filter,
+                       MAX(CASE WHEN is_rrscan = 't' THEN 1 ELSE 0 END) AS rrscan
+                FROM svl_query_summary
+                WHERE query = {query_id} AND label LIKE '%hired_employees%'
+                GROUP BY query
+            ) s ON s.query = m.query
+            WHERE m.query = {query_id}
+        """)
+        if records:
+            return [field.get('longValue', 0) for field in records[0]]
+        time.sleep(2)
+    return [None, None, None]
+
+
+def main(years):
+    print(f"{'year':<6}{'predicate':<10}{'blocks':>10}{'rows scanned':>15}{'rrscan':>8}{'ms':>10}")
+    for year in years:
+        for name, predicate in PREDICATES.items():
+            sql = REPORT_SQL.format(predicate=predicate.format(year=year, next_year=year + 1))
+            query_id, duration = run_uncached(sql)
+            blocks, rows, rrscan = scan_stats(query_id)
+            print(f"{year:<6}{name:<10}{blocks!s:>10}{rows!s:>15}{bool(rrscan)!s:>8}{duration / 1e6:>10.1f}")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [2021])
@@ -0,0 +1,78 @@
+"""
+Write and restore throughput and compression ratio per AVRO backup codec.
+
+    pytest tests/benchmarks/test_backup_codecs_bench.py
+
+Runs on a generated hired_employees dataset without the Data API in the loop, so
+the numbers isolate encoding, compression and decoding. Each result carries
+rows_per_second, size_bytes and compression_ratio (uncompressed size / size) in
+its extra_info.
+"""
+
+import io
+
+import pytest
+
+pytest.importorskip('pytest_benchmark')
+
+import fastavro  # noqa: E402
+
+from local_data_api import generate_hired_employees  # noqa: E402
+
+ROWS = 20000
+CODECS = ['null', 'deflate', 'snappy', 'zstandard']
+BLOCK_SIZES = [16000, 1024 * 1024]
+
+SCHEMA = fastavro.parse_schema({
+    'type': 'record',
+    'name': 'hired_employees',
+    'fields': [{'name': name, 'type': ['null', 'string']}
+               for name in ('id', 'name', 'datetime', 'department_id', 'job_id')],
+})
+
+
+@pytest.fixture(scope='module')
+def records():
+    rows = generate_hired_employees(ROWS, departments=12, jobs=183, seed=7)
+    return [{k: str(v) if v is not None else None for k, v in row.items()} for row in rows]
+
+
+@pytest.fixture(scope='module')
+def uncompressed_size(records):
+    return len(encode(records, 'null', BLOCK_SIZES[0]))
+
+
+def rows_per_second(benchmark):
+    # benchmark.stats is None under --benchmark-disable, where the function runs once untimed
+    return round(ROWS / benchmark.stats.stats.mean) if benchmark.stats else None
+
+
+def encode(records, codec, block_size):
+    buffer = io.BytesIO()
+    fastavro.writer(buffer, SCHEMA, records, codec=codec, sync_interval=block_size)
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize('block_size', BLOCK_SIZES)
+@pytest.mark.parametrize('codec', CODECS)
+def test_write(benchmark, records, uncompressed_size, codec, block_size):
+    benchmark.group = 'write'
+    data = benchmark(encode, records, codec, block_size)
+
+    benchmark.extra_info.update({
+        'size_bytes': len(data),
+        'compression_ratio': round(uncompressed_size / len(data), 2),
+        'rows_per_second': rows_per_second(benchmark),
+    })
+
+
+@pytest.mark.parametrize('block_size', BLOCK_SIZES)
+@pytest.mark.parametrize('codec', CODECS)
+def test_restore(benchmark, records, codec, block_size):
+    benchmark.group = 'restore'
+    data = encode(records, codec, block_size)
+
+    restored = benchmark(lambda: list(fastavro.reader(io.BytesIO(data))))
+
+    assert len(restored) == ROWS
+    benchmark.extra_info['rows_per_second'] = rows_per_second(benchmark)
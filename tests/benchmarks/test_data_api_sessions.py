@@ -0,0 +1,73 @@
+"""
+Per-statement latency with and without Data API session reuse.
+
+    pytest tests/benchmarks/test_data_api_sessions.py
+
+Every statement the fake runs without a warm session pays LOCAL_DATA_API_CONNECT_MS
+(default 100 ms) of connection and authentication setup on top of the usual
+per-call and per-statement latency. Each result carries statements and
+ms_per_statement in its extra_info.
+"""
+
+import json
+import os
+import time
+
+import pytest
+
+pytest.importorskip('pytest_benchmark')
+pytest.importorskip('duckdb')
+
+import lambda_function  # noqa: E402
+from local_data_api import Latency, LocalAWS  # noqa: E402
+from session_pool import SessionPool  # noqa: E402
+
+CALL_MS = float(os.environ.get('LOCAL_DATA_API_CALL_MS', '1'))
+EXECUTION_MS = float(os.environ.get('LOCAL_DATA_API_EXECUTION_MS', '5'))
+CONNECT_MS = float(os.environ.get('LOCAL_DATA_API_CONNECT_MS', '100'))
+KEEP_ALIVE = {'reuse': 300, 'no_reuse': 0}
+
+
+@pytest.fixture(params=list(KEEP_ALIVE))
+def local(request, monkeypatch):
+    monkeypatch.setattr(lambda_function, 'SESSIONS', SessionPool(KEEP_ALIVE[request.param]))
+    local = LocalAWS(latency=Latency(call_ms=CALL_MS, execution_ms=EXECUTION_MS, connect_ms=CONNECT_MS))
+    local.db.seed(employees=1000)
+    local.install(lambda_function)
+    yield local
+    lambda_function._clients.clear()
+    lambda_function._credentials.clear()
+
+
+def statements(local):
+    return sum(1 for op, _ in local.redshift_data.calls if op in ('ExecuteStatement', 'BatchExecuteStatement'))
+
+
+def run_per_statement(benchmark, local, operation):
+    """Benchmark operation and record the mean latency per submitted statement"""
+    operation()
+    before = statements(local)
+    started = time.perf_counter()
+    operation()
+    per_call = statements(local) - before
+    benchmark.extra_info['statements'] = per_call
+    benchmark.extra_info['ms_per_statement'] = round((time.perf_counter() - started) * 1000 / per_call, 3)
+    benchmark(operation)
+
+
+def test_sequential_statements(benchmark, local):
+    run_per_statement(benchmark, local, lambda: [
+        lambda_function.execute_sql_query('SELECT COUNT(*) FROM hr_data.departments') for _ in range(5)
+    ])
+
+
+def test_restore_hired_employees(benchmark, local):
+    event = {'httpMethod': 'POST', 'path': '/backup/hired_employees', 'queryStringParameters': None}
+    backup_key = json.loads(lambda_function.lambda_handler(event, None)['body'])['backup_key']
+    restore = {'httpMethod': 'POST', 'path': '/restore/hired_employees', 'queryStringParameters': None,
+               'body': json.dumps({'backup_key': backup_key})}
+
+    def run():
+        assert lambda_function.lambda_handler(restore, None)['statusCode'] == 200
+
+    run_per_statement(benchmark, local, run)
@@ -0,0 +1,71 @@
+"""
+Per-route benchmarks for the Data API Lambda against the offline stand-in.
+
+    pytest tests/benchmarks --benchmark-storage=tests/benchmarks/baselines \
+        --benchmark-compare --benchmark-compare-fail=mean:25%
+
+Injected latency defaults to 1 ms per API call and 5 ms per statement; override
+with LOCAL_DATA_API_CALL_MS and LOCAL_DATA_API_EXECUTION_MS.
+"""
+
+import itertools
+import json
+import os
+
+import pytest
+
+pytest.importorskip('pytest_benchmark')
+pytest.importorskip('duckdb')
+
+import lambda_function  # noqa: E402
+from local_data_api import Latency, LocalAWS, generate_hired_employees  # noqa: E402
+
+CALL_MS = float(os.environ.get('LOCAL_DATA_API_CALL_MS', '1'))
+EXECUTION_MS = float(os.environ.get('LOCAL_DATA_API_EXECUTION_MS', '5'))
+EMPLOYEES = 1000
+
+
+@pytest.fixture
+def local():
+    local = LocalAWS(latency=Latency(call_ms=CALL_MS, execution_ms=EXECUTION_MS))
+    local.db.seed(employees=EMPLOYEES)
+    local.install(lambda_function)
+    yield local
+    lambda_function._clients.clear()
+    lambda_function._credentials.clear()
+
+
+def invoke(method, path, body=None, query=None):
+    event = {'httpMethod': method, 'path': path, 'queryStringParameters': query}
+    if body is not None:
+        event['body'] = json.dumps(body)
+    response = lambda_function.lambda_handler(event, None)
+    assert response['statusCode'] == 200, response['body']
+    return json.loads(response['body'])
+
+
+def test_insert_100_rows(benchmark, local):
+    ids = itertools.count(100000, 100)
+    benchmark(lambda: invoke('POST', '/data/hired_employees',
+                             {'data': generate_hired_employees(100, start_id=next(ids))}))
+
+
+def test_backup_hired_employees(benchmark, local):
+    benchmark(invoke, 'POST', '/backup/hired_employees')
+
+
+def test_restore_hired_employees(benchmark, local):
+    backup_key = invoke('POST', '/backup/hired_employees')['backup_key']
+    benchmark(invoke, 'POST', '/restore/hired_employees', {'backup_key': backup_key})
+
+
+def test_sql_all_employees(benchmark, local):
+    sql = ("SELECT e.id, e.name, e.datetime, d.department, j.job FROM hr_data.hired_employees e "
+           "LEFT JOIN hr_data.departments d ON e.department_id = d.id LEFT JOIN hr_data.jobs j ON e.job_id = j.id")
+    result = benchmark(invoke, 'POST', '/sql', {'sql': sql})
+    assert result['count'] == EMPLOYEES
+
+
+@pytest.mark.parametrize('report', ['quarterly_hiring_report', 'departments_above_avg_hiring'])
+def test_report(benchmark, local, report):
+    benchmark(invoke, 'GET', f'/reports/{report}/2021', query={'cache': 'false'})
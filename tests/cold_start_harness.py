@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Measure Lambda cold start for the Data API function, per route.
+
+Every route runs in a fresh interpreter: the harness times the module import,
+then one handler invocation, and records which boto3 clients were built and
+whether fastavro was loaded. AWS calls are answered with canned responses so
+the numbers cover only import, client construction and handler work.
+
+    python tests/cold_start_harness.py
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+LAMBDA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'infrastructure', 'lambda'))
+
+ROUTES = {
+    'options': {'httpMethod': 'OPTIONS', 'path': '/sql'},
+    'reports': {'httpMethod': 'GET', 'path': '/reports/quarterly_hiring_report/2021'},
+    'sql': {'httpMethod': 'POST', 'path': '/sql', 'body': json.dumps({'sql': 'SELECT 1'})},
+    'data': {'httpMethod': 'POST', 'path': '/data/jobs', 'body': json.dumps({'data': [{'id': 1, 'job': 'Engineer'}]})},
+    'backup': {'httpMethod': 'POST', 'path': '/backup/jobs'},
+    'restore': {'httpMethod': 'POST', 'path': '/restore/jobs', 'body': json.dumps({'backup_key': 'backups/jobs/x.avro'})},
+}
+
+CHILD = r'''
+import io, json, sys, time
+import botocore.client
+
+CANNED = {
+    'GetSecretValue': {'SecretString': json.dumps({'username': 'awsuser'})},
+    'ExecuteStatement': {'Id': 'stmt-1'},
+    'BatchExecuteStatement': {'Id': 'stmt-1'},
+    'DescribeStatement': {'Status': 'FINISHED', 'HasResultSet': True},
+    'GetStatementResult': {'ColumnMetadata': [{'name': 'id'}], 'Records': [[{'longValue': 1}]]},
+    'PutObject': {},
+}
+
+def fake_api_call(self, operation, params):
+    if operation == 'GetObject':
+        return {'Body': io.BytesIO(b'')}
+    return CANNED.get(operation, {})
+
+botocore.client.BaseClient._make_api_call = fake_api_call
+
+started = time.perf_counter()
+import lambda_function
+imported = time.perf_counter()
+response = lambda_function.lambda_handler(json.loads(sys.argv[1]), None)
+handled = time.perf_counter()
+
+print(json.dumps({
+    'import_ms': round((imported - started) * 1000, 1),
+    'first_request_ms': round((handled - imported) * 1000, 1),
+    'status_code': response['statusCode'],
+    'clients': sorted(lambda_function._clients),
+    'fastavro_loaded': 'fastavro' in sys.modules,
+}))
+'''
+
+
+def child_env():
+    env = dict(os.environ)
+    env.update({
+        'SECRET_NAME': 'test-secret',
+        'REDSHIFT_HOST': 'test-cluster.abc123.us-east-1.redshift.amazonaws.com',
+        'REDSHIFT_DB': 'dev',
+        'S3_BUCKET': 'test-bucket',
+        # The canned result is not a plan, which the EXPLAIN guard would reject
+        'SQL_GUARD': 'false',
+        'AWS_DEFAULT_REGION': 'us-east-1',
+        'AWS_ACCESS_KEY_ID': 'testing',
+        'AWS_SECRET_ACCESS_KEY': 'testing',
+        'AWS_EC2_METADATA_DISABLED': 'true',
+        'PYTHONPATH': LAMBDA_DIR,
+    })
+    return env
+
+
+def measure_route(route: str) -> dict:
+    """Cold-start one route in a fresh interpreter and return its measurements"""
+    completed = subprocess.run(
+        [sys.executable, '-c', CHILD, json.dumps(ROUTES[route])],
+        capture_output=True, text=True, env=child_env(), cwd=LAMBDA_DIR, check=True
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main():
+    print(f"{'route':<10}{'import ms':>12}{'first req ms':>14}  clients")
+    for route in ROUTES:
+        result = measure_route(route)
+        clients = ', '.join(result['clients']) or '-'
+        avro = ' +fastavro' if result['fastavro_loaded'] else ''
+        print(f"{route:<10}{result['import_ms']:>12}{result['first_request_ms']:>14}  {clients}{avro}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+import os
+import sys
+
+import pytest
+
+# Make the Lambda sources importable and give them the environment they expect
+LAMBDA_DIR = os.path.join(os.path.dirname(__file__), '..', 'infrastructure', 'lambda')
+sys.path.insert(0, os.path.abspath(LAMBDA_DIR))
+
+os.environ.setdefault('SECRET_NAME', 'test-secret')
+os.environ.setdefault('REDSHIFT_HOST', 'test-cluster.abc123.us-east-1.redshift.amazonaws.com')
+os.environ.setdefault('REDSHIFT_DB', 'dev')
+os.environ.setdefault('S3_BUCKET', 'test-bucket')
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+# Route tests and benchmarks call the same routes back to back as one caller
+os.environ.setdefault('ADMISSION_RATES', 'report=1000/1000,ingest=1000/1000,adhoc=1000/1000,ai=1000/1000')
+
+
+@pytest.fixture(autouse=True)
+def clear_report_cache():
+    """Report results, dimensions, admission, in-flight and session state are per container; start every test cold"""
+    lambda_function = sys.modules.get('lambda_function')
+    if lambda_function is not None:
+        lambda_function._report_cache.clear()
+        lambda_function.DIMENSION_CACHE.invalidate()
+        lambda_function.ADMISSION.store = sys.modules['admission'].MemoryStore()
+        lambda_function.COALESCER.registry = sys.modules['single_flight'].MemoryRegistry()
+        lambda_function.SESSIONS.clear()
+    yield
+
+
+@pytest.fixture
+def local_aws():
+    """Seeded offline Data API, S3 and Secrets Manager installed into the Data API Lambda"""
+    pytest.importorskip('duckdb')
+    import lambda_function
+    from local_data_api import LocalAWS
+
+    local = LocalAWS()
+    local.db.seed()
+    local.install(lambda_function)
+    yield local
+    lambda_function._clients.clear()
+    lambda_function._credentials.clear()
@@ -0,0 +1,22 @@
+"""
+Calls the Data API Lambda's handler the way API Gateway's proxy integration
+does, for tests that exercise whole routes against the local_aws fixture.
+
+    status, body = invoke('POST', '/sql', {'sql': 'SELECT 1'})
+"""
+
+import json
+
+import lambda_function
+
+
+def api_event(method, path, body=None, query=None):
+    event = {'httpMethod': method, 'path': path, 'queryStringParameters': query}
+    if body is not None:
+        event['body'] = json.dumps(body)
+    return event
+
+
+def invoke(method, path, body=None, query=None):
+    response = lambda_function.lambda_handler(api_event(method, path, body, query), None)
+    return response['statusCode'], json.loads(response['body'])
@@ -0,0 +1,665 @@
+"""
+Offline stand-ins for the redshift-data, s3, secretsmanager and dynamodb clients.
+
+SQL runs on an embedded DuckDB database that carries the hr_data schema from
+database/ddl. The Redshift Data API surface the Lambda uses is emulated:
+asynchronous statement status, batch transactions with sub-statement ids,
+paged results with NextToken, Data API style typed fields, and sessions kept
+alive with SessionKeepAliveSeconds (one statement at a time, expiring after
+the keep-alive). EXPLAIN returns a one-line Redshift-style plan whose row
+estimate is the query's actual row count and whose width is 20 bytes per
+column. Latency can be injected per API call, per statement and per
+connection setup so route benchmarks reflect the round trips a change adds or
+removes. GRANT and ALTER DATASHARE ... ADD TABLE are recorded in
+svv_relation_privileges and svv_datashare_objects and follow the table object
+through RENAME and DROP, and a database listed in ``consumers`` only sees the
+tables of its datashare. The dynamodb stand-in keeps items per table and
+evaluates the simple condition expressions the shared admission and
+coalescing stores use.
+
+    local = LocalAWS(latency=Latency(call_ms=2, execution_ms=20))
+    local.install(lambda_function)
+"""
+
+import hashlib
+import io
+import itertools
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+
+import duckdb
+from botocore.exceptions import ClientError
+
+DDL_DIR = os.path.join(os.path.dirname(__file__), '..', 'database', 'ddl')
+HR_TABLES = ('departments', 'jobs', 'hired_employees')
+SUMMARY_TABLES = ('hiring_summary',)
+
+PLACEHOLDER_PATTERN = re.compile(r'(?<![:\w]):([A-Za-z_]\w*)')
+CREATE_LIKE_PATTERN = re.compile(r'CREATE\s+(TEMP\s+|TEMPORARY\s+)?TABLE\s+([\w.]+)\s*\(\s*LIKE\s+([\w.]+)\s*\)', re.I)
+GRANT_PATTERN = re.compile(r'^\s*GRANT\s+(\w+)\s+ON\s+(?:TABLE\s+)?hr_data\.(\w+)\s+TO\s+(?:(GROUP|ROLE)\s+)?"?(\w+)"?\s*$', re.I)
+SHARE_PATTERN = re.compile(r'^\s*ALTER\s+DATASHARE\s+(\w+)\s+ADD\s+TABLE\s+hr_data\.(\w+)\s*$', re.I)
+RENAME_PATTERN = re.compile(r'^\s*ALTER\s+TABLE\s+hr_data\.(\w+)\s+RENAME\s+TO\s+(\w+)\s*$', re.I)
+DROP_PATTERN = re.compile(r'^\s*DROP\s+TABLE\s+(?:IF\s+EXISTS\s+)?hr_data\.(\w+)\s*$', re.I)
+LOCK_PATTERN = re.compile(r'^\s*LOCK\s+', re.I)
+EXPLAIN_PATTERN = re.compile(r'^\s*EXPLAIN\s+(.*)$', re.I | re.S)
+LEADING_PATTERN = r'(?:\s+|--[^\n]*(?:\n|$)|/\*.*?\*/|\()*'
+RESULT_SET_PATTERN = re.compile(LEADING_PATTERN + r'(SELECT|WITH|SHOW|VALUES|EXPLAIN)\b', re.I | re.S)
+QUERY_PATTERN = re.compile(LEADING_PATTERN + r'(SELECT|WITH)\b', re.I | re.S)
+
+DUCKDB_TYPE_NAMES = {
+    'INTEGER': 'int4',
+    'SMALLINT': 'int2',
+    'BIGINT': 'int8',
+    'HUGEINT': 'numeric',
+    'DOUBLE': 'float8',
+    'FLOAT': 'float4',
+    'BOOLEAN': 'bool',
+    'VARCHAR': 'varchar',
+    'DATE': 'date',
+    'TIMESTAMP': 'timestamp',
+    'TIMESTAMP WITH TIME ZONE': 'timestamptz',
+}
+
+
+def client_error(code, message, operation):
+    return ClientError({'Error': {'Code': code, 'Message': message}}, operation)
+
+
+def load_hr_ddl():
+    """CREATE TABLE statements for the hr_data tables, without Redshift-only clauses"""
+    statements = []
+    for filename, tables in (('transformations.sql', HR_TABLES), ('hiring_summary.sql', SUMMARY_TABLES)):
+        with open(os.path.join(DDL_DIR, filename)) as f:
+            text = f.read()
+        for table in tables:
+            match = re.search(rf'CREATE TABLE hr_data\.{table} \((.*?)\)\s*DISTSTYLE', text, re.S)
+            columns = match.group(1).replace('PRIMARY KEY', '')
+            statements.append(f"CREATE TABLE hr_data.{table} ({columns})")
+    return statements
+
+
+def load_summary_backfill():
+    """The INSERT that fills hr_data.hiring_summary from hired_employees"""
+    with open(os.path.join(DDL_DIR, 'hiring_summary.sql')) as f:
+        return re.search(r'INSERT INTO hr_data\.hiring_summary.*?;', f.read(), re.S).group(0)
+
+
+def translate_sql(sql):
+    """Rewrite the Redshift dialect the Lambda emits into DuckDB SQL"""
+    grant = GRANT_PATTERN.match(sql)
+    if grant:
+        privilege, table, kind, identity = grant.groups()
+        identity_type = kind.lower() if kind else ('public' if identity.lower() == 'public' else 'user')
+        return (f"INSERT INTO svv_relation_privileges VALUES "
+                f"('hr_data', '{table}', '{privilege.upper()}', '{identity_type}', '{identity}')")
+    if LOCK_PATTERN.match(sql):
+        # Statements already run one at a time here
+        return 'SELECT 0 WHERE false'
+    share = SHARE_PATTERN.match(sql)
+    if share:
+        return f"INSERT INTO svv_datashare_objects VALUES ('OUTBOUND', '{share.group(1)}', 'table', 'hr_data.{share.group(2)}')"
+    sql = CREATE_LIKE_PATTERN.sub(
+        lambda m: f"CREATE {m.group(1) or ''}TABLE {m.group(2)} AS SELECT * FROM {m.group(3)} LIMIT 0", sql
+    )
+    return PLACEHOLDER_PATTERN.sub(r'$\1', sql)
+
+
+def to_field(value):
+    """Encode a Python value the way the Data API returns it"""
+    if value is None:
+        return {'isNull': True}
+    if isinstance(value, bool):
+        return {'booleanValue': value}
+    if isinstance(value, int):
+        return {'longValue': value}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            return {'stringValue': value.astimezone(timezone.utc).strftime('%Y-%m-%d %H:%M:%S+00')}
+        return {'stringValue': value.strftime('%Y-%m-%d %H:%M:%S')}
+    if isinstance(value, (date, Decimal)):
+        return {'stringValue': str(value)}
+    return {'stringValue': str(value)}
+
+
+def column_metadata(description):
+    metadata = []
+    for name, type_code, *_ in description:
+        # Redshift folds unquoted identifiers to lower case
+        name = name.lower()
+        type_text = str(type_code)
+        type_name = DUCKDB_TYPE_NAMES.get(type_text, type_text.lower())
+        column = {'name': name, 'label': name, 'typeName': type_name, 'nullable': 1}
+        decimal = re.match(r'DECIMAL\((\d+),\s*(\d+)\)', type_text)
+        if decimal:
+            column.update(typeName='numeric', precision=int(decimal.group(1)), scale=int(decimal.group(2)))
+        metadata.append(column)
+    return metadata
+
+
+class Latency:
+    """Injected delays: every API call pays call_ms, statements run for execution_ms
+
+    A statement not sent on an existing session also pays connect_ms for the
+    connection and authentication the Data API sets up for it.
+    """
+
+    def __init__(self, call_ms=0.0, execution_ms=0.0, connect_ms=0.0):
+        self.call = call_ms / 1000
+        self.execution = execution_ms / 1000
+        self.connect = connect_ms / 1000
+
+
+class LocalRedshift:
+    """Embedded DuckDB database holding the hr_data schema"""
+
+    def __init__(self):
+        self.conn = duckdb.connect()
+        self.lock = threading.RLock()
+        self.conn.execute("SET TimeZone = 'UTC'")
+        self.conn.execute('CREATE SCHEMA hr_data')
+        for statement in load_hr_ddl():
+            self.conn.execute(statement)
+        self.conn.execute('CREATE TABLE svv_relation_privileges (namespace_name VARCHAR, relation_name VARCHAR, '
+                          'privilege_type VARCHAR, identity_type VARCHAR, identity_name VARCHAR)')
+        self.conn.execute('CREATE TABLE svv_datashare_objects (share_type VARCHAR, share_name VARCHAR, '
+                          'object_type VARCHAR, object_name VARCHAR)')
+
+    def run(self, sql, parameters=None):
+        """Run one statement and return (metadata, rows, affected rows)"""
+        explain = EXPLAIN_PATTERN.match(sql)
+        if explain:
+            return self.explain(explain.group(1), parameters)
+        with self.lock:
+            cursor = self.conn.execute(translate_sql(sql), parameters or {})
+            self.track_access(sql)
+            if RESULT_SET_PATTERN.match(sql):
+                return column_metadata(cursor.description), cursor.fetchall(), None
+            affected = cursor.fetchone() if cursor.description else None
+            return None, None, affected[0] if affected else 0
+
+    def track_access(self, sql):
+        """Grants and datashare membership stay with the table object: renamed with it, dropped with it"""
+        rename = RENAME_PATTERN.match(sql)
+        if rename:
+            old, new = rename.groups()
+            self.conn.execute("UPDATE svv_relation_privileges SET relation_name = ? WHERE relation_name = ?", [new, old])
+            self.conn.execute("UPDATE svv_datashare_objects SET object_name = ? WHERE object_name = ?",
+                              [f'hr_data.{new}', f'hr_data.{old}'])
+        drop = DROP_PATTERN.match(sql)
+        if drop:
+            self.conn.execute("DELETE FROM svv_relation_privileges WHERE relation_name = ?", [drop.group(1)])
+            self.conn.execute("DELETE FROM svv_datashare_objects WHERE object_name = ?", [f'hr_data.{drop.group(1)}'])
+
+    def check_shared(self, sql, share):
+        """Fail like a consumer database does when a query names a table outside its datashare"""
+        with self.lock:
+            shared = {row[0] for row in self.conn.execute(
+                "SELECT object_name FROM svv_datashare_objects WHERE share_name = ?", [share]
+            ).fetchall()}
+        for table in re.findall(r'hr_data\.\w+', sql):
+            if table not in shared:
+                raise duckdb.CatalogException(f'relation "{table}" does not exist')
+
+    def explain(self, sql, parameters=None):
+        """A Redshift-style plan line for a query, estimated from its actual result"""
+        rows, width = 0, 0
+        if QUERY_PATTERN.match(sql):
+            with self.lock:
+                cursor = self.conn.execute(f"SELECT * FROM ({translate_sql(sql)}) AS q LIMIT 0", parameters or {})
+                width = 20 * len(cursor.description)
+                rows = self.conn.execute(f"SELECT COUNT(*) FROM ({translate_sql(sql)}) AS q", parameters or {}).fetchone()[0]
+        line = f"XN Subquery Scan q  (cost=0.00..{rows * 0.01:.2f} rows={rows} width={width})"
+        metadata = [{'name': 'query plan', 'label': 'QUERY PLAN', 'typeName': 'text', 'nullable': 1}]
+        return metadata, [(line,)], None
+
+    def run_transaction(self, statements):
+        with self.lock:
+            self.conn.execute('BEGIN TRANSACTION')
+            try:
+                results = [self.run(sql) for sql in statements]
+            except Exception:
+                self.conn.execute('ROLLBACK')
+                raise
+            self.conn.execute('COMMIT')
+            return results
+
+    def query(self, sql, parameters=None):
+        """Convenience for assertions: plain rows"""
+        return self.run(sql, parameters)[1]
+
+    def seed(self, employees=200, departments=12, jobs=40, seed=7):
+        """Load a deterministic dataset"""
+        self.load('departments', [(i, f'Department {i}') for i in range(1, departments + 1)])
+        self.load('jobs', [(i, f'Job {i}') for i in range(1, jobs + 1)])
+        self.load('hired_employees', [tuple(r.values()) for r in generate_hired_employees(employees, departments, jobs, seed)])
+        with self.lock:
+            self.conn.execute(load_summary_backfill())
+
+    def load(self, table, rows):
+        """Bulk insert tuples with one statement (executemany is slow in DuckDB)"""
+        if not rows:
+            return
+        row_placeholders = f"({', '.join('?' * len(rows[0]))})"
+        with self.lock:
+            self.conn.execute(
+                f"INSERT INTO hr_data.{table} VALUES {', '.join([row_placeholders] * len(rows))}",
+                [value for row in rows for value in row]
+            )
+
+
+def generate_hired_employees(count, departments=12, jobs=40, seed=7, start_id=1):
+    """Deterministic hired_employees rows spread over 2020-2022"""
+    rng = random.Random(seed)
+    start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    return [
+        {
+            'id': i,
+            'name': f'Employee {i}',
+            'datetime': (start + timedelta(minutes=rng.randrange(3 * 365 * 24 * 60))).strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'department_id': rng.randint(1, departments),
+            'job_id': rng.randint(1, jobs),
+        }
+        for i in range(start_id, start_id + count)
+    ]
+
+
+class Statement:
+    def __init__(self, sql, ready_at, redshift_query_id, session_id=None):
+        self.id = str(uuid.uuid4())
+        self.sql = sql
+        self.ready_at = ready_at
+        self.redshift_query_id = redshift_query_id
+        self.session_id = session_id
+        self.created_at = time.time()
+        self.error = None
+        self.metadata = None
+        self.rows = None
+        self.affected = 0
+        self.sub_statements = []
+
+
+class Session:
+    def __init__(self, keep_alive, target=None):
+        self.id = str(uuid.uuid4())
+        self.keep_alive = keep_alive
+        self.target = target
+        self.busy_until = 0.0
+
+    def expires_at(self):
+        return self.busy_until + self.keep_alive
+
+
+class FakeRedshiftData:
+    """redshift-data client backed by LocalRedshift"""
+
+    def __init__(self, db, latency=None, page_size=1000):
+        self.db = db
+        self.latency = latency or Latency()
+        self.page_size = page_size
+        self.statements = {}
+        self.sessions = {}
+        # Cluster identifiers or workgroup names that refuse statements, as if paused
+        self.unavailable = set()
+        # Databases created from a datashare, by name, and the share each one reads
+        self.consumers = {}
+        self.calls = []
+        self._query_ids = itertools.count(1000)
+        self._lock = threading.Lock()
+
+    def _call(self, operation, kwargs):
+        with self._lock:
+            self.calls.append((operation, kwargs))
+        if self.latency.call:
+            time.sleep(self.latency.call)
+
+    def _target(self, operation, kwargs):
+        if kwargs.get('SessionId'):
+            if kwargs.get('ClusterIdentifier') or kwargs.get('WorkgroupName') or kwargs.get('DbUser'):
+                raise client_error('ValidationException', 'SessionId cannot be combined with connection parameters', operation)
+            return
+        if not (kwargs.get('ClusterIdentifier') or kwargs.get('WorkgroupName')):
+            raise client_error('ValidationException', 'ClusterIdentifier or WorkgroupName is required', operation)
+        if kwargs.get('WorkgroupName') and kwargs.get('DbUser'):
+            raise client_error('ValidationException', 'DbUser is not supported for Redshift Serverless', operation)
+        target = kwargs.get('ClusterIdentifier') or kwargs.get('WorkgroupName')
+        if target in self.unavailable:
+            raise client_error('ValidationException', f'Cluster {target} is not available', operation)
+        if not kwargs.get('Database'):
+            raise client_error('ValidationException', 'Database is required', operation)
+
+    def _session(self, operation, kwargs):
+        """The session a statement runs on, or None; a new one pays the connection setup"""
+        now = time.time()
+        with self._lock:
+            if kwargs.get('SessionId'):
+                session = self.sessions.get(kwargs['SessionId'])
+                if session is None or session.expires_at() <= now or session.target in self.unavailable:
+                    raise client_error('ValidationException', f"Session {kwargs['SessionId']} is not available", operation)
+                if session.busy_until > now:
+                    raise client_error('ValidationException', f"Session {session.id} is busy with another statement", operation)
+                return session, 0.0
+            if kwargs.get('SessionKeepAliveSeconds'):
+                session = Session(kwargs['SessionKeepAliveSeconds'], kwargs.get('ClusterIdentifier') or kwargs.get('WorkgroupName'))
+                self.sessions[session.id] = session
+                return session, self.latency.connect
+        return None, self.latency.connect
+
+    def _submit(self, sqls, run, operation, kwargs):
+        session, setup = self._session(operation, kwargs)
+        statement = Statement(
+            sqls if isinstance(sqls, str) else ';\n'.join(sqls),
+            time.time() + setup + self.latency.execution,
+            next(self._query_ids),
+            session.id if session else None
+        )
+        if session:
+            session.busy_until = statement.ready_at
+        try:
+            run(statement)
+        except duckdb.Error as e:
+            statement.error = f"ERROR: {str(e)}"
+        with self._lock:
+            self.statements[statement.id] = statement
+        return statement
+
+    def _response(self, statement, kwargs):
+        response = {'Id': statement.id, 'Database': kwargs.get('Database')}
+        if statement.session_id:
+            response['SessionId'] = statement.session_id
+        return response
+
+    def execute_statement(self, **kwargs):
+        self._call('ExecuteStatement', kwargs)
+        self._target('ExecuteStatement', kwargs)
+        parameters = {p['name']: p['value'] for p in kwargs.get('Parameters', [])}
+
+        def run(statement):
+            if kwargs.get('Database') in self.consumers:
+                self.db.check_shared(kwargs['Sql'], self.consumers[kwargs['Database']])
+            statement.metadata, statement.rows, statement.affected = self.db.run(kwargs['Sql'], parameters)
+
+        statement = self._submit(kwargs['Sql'], run, 'ExecuteStatement', kwargs)
+        return self._response(statement, kwargs)
+
+    def batch_execute_statement(self, **kwargs):
+        self._call('BatchExecuteStatement', kwargs)
+        self._target('BatchExecuteStatement', kwargs)
+
+        def run(statement):
+            results = self.db.run_transaction(kwargs['Sqls'])
+            for index, (sql, (metadata, rows, affected)) in enumerate(zip(kwargs['Sqls'], results), start=1):
+                sub = Statement(sql, statement.ready_at, next(self._query_ids))
+                sub.id = f"{statement.id}:{index}"
+                sub.metadata, sub.rows, sub.affected = metadata, rows, affected
+                statement.sub_statements.append(sub)
+
+        statement = self._submit(kwargs['Sqls'], run, 'BatchExecuteStatement', kwargs)
+        with self._lock:
+            for sub in statement.sub_statements:
+                self.statements[sub.id] = sub
+        return self._response(statement, kwargs)
+
+    def _get(self, statement_id, operation):
+        statement = self.statements.get(statement_id)
+        if statement is None:
+            raise client_error('ResourceNotFoundException', f'Query {statement_id} does not exist', operation)
+        return statement
+
+    def describe_statement(self, Id):
+        self._call('DescribeStatement', {'Id': Id})
+        statement = self._get(Id, 'DescribeStatement')
+        if time.time() < statement.ready_at:
+            return {'Id': Id, 'Status': 'STARTED', 'QueryString': statement.sql}
+
+        description = {
+            'Id': Id,
+            'Status': 'FAILED' if statement.error else 'FINISHED',
+            'QueryString': statement.sql,
+            'RedshiftQueryId': statement.redshift_query_id,
+            'HasResultSet': statement.rows is not None,
+            'ResultRows': len(statement.rows) if statement.rows is not None else statement.affected,
+            'Duration': int((statement.ready_at - statement.created_at) * 1e9),
+        }
+        if statement.error:
+            description['Error'] = statement.error
+        if statement.session_id:
+            description['SessionId'] = statement.session_id
+        if statement.sub_statements:
+            description['SubStatements'] = [
+                {
+                    'Id': sub.id,
+                    'Status': 'FINISHED',
+                    'QueryString': sub.sql,
+                    'RedshiftQueryId': sub.redshift_query_id,
+                    'HasResultSet': sub.rows is not None,
+                    'ResultRows': len(sub.rows) if sub.rows is not None else sub.affected,
+                }
+                for sub in statement.sub_statements
+            ]
+        return description
+
+    def get_statement_result(self, Id, NextToken=None):
+        self._call('GetStatementResult', {'Id': Id, 'NextToken': NextToken})
+        statement = self._get(Id, 'GetStatementResult')
+        if statement.rows is None:
+            raise client_error('ValidationException', f'Query {Id} does not have a result set', 'GetStatementResult')
+
+        offset = int(NextToken or 0)
+        page = statement.rows[offset:offset + self.page_size]
+        response = {
+            'ColumnMetadata': statement.metadata,
+            'Records': [[to_field(value) for value in row] for row in page],
+            'TotalNumRows': len(statement.rows),
+        }
+        if offset + self.page_size < len(statement.rows):
+            response['NextToken'] = str(offset + self.page_size)
+        return response
+
+
+class FakeS3:
+    """In-memory s3 client"""
+
+    def __init__(self, latency=None):
+        self.latency = latency or Latency()
+        self.objects = {}
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def _call(self, operation, kwargs):
+        self.calls.append((operation, kwargs))
+        if self.latency.call:
+            time.sleep(self.latency.call)
+
+    def put_object(self, Bucket, Key, Body=b'', IfMatch=None, IfNoneMatch=None, **kwargs):
+        self._call('PutObject', {'Bucket': Bucket, 'Key': Key})
+        body = Body.encode('utf-8') if isinstance(Body, str) else (Body.read() if hasattr(Body, 'read') else bytes(Body))
+        with self._lock:
+            existing = self.objects.get((Bucket, Key))
+            if IfNoneMatch == '*' and existing is not None:
+                raise client_error('PreconditionFailed', 'At least one of the pre-conditions you specified did not hold', 'PutObject')
+            if IfMatch is not None and (existing is None or existing['ETag'] != IfMatch):
+                raise client_error('PreconditionFailed', 'At least one of the pre-conditions you specified did not hold', 'PutObject')
+            etag = f'"{hashlib.md5(body).hexdigest()}"'
+            self.objects[(Bucket, Key)] = {
+                'Body': body,
+                'ETag': etag,
+                'LastModified': datetime.now(timezone.utc),
+                'ContentType': kwargs.get('ContentType', 'binary/octet-stream'),
+                'Metadata': kwargs.get('Metadata', {}),
+            }
+        return {'ETag': etag}
+
+    def _object(self, Bucket, Key, operation):
+        stored = self.objects.get((Bucket, Key))
+        if stored is None:
+            raise client_error('NoSuchKey', 'The specified key does not exist.', operation)
+        return stored
+
+    def get_object(self, Bucket, Key, **kwargs):
+        self._call('GetObject', {'Bucket': Bucket, 'Key': Key})
+        stored = self._object(Bucket, Key, 'GetObject')
+        return {
+            'Body': io.BytesIO(stored['Body']),
+            'ContentLength': len(stored['Body']),
+            'ContentType': stored['ContentType'],
+            'ETag': stored['ETag'],
+            'Metadata': stored['Metadata'],
+        }
+
+    def head_object(self, Bucket, Key, **kwargs):
+        self._call('HeadObject', {'Bucket': Bucket, 'Key': Key})
+        stored = self._object(Bucket, Key, 'HeadObject')
+        return {'ContentLength': len(stored['Body']), 'ETag': stored['ETag'], 'Metadata': stored['Metadata']}
+
+    def delete_object(self, Bucket, Key, **kwargs):
+        self._call('DeleteObject', {'Bucket': Bucket, 'Key': Key})
+        self.objects.pop((Bucket, Key), None)
+        return {}
+
+    def list_objects_v2(self, Bucket, Prefix='', MaxKeys=1000, ContinuationToken=None, **kwargs):
+        self._call('ListObjectsV2', {'Bucket': Bucket, 'Prefix': Prefix})
+        keys = sorted(key for bucket, key in self.objects if bucket == Bucket and key.startswith(Prefix))
+        offset = int(ContinuationToken or 0)
+        page = keys[offset:offset + MaxKeys]
+        response = {
+            'KeyCount': len(page),
+            'Contents': [
+                {
+                    'Key': key,
+                    'Size': len(self.objects[(Bucket, key)]['Body']),
+                    'ETag': self.objects[(Bucket, key)]['ETag'],
+                    'LastModified': self.objects[(Bucket, key)]['LastModified'],
+                }
+                for key in page
+            ],
+            'IsTruncated': offset + MaxKeys < len(keys),
+        }
+        if response['IsTruncated']:
+            response['NextContinuationToken'] = str(offset + MaxKeys)
+        return response
+
+
+class FakeSecretsManager:
+    def __init__(self, username='awsuser', latency=None):
+        self.latency = latency or Latency()
+        self.username = username
+        self.calls = []
+
+    def get_secret_value(self, SecretId):
+        self.calls.append(('GetSecretValue', {'SecretId': SecretId}))
+        if self.latency.call:
+            time.sleep(self.latency.call)
+        return {'SecretString': f'{{"username": "{self.username}", "password": "local"}}'}
+
+
+CONDITION_PATTERN = re.compile(r'^\s*(?:attribute_not_exists\(([#\w]+)\)|([#\w]+)\s*(=|<>|<=|>=|<|>)\s*(:\w+))\s*$')
+
+
+def attribute_value(value):
+    if 'N' in value:
+        return float(value['N'])
+    return next(iter(value.values()))
+
+
+class FakeDynamoDB:
+    """In-memory dynamodb client: single-key items, conditional writes, no expiry sweeps
+
+    Conditions are clauses joined by OR, each attribute_not_exists(name) or
+    name <op> :value. Like the real service, TTL attributes do not hide items;
+    readers check expiry themselves.
+    """
+
+    OPERATORS = {'=': lambda a, b: a == b, '<>': lambda a, b: a != b, '<': lambda a, b: a < b,
+                 '<=': lambda a, b: a <= b, '>': lambda a, b: a > b, '>=': lambda a, b: a >= b}
+
+    def __init__(self, latency=None):
+        self.latency = latency or Latency()
+        self.items = {}
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def _call(self, operation, kwargs):
+        self.calls.append((operation, kwargs))
+        if self.latency.call:
+            time.sleep(self.latency.call)
+
+    @staticmethod
+    def _key(TableName, Key):
+        return TableName, tuple(sorted((name, attribute_value(value)) for name, value in Key.items()))
+
+    def _check(self, item, expression, names, values, operation):
+        if expression is None:
+            return
+        for clause in expression.split(' OR '):
+            match = CONDITION_PATTERN.match(clause)
+            if match is None:
+                raise client_error('ValidationException', f'Unsupported condition: {clause}', operation)
+            missing, name, operator, placeholder = match.groups()
+            if missing is not None:
+                if item is None or (names or {}).get(missing, missing) not in item:
+                    return
+                continue
+            current = (item or {}).get((names or {}).get(name, name))
+            if current is not None and self.OPERATORS[operator](attribute_value(current), attribute_value(values[placeholder])):
+                return
+        raise client_error('ConditionalCheckFailedException', 'The conditional request failed', operation)
+
+    def get_item(self, TableName, Key, ConsistentRead=False, **kwargs):
+        self._call('GetItem', {'TableName': TableName, 'Key': Key})
+        with self._lock:
+            item = self.items.get(self._key(TableName, Key))
+        return {'Item': dict(item)} if item is not None else {}
+
+    def put_item(self, TableName, Item, ConditionExpression=None, ExpressionAttributeNames=None,
+                 ExpressionAttributeValues=None, **kwargs):
+        self._call('PutItem', {'TableName': TableName, 'Item': Item})
+        key = self._key(TableName, {'pk': Item['pk']})
+        with self._lock:
+            self._check(self.items.get(key), ConditionExpression, ExpressionAttributeNames,
+                        ExpressionAttributeValues, 'PutItem')
+            self.items[key] = dict(Item)
+        return {}
+
+    def delete_item(self, TableName, Key, ConditionExpression=None, ExpressionAttributeNames=None,
+                    ExpressionAttributeValues=None, **kwargs):
+        self._call('DeleteItem', {'TableName': TableName, 'Key': Key})
+        key = self._key(TableName, Key)
+        with self._lock:
+            self._check(self.items.get(key), ConditionExpression, ExpressionAttributeNames,
+                        ExpressionAttributeValues, 'DeleteItem')
+            self.items.pop(key, None)
+        return {}
+
+
+class LocalAWS:
+    """The fake clients sharing one embedded database"""
+
+    def __init__(self, latency=None, page_size=1000):
+        self.latency = latency or Latency()
+        self.db = LocalRedshift()
+        self.redshift_data = FakeRedshiftData(self.db, self.latency, page_size)
+        self.s3 = FakeS3(self.latency)
+        self.secretsmanager = FakeSecretsManager(latency=self.latency)
+        self.dynamodb = FakeDynamoDB(self.latency)
+
+    def clients(self):
+        return {
+            'redshift-data': self.redshift_data,
+            's3': self.s3,
+            'secretsmanager': self.secretsmanager,
+            'dynamodb': self.dynamodb,
+        }
+
+    def install(self, lambda_module):
+        """Point a Lambda module's client cache at the fakes"""
+        lambda_module._clients.clear()
+        lambda_module._clients.update(self.clients())
+        lambda_module._credentials.clear()
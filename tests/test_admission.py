@@ -0,0 +1,185 @@
+import json
+import threading
+import time
+
+import pytest
+
+import admission
+import lambda_function
+import request_metrics
+from admission import AdmissionController, AdmissionRejected, AdmissionStore, DynamoDBStore, MemoryStore, SQLiteStore
+
+
+def fake_dynamodb():
+    pytest.importorskip('duckdb')
+    from local_data_api import FakeDynamoDB
+    return FakeDynamoDB()
+
+
+@pytest.fixture(params=['memory', 'sqlite', 'dynamodb'])
+def store(request, tmp_path):
+    if request.param == 'dynamodb':
+        dynamodb = fake_dynamodb()
+        return DynamoDBStore('coordination', lambda: dynamodb)
+    return MemoryStore() if request.param == 'memory' else SQLiteStore(str(tmp_path / 'admission.db'))
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_class_limit_and_priority_order(store):
+    controller = AdmissionController(store, limits={'report': 1, 'ingest': 1, 'adhoc': 1, 'ai': 1},
+                                     total_limit=1, poll_seconds=0.01)
+    held = controller.acquire('ingest')
+    admitted = []
+
+    def run(workload):
+        ticket = controller.acquire(workload)
+        admitted.append(workload)
+        controller.release(ticket)
+
+    threads = [threading.Thread(target=run, args=(workload,)) for workload in ('adhoc', 'ai', 'report')]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.05)
+
+    assert admitted == []
+    controller.release(held)
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert admitted == ['report', 'ai', 'adhoc']
+
+
+def test_full_class_does_not_block_other_classes(store):
+    controller = AdmissionController(store, limits={'report': 2, 'ingest': 1, 'adhoc': 1, 'ai': 1})
+    controller.acquire('adhoc')
+
+    ticket = controller.acquire('report')
+
+    assert controller.in_flight() == {'adhoc': 1, 'report': 1}
+    controller.release(ticket)
+
+
+def test_wait_past_timeout_is_rejected(store):
+    controller = AdmissionController(store, limits={'report': 1, 'ingest': 1, 'adhoc': 1, 'ai': 1},
+                                     timeout_seconds=0.05, poll_seconds=0.01)
+    controller.acquire('adhoc')
+
+    with pytest.raises(AdmissionRejected):
+        controller.acquire('adhoc')
+    assert controller.in_flight() == {'adhoc': 1}
+
+
+def test_expired_lease_frees_the_slot(store):
+    clock = Clock()
+    controller = AdmissionController(store, limits={'report': 1, 'ingest': 1, 'adhoc': 1, 'ai': 1},
+                                     lease_seconds=60, clock=clock)
+    controller.acquire('report')
+
+    clock.now += 61
+
+    assert controller.in_flight() == {}
+    controller.acquire('report')
+
+
+def test_token_bucket_refills(store):
+    clock = Clock()
+    controller = AdmissionController(store, rates={'report': (1.0, 2.0), 'ingest': (1.0, 1.0),
+                                                   'adhoc': (1.0, 1.0), 'ai': (1.0, 1.0)}, clock=clock)
+    controller.check_rate('alice', 'report')
+    controller.check_rate('alice', 'report')
+
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.check_rate('alice', 'report')
+    assert rejected.value.retry_after == pytest.approx(1.0)
+    controller.check_rate('bob', 'report')
+
+    clock.now += 1
+    controller.check_rate('alice', 'report')
+
+
+def test_containers_sharing_a_table_share_the_limits():
+    dynamodb = fake_dynamodb()
+    limits = {'report': 1, 'ingest': 1, 'adhoc': 1, 'ai': 1}
+    rates = {'report': (0.001, 1.0), 'ingest': (1.0, 1.0), 'adhoc': (1.0, 1.0), 'ai': (1.0, 1.0)}
+    # One controller per container, each with its own view of the same table
+    first, second = (AdmissionController(DynamoDBStore('coordination', lambda: dynamodb), limits=limits,
+                                         rates=rates, timeout_seconds=0.05, poll_seconds=0.01) for _ in range(2))
+
+    ticket = first.acquire('report')
+    with pytest.raises(AdmissionRejected):
+        second.acquire('report')
+    first.release(ticket)
+    second.release(second.acquire('report'))
+
+    first.check_rate('alice', 'report')
+    with pytest.raises(AdmissionRejected):
+        second.check_rate('alice', 'report')
+
+
+def test_store_missing_a_method_fails_when_built():
+    class Partial(AdmissionStore):
+        def release(self, ticket):
+            pass
+
+    with pytest.raises(TypeError):
+        Partial()
+
+
+def test_settings_parse_per_class_values():
+    assert admission.parse_settings('report=3, adhoc=1', int, admission.DEFAULT_LIMITS)['adhoc'] == 1
+    assert admission.parse_settings('ai=0.2/2', admission.parse_rate, admission.DEFAULT_RATES)['ai'] == (0.2, 2.0)
+    with pytest.raises(ValueError):
+        admission.parse_settings('batch=1', int, admission.DEFAULT_LIMITS)
+
+
+def test_rate_limited_caller_gets_429(local_aws, monkeypatch):
+    controller = AdmissionController(MemoryStore(), rates={'report': (10.0, 10.0), 'ingest': (1.0, 1.0),
+                                                           'adhoc': (0.001, 1.0), 'ai': (1.0, 1.0)})
+    monkeypatch.setattr(lambda_function, 'ADMISSION', controller)
+    monkeypatch.setattr(request_metrics, 'LOG_SAMPLE_RATE', 0.0)
+    event = {
+        'httpMethod': 'POST',
+        'path': '/sql',
+        'body': json.dumps({'sql': 'SELECT 1'}),
+        'requestContext': {'identity': {'sourceIp': '10.0.0.1'}},
+    }
+
+    assert lambda_function.lambda_handler(event, None)['statusCode'] == 200
+    response = lambda_function.lambda_handler(event, None)
+
+    assert response['statusCode'] == 429
+    assert int(response['headers']['Retry-After']) >= 1
+    assert request_metrics.current().counters['AdmissionRejected'] == 1
+    assert lambda_function.lambda_handler(dict(event, headers={'X-Client-Id': 'fresh'}), None)['statusCode'] == 429
+    other = dict(event, requestContext={'identity': {'sourceIp': '10.0.0.2'}})
+    assert lambda_function.lambda_handler(other, None)['statusCode'] == 200
+
+
+def test_client_headers_cannot_pick_a_fresh_budget():
+    identity = {'identity': {'sourceIp': '10.0.0.9'}}
+
+    first = admission.caller_id({'headers': {'X-Client-Id': 'session-a'}, 'requestContext': identity})
+    second = admission.caller_id({'headers': {'x-client-id': 'session-b'}, 'requestContext': identity})
+
+    assert first == second == '10.0.0.9'
+    assert admission.caller_id({'headers': {'X-Client-Id': 'a'},
+                                'requestContext': {'authorizer': {'claims': {'sub': 'user-1'}}}}) == 'user-1'
+    assert admission.caller_id({'requestContext': dict(identity, authorizer={'principalId': 'svc'})}) == 'principal:svc'
+
+
+def test_statements_record_queue_wait(local_aws, capsys, monkeypatch):
+    monkeypatch.setattr(request_metrics, 'LOG_SAMPLE_RATE', 0.0)
+    event = {'httpMethod': 'GET', 'path': '/reports/quarterly_hiring_report/2021', 'queryStringParameters': None}
+
+    lambda_function.lambda_handler(event, None)
+    record = json.loads(capsys.readouterr().out.splitlines()[0])
+
+    assert 'QueueWaitMs' in record
+    assert lambda_function.ADMISSION.in_flight() == {}
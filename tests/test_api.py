@@ -40,7 +40,7 @@ def test_backup():
     url = f"{API_URL}/backup/departments"
     response = requests.post(url)
     print(f"Backup: {response.status_code} - {response.text}")
-    return response.json().get('backup_key') if response.status_code == 200 else None
+    return response.json().get('manifest_key') if response.status_code == 200 else None
 
 def test_restore(backup_key):
     url = f"{API_URL}/restore/departments"
@@ -0,0 +1,78 @@
+import json
+
+import pytest
+
+import lambda_function
+from lambda_client import invoke
+from local_data_api import generate_hired_employees
+
+
+def test_backups_are_catalogued(local_aws):
+    _, full = invoke('POST', '/backup/hired_employees')
+    invoke('POST', '/data/hired_employees', {'data': generate_hired_employees(2, start_id=201)})
+    _, delta = invoke('POST', '/backup/hired_employees', {'mode': 'incremental', 'codec': 'null'})
+
+    status, catalog = invoke('GET', '/backups/hired_employees')
+
+    assert status == 200
+    assert [entry['key'] for entry in catalog['entries']] == [full['manifest_key'], delta['manifest_key']]
+    latest = catalog['entries'][-1]
+    assert (latest['mode'], latest['rows'], latest['codec']) == ('incremental', 2, 'null')
+    assert latest['size_bytes'] == delta['size_bytes']
+    assert latest['schema_hash'] == catalog['entries'][0]['schema_hash']
+
+
+def test_latest_and_as_of(local_aws):
+    stamps = ['2024-01-01T12:00:00', '2024-02-01T12:00:00', '2024-03-01T12:00:00']
+    for stamp in stamps:
+        lambda_function.add_catalog_entry('jobs', {'key': f'backups/jobs/{stamp}.manifest.json', 'created_at': stamp})
+
+    assert invoke('GET', '/backups/jobs', query={'latest': 'true'})[1]['backup']['created_at'] == stamps[2]
+    assert invoke('GET', '/backups/jobs', query={'as_of': '2024-02-15'})[1]['backup']['created_at'] == stamps[1]
+    assert invoke('GET', '/backups/jobs', query={'as_of': '2024-02-01T12:00:00Z'})[1]['backup']['created_at'] == stamps[1]
+    assert invoke('GET', '/backups/jobs', query={'as_of': '2023-12-31'})[0] == 404
+    assert invoke('GET', '/backups/jobs', query={'as_of': 'last tuesday'})[0] == 400
+
+
+def test_catalog_lookup_is_a_single_get(local_aws):
+    invoke('POST', '/backup/departments')
+    local_aws.s3.calls.clear()
+
+    invoke('GET', '/backups/departments', query={'latest': 'true'})
+
+    assert [call[0] for call in local_aws.s3.calls] == ['GetObject']
+
+
+def test_conflicting_writer_is_retried(local_aws, monkeypatch):
+    lambda_function.add_catalog_entry('jobs', {'key': 'a', 'created_at': '2024-01-01T00:00:00'})
+    read_catalog = lambda_function.read_catalog
+    reads = []
+
+    def racing_read(table):
+        # Another backup commits its entry between our read and our conditional put
+        catalog, etag = read_catalog(table)
+        reads.append(etag)
+        if len(reads) == 1:
+            rival = {'table': table, 'entries': catalog['entries'] + [{'key': 'b', 'created_at': '2024-01-02T00:00:00'}]}
+            local_aws.s3.put_object(Bucket=lambda_function.S3_BUCKET, Key=lambda_function.catalog_key(table),
+                                    Body=json.dumps(rival))
+        return catalog, etag
+
+    monkeypatch.setattr(lambda_function, 'read_catalog', racing_read)
+    lambda_function.add_catalog_entry('jobs', {'key': 'c', 'created_at': '2024-01-03T00:00:00'})
+
+    assert len(reads) == 2
+    assert [entry['key'] for entry in read_catalog('jobs')[0]['entries']] == ['a', 'b', 'c']
+
+
+def test_unknown_table(local_aws):
+    assert invoke('GET', '/backups/payroll')[0] == 400
+
+
+@pytest.mark.parametrize('query', [None, {'latest': 'true'}])
+def test_empty_catalog(local_aws, query):
+    status, body = invoke('GET', '/backups/jobs', query=query)
+
+    assert status == (200 if query is None else 404)
+    if query is None:
+        assert body == {'table': 'jobs', 'entries': []}
@@ -0,0 +1,42 @@
+import pytest
+
+import lambda_function
+from lambda_client import invoke
+
+
+def test_parse_backup_options_defaults():
+    assert lambda_function.parse_backup_options({}) == (lambda_function.BACKUP_CODEC, lambda_function.BACKUP_BLOCK_SIZE)
+    assert lambda_function.parse_backup_options({'codec': 'null', 'block_size': '65536'}) == ('null', 65536)
+
+
+@pytest.mark.parametrize('options, message', [
+    ({'codec': 'lz4'}, 'Invalid codec'),
+    ({'block_size': 'big'}, 'must be an integer'),
+    ({'block_size': 10}, 'must be between'),
+])
+def test_parse_backup_options_rejects(options, message):
+    with pytest.raises(ValueError, match=message):
+        lambda_function.parse_backup_options(options)
+
+
+@pytest.mark.parametrize('codec', ['null', 'deflate', 'snappy', 'zstandard'])
+def test_codec_round_trip(local_aws, codec):
+    expected = local_aws.db.query('SELECT * FROM hr_data.hired_employees ORDER BY id')
+
+    status, body = invoke('POST', '/backup/hired_employees', {'codec': codec, 'block_size': 4096})
+    assert status == 200
+    assert (body['codec'], body['block_size']) == (codec, 4096)
+    stored = local_aws.s3.objects[(lambda_function.S3_BUCKET, body['backup_key'])]
+    assert stored['Metadata'] == {'codec': codec, 'block-size': '4096'}
+    assert body['size_bytes'] == len(stored['Body'])
+
+    local_aws.db.query('DELETE FROM hr_data.hired_employees')
+    assert invoke('POST', '/restore/hired_employees', {'backup_key': body['manifest_key']})[0] == 200
+    assert local_aws.db.query('SELECT * FROM hr_data.hired_employees ORDER BY id') == expected
+
+
+def test_invalid_codec_is_a_bad_request(local_aws):
+    status, body = invoke('POST', '/backup', query={'codec': 'gzip'})
+
+    assert status == 400
+    assert 'Invalid codec' in body['error']
@@ -0,0 +1,33 @@
+import os
+
+import pytest
+
+from cold_start_harness import measure_route
+
+# Generous ceiling for the bare module import; the structural checks below catch most regressions
+IMPORT_BUDGET_MS = float(os.environ.get('COLD_START_IMPORT_BUDGET_MS', '1000'))
+
+
+def test_import_builds_no_clients():
+    result = measure_route('options')
+
+    assert result['status_code'] == 200
+    assert result['clients'] == []
+    assert not result['fastavro_loaded']
+    assert result['import_ms'] < IMPORT_BUDGET_MS
+
+
+@pytest.mark.parametrize('route', ['reports', 'sql', 'data'])
+def test_query_routes_skip_s3_and_avro(route):
+    result = measure_route(route)
+
+    assert result['status_code'] == 200
+    assert result['clients'] == ['redshift-data', 'secretsmanager']
+    assert not result['fastavro_loaded']
+
+
+def test_backup_loads_its_dependencies_on_demand():
+    result = measure_route('backup')
+
+    assert 's3' in result['clients']
+    assert result['fastavro_loaded']
@@ -0,0 +1,154 @@
+import os
+
+import pytest
+
+import cost_guard
+import lambda_function
+from cost_guard import GuardSettings, QueryRejected
+from lambda_client import invoke
+
+PLANS_DIR = os.path.join(os.path.dirname(__file__), 'plans')
+
+
+def plan(name):
+    with open(os.path.join(PLANS_DIR, f'{name}.txt')) as f:
+        return f.read().splitlines()
+
+
+def test_leader_sort_penalty_is_ignored():
+    estimate = cost_guard.parse_plan(plan('quarterly_report'))
+
+    assert estimate['node'] == 'XN Merge'
+    assert estimate['cost'] == 2354.27
+    assert (estimate['rows'], estimate['width']) == (200, 1040)
+    assert not estimate['nested_loop']
+
+
+def test_cross_join_is_rejected():
+    with pytest.raises(QueryRejected) as rejected:
+        cost_guard.decide('SELECT * FROM hr_data.hired_employees e, hr_data.jobs j', plan('cross_join'), GuardSettings())
+
+    assert rejected.value.estimate['nested_loop']
+    assert 'nested loop' in str(rejected.value)
+
+
+def test_large_result_gets_a_limit():
+    decision = cost_guard.decide('SELECT * FROM hr_data.hired_employees;', plan('select_all_employees'),
+                                 GuardSettings(max_rows=10000, max_bytes=1024 * 1024))
+
+    assert decision['action'] == 'capped'
+    assert decision['limit'] == 1024 * 1024 // 536
+    assert decision['sql'] == f"SELECT * FROM hr_data.hired_employees\nLIMIT {decision['limit']}"
+
+
+def test_small_results_run_unchanged():
+    sql = 'SELECT * FROM hr_data.hired_employees ORDER BY id LIMIT 1000'
+
+    assert cost_guard.decide(sql, plan('limited_sort'), GuardSettings())['action'] == 'allowed'
+    assert cost_guard.decide('SELECT 1', plan('leader_only'), GuardSettings())['action'] == 'allowed'
+
+
+def test_unreadable_plans_are_rejected():
+    with pytest.raises(QueryRejected) as rejected:
+        cost_guard.decide('SELECT 1', ['no plan here'], GuardSettings())
+
+    assert rejected.value.estimate is None
+
+
+def test_add_limit_lowers_a_larger_limit():
+    assert cost_guard.add_limit('SELECT * FROM t LIMIT 50000 OFFSET 10', 100) == 'SELECT * FROM t LIMIT 100 OFFSET 10'
+    assert cost_guard.add_limit('SELECT * FROM t LIMIT 5', 100) == 'SELECT * FROM t LIMIT 5'
+
+
+def test_add_limit_replaces_limit_all():
+    assert cost_guard.add_limit('SELECT * FROM t LIMIT ALL', 100) == 'SELECT * FROM t LIMIT 100'
+    assert cost_guard.add_limit('SELECT * FROM t limit all offset 20;', 100) == 'SELECT * FROM t LIMIT 100 OFFSET 20'
+
+
+def test_add_limit_goes_ahead_of_a_trailing_offset():
+    assert cost_guard.add_limit('SELECT * FROM t ORDER BY id OFFSET 20', 100) == 'SELECT * FROM t ORDER BY id\nLIMIT 100 OFFSET 20'
+
+
+def test_statements_other_than_dml_are_rejected_unexplained():
+    calls = []
+    with pytest.raises(QueryRejected):
+        cost_guard.guard('CREATE TABLE x (id INT)', calls.append, GuardSettings())
+    with pytest.raises(QueryRejected):
+        cost_guard.guard('/* setup */ DROP TABLE hr_data.jobs', calls.append, GuardSettings())
+
+    assert calls == []
+
+
+@pytest.mark.parametrize('sql', [
+    '-- departments by job\nSELECT * FROM hr_data.hired_employees e CROSS JOIN hr_data.jobs j',
+    '/* x */ SELECT * FROM hr_data.hired_employees e, hr_data.jobs j',
+    '(SELECT * FROM hr_data.hired_employees e, hr_data.jobs j)',
+])
+def test_leading_comments_and_parentheses_are_explained(sql):
+    calls = []
+
+    def explain(statement):
+        calls.append(statement)
+        return plan('cross_join')
+
+    with pytest.raises(QueryRejected):
+        cost_guard.guard(sql, explain, GuardSettings())
+
+    assert calls == [f'EXPLAIN {sql}']
+
+
+@pytest.mark.parametrize('sql', [
+    '/* all of them */ SELECT * FROM hr_data.hired_employees',
+    '(SELECT * FROM hr_data.hired_employees)',
+])
+def test_wrapped_queries_are_capped(sql):
+    decision = cost_guard.decide(sql, plan('select_all_employees'), GuardSettings(max_rows=100))
+
+    assert decision['action'] == 'capped'
+    assert decision['sql'] == f'{sql}\nLIMIT 100'
+
+
+def invoke_sql(sql):
+    return invoke('POST', '/sql', {'sql': sql})
+
+
+def test_sql_route_caps_oversized_results(local_aws, monkeypatch):
+    monkeypatch.setattr(lambda_function, 'SQL_GUARD_SETTINGS', GuardSettings(max_rows=50))
+
+    status, body = invoke_sql('SELECT * FROM hr_data.hired_employees ORDER BY id')
+
+    assert status == 200
+    assert body['count'] == 50
+    assert body['guard']['action'] == 'capped'
+    assert body['guard']['estimate']['rows'] == 200
+    sqls = [kwargs['Sql'] for op, kwargs in local_aws.redshift_data.calls if op == 'ExecuteStatement']
+    assert sqls[0].startswith('EXPLAIN SELECT')
+
+
+def test_sql_route_rejects_costly_queries(local_aws, monkeypatch):
+    monkeypatch.setattr(lambda_function, 'SQL_GUARD_SETTINGS', GuardSettings(max_cost=0.5))
+
+    status, body = invoke_sql('SELECT * FROM hr_data.hired_employees')
+
+    assert status == 400
+    assert body['estimate']['cost'] == 2.0
+    assert not any(op == 'ExecuteStatement' and not kwargs['Sql'].startswith('EXPLAIN')
+                   for op, kwargs in local_aws.redshift_data.calls)
+
+
+def test_sql_route_caps_commented_queries(local_aws, monkeypatch):
+    monkeypatch.setattr(lambda_function, 'SQL_GUARD_SETTINGS', GuardSettings(max_rows=50))
+
+    status, body = invoke_sql('-- everyone\n(SELECT * FROM hr_data.hired_employees ORDER BY id)')
+
+    assert status == 200
+    assert body['count'] == 50
+    assert body['guard']['action'] == 'capped'
+
+
+def test_sql_route_rejects_statements_it_cannot_check(local_aws):
+    status, body = invoke_sql('DROP TABLE hr_data.jobs')
+
+    assert status == 400
+    assert body['estimate'] is None
+    assert local_aws.db.conn.execute("SELECT COUNT(*) FROM hr_data.jobs").fetchone()[0] > 0
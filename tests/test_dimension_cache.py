@@ -0,0 +1,149 @@
+from dimension_cache import FINGERPRINT_SQL, LOAD_SQL, DimensionCache
+from lambda_client import invoke
+from local_data_api import generate_hired_employees
+
+
+class FakeQuery:
+    def __init__(self):
+        self.departments = {1: 'Engineering', 2: 'Sales'}
+        self.jobs = {1: 'Engineer'}
+        self.calls = []
+
+    def __call__(self, sql):
+        self.calls.append('load' if sql == LOAD_SQL else 'fingerprint' if sql == FINGERPRINT_SQL else sql)
+        if sql == LOAD_SQL:
+            rows = [['departments', k, v] for k, v in self.departments.items()]
+            rows += [['jobs', k, v] for k, v in self.jobs.items()]
+        else:
+            rows = [
+                [table, len(names), max(names), sum(len(n) for n in names.values())]
+                for table, names in (('departments', self.departments), ('jobs', self.jobs))
+            ]
+        return {'rows': rows}
+
+
+class Clock:
+    now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_loads_once_and_checks_fingerprint():
+    query, clock = FakeQuery(), Clock()
+    cache = DimensionCache(query, ttl_seconds=300, check_seconds=60, clock=clock)
+
+    assert cache.get()['departments'][2] == 'Sales'
+    clock.now = 30
+    cache.get()
+    assert query.calls == ['load']
+
+    clock.now = 90
+    cache.get()
+    assert query.calls == ['load', 'fingerprint']
+
+    query.departments[2] = 'Sales & Marketing'
+    clock.now = 200
+    assert cache.get()['departments'][2] == 'Sales & Marketing'
+    assert query.calls == ['load', 'fingerprint', 'fingerprint', 'load']
+
+
+def test_ttl_forces_reload():
+    query, clock = FakeQuery(), Clock()
+    cache = DimensionCache(query, ttl_seconds=300, check_seconds=60, clock=clock)
+    cache.get()
+
+    clock.now = 301
+    cache.get()
+
+    assert query.calls == ['load', 'load']
+
+
+def test_foreign_key_miss_reloads_before_rejecting():
+    query = FakeQuery()
+    cache = DimensionCache(query)
+    cache.get()
+    query.departments[3] = 'Legal'
+
+    errors = cache.foreign_key_errors([
+        {'department_id': 3, 'job_id': 1},
+        {'department_id': '2', 'job_id': 9},
+        {'department_id': None, 'job_id': None},
+    ])
+
+    assert errors == ['Row 1: job_id 9 does not exist in jobs']
+    assert query.calls == ['load', 'load']
+
+
+def test_attach_replaces_or_inserts_and_drops_unknown_ids():
+    cache = DimensionCache(FakeQuery())
+    result = {'columns': ['department_id', 'hired'], 'rows': [[1, 5], [7, 3], [2, 4]], 'count': 3}
+
+    assert cache.attach(result, 'department_id', 'departments', 'department', replace=True)['rows'] == [
+        ['Engineering', 5], ['Sales', 4]]
+    inserted = cache.attach(result, 'department_id', 'departments', 'department_name')
+    assert inserted['columns'] == ['department_id', 'department_name', 'hired']
+    assert inserted['count'] == 2
+
+
+def test_ingest_rejects_unknown_references(local_aws):
+    rows = generate_hired_employees(2, start_id=1001)
+    rows[1]['job_id'] = 999
+
+    status, body = invoke('POST', '/data/hired_employees', {'data': rows})
+
+    assert status == 400
+    assert body['errors'] == ['Row 1: job_id 999 does not exist in jobs']
+
+
+def test_new_department_is_visible_to_the_next_insert(local_aws):
+    invoke('POST', '/data/hired_employees', {'data': generate_hired_employees(1, start_id=1001)})
+    assert invoke('POST', '/data/departments', {'data': [{'id': 50, 'department': 'Legal'}]})[0] == 200
+
+    rows = generate_hired_employees(1, start_id=1002)
+    rows[0]['department_id'] = 50
+
+    assert invoke('POST', '/data/hired_employees', {'data': rows})[0] == 200
+
+
+def test_lambda_names_match_redshift_joins(local_aws):
+    for report in ('quarterly_hiring_report', 'departments_above_avg_hiring'):
+        _, joined = invoke('GET', f'/reports/{report}/2021')
+        status, attached = invoke('GET', f'/reports/{report}/2021', query={'names': 'lambda'})
+
+        assert status == 200
+        assert attached['columns'] == joined['columns']
+        assert attached['rows'] == joined['rows']
+
+
+def test_names_lambda_skips_dimension_joins(local_aws):
+    invoke('GET', '/reports/quarterly_hiring_report/2021', query={'names': 'lambda'})
+    local_aws.redshift_data.calls.clear()
+
+    invoke('GET', '/reports/quarterly_hiring_report/2022', query={'names': 'lambda'})
+
+    sqls = [kwargs['Sql'] for op, kwargs in local_aws.redshift_data.calls if op == 'ExecuteStatement']
+    assert len(sqls) == 1
+    assert 'hr_data.departments' not in sqls[0] and 'hr_data.jobs' not in sqls[0]
+
+
+def test_invalid_names_mode(local_aws):
+    status, body = invoke('GET', '/reports/quarterly_hiring_report/2021', query={'names': 'python'})
+
+    assert status == 400
+    assert 'names must be one of' in body['error']
+
+
+def test_orphan_departments_do_not_move_the_average(local_aws):
+    # Hires whose department was deleted: the join drops them, so the average must too
+    local_aws.db.query(
+        "INSERT INTO hr_data.hired_employees "
+        "SELECT 5000 + i, 'Orphan', TIMESTAMPTZ '2021-03-01 09:00:00+00', 99, 1 FROM range(40) t(i)"
+    )
+    report = '/reports/departments_above_avg_hiring/2021'
+
+    _, joined = invoke('GET', report, query={'cache': 'false'})
+    status, attached = invoke('GET', report, query={'cache': 'false', 'names': 'lambda'})
+
+    assert status == 200
+    assert attached['rows'] == joined['rows']
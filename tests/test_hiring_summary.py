@@ -0,0 +1,163 @@
+import pytest
+
+import hiring_summary
+import lambda_function
+from lambda_client import invoke
+from local_data_api import generate_hired_employees
+
+
+def assert_in_step(local_aws):
+    assert local_aws.db.query(hiring_summary.DRIFT_SQL) == [(0, 0)]
+
+
+def test_insert_applies_delta_in_the_same_batch(local_aws):
+    status, _ = invoke('POST', '/data/hired_employees', {'data': generate_hired_employees(10, start_id=1001)})
+
+    assert status == 200
+    assert_in_step(local_aws)
+    batches = [kwargs['Sqls'] for op, kwargs in local_aws.redshift_data.calls
+               if op == 'BatchExecuteStatement' and any('hiring_summary' in sql for sql in kwargs['Sqls'])]
+    assert len(batches) == 1
+    merge = next(i for i, sql in enumerate(batches[0]) if 'MERGE INTO hr_data.hiring_summary' in sql)
+    assert 'LOCK hr_data.hiring_summary' in batches[0][:merge]
+    assert any(sql.startswith('INSERT INTO hr_data.hired_employees ') for sql in batches[0])
+
+
+def test_insert_keeps_its_parameters(local_aws):
+    status, _ = invoke('POST', '/data/hired_employees', {'data': generate_hired_employees(10, start_id=1001)})
+
+    assert status == 200
+    inserts = [kwargs for op, kwargs in local_aws.redshift_data.calls
+               if op == 'ExecuteStatement' and kwargs['Sql'].startswith('INSERT INTO hr_data.hired_employees_stage_')]
+    assert len(inserts) == 1 and inserts[0]['Parameters']
+    assert "'Employee 1001'" not in ' '.join(
+        sql for op, kwargs in local_aws.redshift_data.calls if op == 'BatchExecuteStatement' for sql in kwargs['Sqls']
+    )
+    assert local_aws.db.query(
+        "SELECT COUNT(*) FROM information_schema.tables WHERE table_name LIKE 'hired_employees_stage_%'"
+    ) == [(0,)]
+
+
+def test_upsert_moves_replaced_hires(local_aws):
+    rows = [dict(row, department_id=1, job_id=1) for row in generate_hired_employees(5, start_id=1)]
+
+    assert invoke('POST', '/data/hired_employees', {'data': rows, 'mode': 'upsert'})[0] == 200
+    assert_in_step(local_aws)
+
+
+def test_chunked_ingest_keeps_summary(local_aws, monkeypatch):
+    monkeypatch.setattr(lambda_function, 'INGEST_CHUNK_BYTES', 2000)
+
+    status, body = invoke('POST', '/data/hired_employees', {'data': generate_hired_employees(1200, start_id=5001)})
+
+    assert status == 200
+    assert body['failed_chunks'] == 0
+    assert_in_step(local_aws)
+
+
+
+def test_chunked_load_merges_the_summary_once(local_aws, monkeypatch):
+    monkeypatch.setattr(lambda_function, 'INGEST_CHUNK_BYTES', 2000)
+    rows = [dict(row, department_id=2) for row in generate_hired_employees(1200, start_id=150)]
+
+    status, body = invoke('POST', '/data/hired_employees', {'data': rows, 'mode': 'upsert'})
+
+    assert status == 200 and len(body['chunks']) > 1
+    assert_in_step(local_aws)
+    merges = [sql for op, kwargs in local_aws.redshift_data.calls if op == 'BatchExecuteStatement'
+              for sql in kwargs['Sqls'] if 'MERGE INTO hr_data.hiring_summary' in sql]
+    assert len(merges) == 1
+    assert local_aws.db.query(
+        "SELECT COUNT(*) FROM information_schema.tables WHERE table_name LIKE 'hiring_summary_delta_%'"
+    ) == [(0,)]
+
+
+@pytest.mark.parametrize('sql', [
+    "UPDATE hr_data.hired_employees SET department_id = 2 WHERE id = 1",
+    "delete from hired_employees where id = 1",
+    'INSERT INTO "hr_data"."hired_employees" SELECT * FROM hr_data.hired_employees',
+    "TRUNCATE hr_data.hiring_summary",
+    "DELETE FROM dev.hr_data.hired_employees WHERE id = 1",
+    'UPDATE "dev"."hr_data"."hiring_summary" SET hires = 0',
+])
+def test_sql_refuses_writes_the_summary_cannot_follow(local_aws, sql):
+    before = local_aws.db.query('SELECT COUNT(*) FROM hr_data.hiring_summary')
+
+    status, body = invoke('POST', '/sql', {'sql': sql})
+
+    assert status == 400 and 'not allowed through /sql' in body['error']
+    assert local_aws.db.query('SELECT COUNT(*) FROM hr_data.hiring_summary') == before
+    assert_in_step(local_aws)
+
+
+def test_sql_still_reads_and_writes_other_tables():
+    hiring_summary.check_adhoc_sql('SELECT department_id, COUNT(*) FROM hr_data.hired_employees GROUP BY 1')
+    hiring_summary.check_adhoc_sql("UPDATE hr_data.jobs SET job = 'x' WHERE id = 1")
+
+
+def test_restore_rebuilds_summary(local_aws):
+    _, backup = invoke('POST', '/backup/hired_employees')
+    local_aws.db.query('DELETE FROM hr_data.hired_employees WHERE id > 100')
+
+    assert invoke('POST', '/restore/hired_employees', {'backup_key': backup['backup_key']})[0] == 200
+    assert_in_step(local_aws)
+
+
+def test_rebuild_reports_and_repairs_drift(local_aws):
+    local_aws.db.query('DELETE FROM hr_data.hiring_summary WHERE department_id = 1')
+
+    status, body = invoke('POST', '/summary/rebuild', {'dry_run': True})
+    assert status == 200
+    assert body['drifted_groups'] > 0 and body['missing_hires'] > 0
+    assert body['repaired'] is False
+
+    status, body = invoke('POST', '/summary/rebuild')
+    assert body['repaired'] is True
+    assert_in_step(local_aws)
+
+
+@pytest.mark.parametrize('report', ['quarterly_hiring_report', 'departments_above_avg_hiring'])
+def test_summary_variant_matches_raw_report(local_aws, report, monkeypatch):
+    from_summary = lambda_function.execute_report_query(report, 2021, use_cache=False, source='summary')
+    monkeypatch.setattr(lambda_function, 'MAINTAIN_HIRING_SUMMARY', False)
+    raw = lambda_function.execute_report_query(report, 2021, use_cache=False)
+
+    assert from_summary['rows'] == raw['rows']
+    sqls = [kwargs['Sql'] for op, kwargs in local_aws.redshift_data.calls if op == 'ExecuteStatement']
+    assert 'hiring_summary' in sqls[0] and 'hiring_summary' not in sqls[1]
+
+
+def test_distinct_id_report_reads_the_summary_only_when_asked(local_aws):
+    # Seeded rows posted again, which adds duplicate ids
+    reposted = [row for row in generate_hired_employees(200) if row['datetime'].startswith('2021')][:30]
+    assert invoke('POST', '/data/hired_employees', {'data': reposted})[0] == 200
+
+    _, raw = invoke('GET', '/reports/departments_above_avg_hiring/2021', query={'cache': 'false'})
+    _, from_summary = invoke('GET', '/reports/departments_above_avg_hiring/2021',
+                             query={'cache': 'false', 'source': 'summary'})
+
+    sqls = [kwargs['Sql'] for op, kwargs in local_aws.redshift_data.calls if op == 'ExecuteStatement']
+    assert 'hiring_summary' not in sqls[-2] and 'hiring_summary' in sqls[-1]
+    assert raw['rows'] != from_summary['rows']
+
+
+def test_unknown_report_source_is_rejected():
+    status, body = invoke('GET', '/reports/quarterly_hiring_report/2021', query={'source': 'cache'})
+
+    assert status == 400 and 'source must be one of' in body['error']
+
+
+def test_day_window_reads_raw_rows():
+    report = lambda_function.REPORTS.get('quarterly_hiring_report')
+
+    assert lambda_function.summary_variant(report.name, report.bind({'year': 2021, 'quarter': 2})) is not None
+    assert lambda_function.summary_variant(report.name, report.bind({'start': '2021-01-15', 'end': '2021-03-01'})) is None
+
+
+def test_monthly_trend(local_aws):
+    status, body = invoke('GET', '/reports/monthly_hiring_trend/2021')
+
+    assert status == 200
+    assert body['columns'] == ['year', 'month', 'hires', 'cumulative_hires']
+    assert [row[1] for row in body['rows']] == list(range(1, 13))
+    assert body['rows'][-1][3] == sum(row[2] for row in body['rows'])
@@ -0,0 +1,131 @@
+import lambda_function
+from lambda_client import invoke
+from local_data_api import generate_hired_employees
+
+
+def test_incremental_without_base_falls_back_to_full(local_aws):
+    status, body = invoke('POST', '/backup/hired_employees', {'mode': 'incremental'})
+
+    assert status == 200
+    assert body['mode'] == 'full'
+    assert body['base'] is None
+    assert body['rows'] == 200
+    assert body['high_watermark'] == 200
+
+
+def test_incremental_exports_only_new_rows(local_aws):
+    _, full = invoke('POST', '/backup/hired_employees')
+    invoke('POST', '/data/hired_employees', {'data': generate_hired_employees(5, start_id=201)})
+
+    status, delta = invoke('POST', '/backup/hired_employees', {'mode': 'incremental'})
+
+    assert status == 200
+    assert delta['mode'] == 'incremental'
+    assert delta['base'] == full['manifest_key']
+    assert (delta['low_watermark'], delta['high_watermark'], delta['rows']) == (200, 205, 5)
+
+
+def test_incremental_with_nothing_new_writes_nothing(local_aws):
+    _, full = invoke('POST', '/backup/hired_employees')
+    puts = len([c for c in local_aws.s3.calls if c[0] == 'PutObject'])
+
+    status, body = invoke('POST', '/backup/hired_employees', {'mode': 'incremental'})
+
+    assert status == 200
+    assert body['rows'] == 0
+    assert body['manifest_key'] == full['manifest_key']
+    assert len([c for c in local_aws.s3.calls if c[0] == 'PutObject']) == puts
+
+
+def test_restore_replays_base_and_deltas(local_aws):
+    invoke('POST', '/backup/hired_employees')
+    invoke('POST', '/data/hired_employees', {'data': generate_hired_employees(3, start_id=201)})
+    invoke('POST', '/backup/hired_employees', {'mode': 'incremental'})
+    invoke('POST', '/data/hired_employees', {'data': generate_hired_employees(2, start_id=204)})
+    _, last = invoke('POST', '/backup/hired_employees', {'mode': 'incremental'})
+    expected = local_aws.db.query('SELECT * FROM hr_data.hired_employees ORDER BY id')
+
+    local_aws.db.query('DELETE FROM hr_data.hired_employees')
+    status, _ = invoke('POST', '/restore/hired_employees', {'backup_key': last['manifest_key']})
+
+    assert status == 200
+    assert local_aws.db.query('SELECT * FROM hr_data.hired_employees ORDER BY id') == expected
+
+
+def test_chain_resolves_oldest_first(local_aws):
+    _, full = invoke('POST', '/backup/hired_employees')
+    invoke('POST', '/data/hired_employees', {'data': generate_hired_employees(1, start_id=201)})
+    _, delta = invoke('POST', '/backup/hired_employees', {'mode': 'incremental'})
+
+    assert lambda_function.resolve_backup_chain(delta['manifest_key']) == [full['backup_key'], delta['backup_key']]
+    assert lambda_function.resolve_backup_chain(full['backup_key']) == [full['backup_key']]
+
+
+def test_invalid_backup_mode(local_aws):
+    status, body = invoke('POST', '/backup/hired_employees', {'mode': 'differential'})
+
+    assert status == 400
+    assert 'Invalid mode' in body['error']
+
+
+def test_upsert_makes_the_next_incremental_full(local_aws):
+    invoke('POST', '/backup/hired_employees')
+    moved = {**generate_hired_employees(1)[0], 'department_id': 2}
+    invoke('POST', '/data/hired_employees', {'mode': 'upsert', 'data': [moved]})
+
+    _, body = invoke('POST', '/backup/hired_employees', {'mode': 'incremental'})
+
+    assert (body['mode'], body['base'], body['rows']) == ('full', None, 200)
+    local_aws.db.query('DELETE FROM hr_data.hired_employees')
+    invoke('POST', '/restore/hired_employees', {'backup_key': body['manifest_key']})
+    assert local_aws.db.query('SELECT department_id FROM hr_data.hired_employees WHERE id = 1') == [(2,)]
+
+
+def test_append_at_or_below_the_watermark_makes_the_next_incremental_full(local_aws):
+    invoke('POST', '/backup/hired_employees')
+    local_aws.db.query('DELETE FROM hr_data.hired_employees WHERE id = 150')
+    invoke('POST', '/data/hired_employees', {'data': generate_hired_employees(1, start_id=150)})
+
+    _, body = invoke('POST', '/backup/hired_employees', {'mode': 'incremental'})
+
+    assert (body['mode'], body['base'], body['rows']) == ('full', None, 200)
+
+
+def test_append_past_the_watermark_keeps_the_chain(local_aws):
+    _, full = invoke('POST', '/backup/hired_employees')
+    invoke('POST', '/data/hired_employees', {'data': generate_hired_employees(2, start_id=201)})
+
+    _, body = invoke('POST', '/backup/hired_employees', {'mode': 'incremental'})
+
+    assert (body['mode'], body['base'], body['rows']) == ('incremental', full['manifest_key'], 2)
+
+
+def test_restore_makes_the_next_incremental_full(local_aws):
+    _, full = invoke('POST', '/backup/hired_employees')
+    invoke('POST', '/restore/hired_employees', {'backup_key': full['manifest_key']})
+
+    _, body = invoke('POST', '/backup/hired_employees', {'mode': 'incremental'})
+
+    assert body['mode'] == 'full'
+    _, after = invoke('POST', '/backup/hired_employees', {'mode': 'incremental'})
+    assert after['manifest_key'] == body['manifest_key'] and after['rows'] == 0
+
+
+def test_incremental_needs_an_append_only_table(local_aws):
+    status, body = invoke('POST', '/backup/jobs', {'mode': 'incremental'})
+
+    assert status == 400
+    assert 'append-only' in body['error']
+
+
+def test_delta_file_alone_is_not_a_restore_handle(local_aws):
+    invoke('POST', '/backup/hired_employees')
+    invoke('POST', '/data/hired_employees', {'data': generate_hired_employees(1, start_id=201)})
+    _, delta = invoke('POST', '/backup/hired_employees', {'mode': 'incremental'})
+    assert delta['manifest_key'] in delta['message']
+
+    status, body = invoke('POST', '/restore/hired_employees', {'backup_key': delta['backup_key']})
+
+    assert status == 400
+    assert delta['manifest_key'] in body['error']
+    assert local_aws.db.query('SELECT COUNT(*) FROM hr_data.hired_employees') == [(201,)]
@@ -0,0 +1,87 @@
+import base64
+import gzip
+import json
+
+import lambda_function
+from lambda_client import invoke
+
+
+def test_decode_ndjson_and_gzip():
+    lines = '\n'.join(json.dumps({"id": i, "job": f"Job {i}"}) for i in range(1, 4))
+    expected = [{"id": i, "job": f"Job {i}"} for i in range(1, 4)]
+
+    assert lambda_function.decode_payload(lines, 'application/x-ndjson')['data'] == expected
+    assert lambda_function.decode_payload(gzip.compress(lines.encode()))['data'] == expected
+
+
+def test_parse_base64_gzip_json_body():
+    payload = gzip.compress(json.dumps({"data": [{"id": 1, "job": "Engineer"}]}).encode())
+    event = {
+        'body': base64.b64encode(payload).decode(),
+        'isBase64Encoded': True,
+        'headers': {'Content-Type': 'application/gzip'}
+    }
+
+    assert lambda_function.parse_request_body(event) == {"data": [{"id": 1, "job": "Engineer"}]}
+
+
+def test_chunks_respect_byte_budget():
+    data = [{"id": i, "department": "x" * 50} for i in range(1, 201)]
+    chunks = lambda_function.chunk_rows('departments', data, max_bytes=1000)
+
+    assert sum(chunk['rows'] for chunk in chunks) == 200
+    assert all(chunk['bytes'] <= 1000 for chunk in chunks)
+    assert all(len(chunk['values'].encode()) <= 1000 for chunk in chunks)
+
+
+def test_large_payload_is_loaded_in_parallel_chunks(monkeypatch):
+    submitted = []
+    monkeypatch.setattr(lambda_function, 'execute_batch_statements', lambda sqls: submitted.append(sqls) or 'stmt')
+    monkeypatch.setattr(lambda_function, 'INGEST_CHUNK_BYTES', 2000)
+
+    data = [{"id": i, "job": f"Job {i}"} for i in range(1, 1501)]
+    event = {'httpMethod': 'POST', 'path': '/data/jobs', 'body': json.dumps({'data': data})}
+    response = lambda_function.lambda_handler(event, None)
+    body = json.loads(response['body'])
+
+    assert response['statusCode'] == 200
+    assert body['loaded_rows'] == 1500
+    assert body['failed_chunks'] == 0
+    assert len(body['chunks']) == len(submitted) > 1
+    assert all(chunk['status'] == 'FINISHED' for chunk in body['chunks'])
+
+
+def test_failed_chunk_is_reported(monkeypatch):
+    def flaky(sqls):
+        if '(1, ' in sqls[0]:
+            raise Exception('Database query error: boom')
+        return 'stmt'
+
+    monkeypatch.setattr(lambda_function, 'execute_batch_statements', flaky)
+    monkeypatch.setattr(lambda_function, 'INGEST_CHUNK_BYTES', 500)
+
+    result = lambda_function.ingest_rows('jobs', [{"id": i, "job": "Engineer"} for i in range(1, 101)])
+
+    assert result['failed_chunks'] == 1
+    assert result['loaded_rows'] < 100
+
+
+def post_data(body):
+    return invoke('POST', '/data/jobs', body)
+
+
+def test_s3_rows_are_read_from_the_api_bucket(local_aws):
+    rows = '\n'.join(json.dumps({'id': 900 + i, 'job': f'Job {900 + i}'}) for i in range(3))
+    local_aws.s3.put_object(Bucket=lambda_function.S3_BUCKET, Key='ingest/jobs.ndjson', Body=rows)
+
+    status, _ = post_data({'s3_key': 'ingest/jobs.ndjson'})
+
+    assert status == 200
+    assert local_aws.db.query('SELECT COUNT(*) FROM hr_data.jobs WHERE id >= 900') == [(3,)]
+
+
+def test_caller_cannot_choose_the_s3_bucket(local_aws):
+    status, body = post_data({'s3_key': 'secrets.json', 's3_bucket': 'someone-elses-bucket'})
+
+    assert status == 400 and 's3_bucket' in body['error']
+    assert not any(op == 'GetObject' for op, _ in local_aws.s3.calls)
@@ -0,0 +1,73 @@
+import lambda_function
+from lambda_client import invoke
+from local_data_api import generate_hired_employees
+
+
+def test_sql_route_pages_through_results(local_aws):
+    local_aws.redshift_data.page_size = 50
+
+    status, body = invoke('POST', '/sql', {'sql': 'SELECT id FROM hr_data.hired_employees ORDER BY id'})
+
+    assert status == 200
+    assert body['count'] == 200
+    assert body['rows'][-1] == [200]
+    pages = [call for call in local_aws.redshift_data.calls if call[0] == 'GetStatementResult']
+    # One page for the cost guard's EXPLAIN, four for the rows
+    assert len(pages) == 5
+
+
+def test_insert_and_upsert(local_aws):
+    rows = generate_hired_employees(3, start_id=1001)
+    assert invoke('POST', '/data/hired_employees', {'data': rows})[0] == 200
+
+    rows[0]['name'] = 'Renamed'
+    assert invoke('POST', '/data/hired_employees', {'data': rows, 'mode': 'upsert'})[0] == 200
+
+    assert local_aws.db.query('SELECT COUNT(*) FROM hr_data.hired_employees WHERE id > 1000') == [(3,)]
+    assert local_aws.db.query('SELECT name FROM hr_data.hired_employees WHERE id = 1001') == [('Renamed',)]
+
+
+def test_chunked_ingest(local_aws, monkeypatch):
+    monkeypatch.setattr(lambda_function, 'INGEST_CHUNK_BYTES', 5000)
+
+    status, body = invoke('POST', '/data/hired_employees', {'data': generate_hired_employees(1500, start_id=5001)})
+
+    assert status == 200
+    assert body['loaded_rows'] == 1500
+    assert len(body['chunks']) > 1
+    assert local_aws.db.query('SELECT COUNT(*) FROM hr_data.hired_employees') == [(1700,)]
+
+
+def test_backup_and_restore_round_trip(local_aws):
+    before = local_aws.db.query('SELECT * FROM hr_data.hired_employees ORDER BY id')
+
+    status, body = invoke('POST', '/backup/hired_employees')
+    assert status == 200
+
+    local_aws.db.query('DELETE FROM hr_data.hired_employees WHERE id > 100')
+    status, _ = invoke('POST', '/restore/hired_employees', {'backup_key': body['backup_key']})
+
+    assert status == 200
+    assert local_aws.db.query('SELECT * FROM hr_data.hired_employees ORDER BY id') == before
+
+
+def test_reports_match_direct_aggregation(local_aws):
+    status, body = invoke('GET', '/reports/quarterly_hiring_report/2021')
+    expected = local_aws.db.query(
+        "SELECT COUNT(*) FROM hr_data.hired_employees WHERE datetime >= '2021-01-01' AND datetime < '2022-01-01'"
+    )[0][0]
+
+    assert status == 200
+    assert body['columns'] == ['department', 'job', 'q1', 'q2', 'q3', 'q4']
+    assert sum(sum(row[2:]) for row in body['rows']) == expected
+
+    status, body = invoke('GET', '/reports/departments_above_avg_hiring/2021')
+    assert status == 200
+    assert all(row[2] > row[3] for row in body['rows'])
+
+
+def test_failed_statement_surfaces_error(local_aws):
+    status, body = invoke('POST', '/sql', {'sql': 'SELECT * FROM hr_data.missing'})
+
+    assert status == 400
+    assert 'missing' in body['error']
@@ -0,0 +1,51 @@
+import lambda_function
+
+
+def test_insert_shape_is_independent_of_values():
+    columns = lambda_function.get_table_columns('jobs')
+    sql_a, params_a = lambda_function.build_parameterized_insert('jobs', columns, [{"id": 1, "job": "O'Brien"}])
+    sql_b, params_b = lambda_function.build_parameterized_insert('jobs', columns, [{"id": 7, "job": "Analyst"}])
+
+    assert sql_a == sql_b == "INSERT INTO hr_data.jobs (id, job) VALUES (:r0_id, :r0_job)"
+    assert params_a == {'r0_id': 1, 'r0_job': "O'Brien"}
+    assert params_b == {'r0_id': 7, 'r0_job': 'Analyst'}
+
+
+def test_nulls_and_default_datetime_are_inlined():
+    columns = lambda_function.get_table_columns('hired_employees')
+    sql, params = lambda_function.build_parameterized_insert(
+        'hired_employees', columns, [{"id": 1, "name": "Jane", "department_id": None, "job_id": 2}]
+    )
+
+    assert "(:r0_id, :r0_name, CURRENT_TIMESTAMP, NULL, :r0_job_id)" in sql
+    assert set(params) == {'r0_id', 'r0_name', 'r0_job_id'}
+
+
+def test_build_parameters_sends_text_values():
+    assert lambda_function.build_parameters({'year': 2021}) == [{'name': 'year', 'value': '2021'}]
+
+
+def test_report_uses_bound_year(monkeypatch):
+    calls = []
+
+    def fake_execute(sql, parameters=None, compile_stats=False):
+        calls.append((sql, parameters))
+        return {'columns': [], 'rows': [], 'count': 0}
+
+    monkeypatch.setattr(lambda_function, 'execute_sql_query', fake_execute)
+
+    lambda_function.execute_report_query('quarterly_hiring_report', 2021)
+    lambda_function.execute_report_query('quarterly_hiring_report', 2022)
+
+    assert calls[0][0] == calls[1][0]
+    assert [c[1]['window_start'] for c in calls] == ['2021-01-01 00:00:00+00', '2022-01-01 00:00:00+00']
+
+
+def test_compile_stats_are_merged():
+    merged = lambda_function.merge_compile_stats([
+        {'available': True, 'segments': 4, 'compiled_segments': 4, 'compile_ms': 120.5},
+        {'available': True, 'segments': 4, 'compiled_segments': 0, 'compile_ms': 0.0},
+        {'available': False}
+    ])
+
+    assert merged == {'available': True, 'statements': 3, 'segments': 8, 'compiled_segments': 4, 'compile_ms': 120.5}
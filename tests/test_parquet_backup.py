@@ -0,0 +1,102 @@
+import io
+
+import pytest
+
+import lambda_function
+from lambda_client import invoke
+
+pq = pytest.importorskip('pyarrow.parquet')
+
+
+def parquet_file(local_aws, key):
+    return pq.ParquetFile(io.BytesIO(local_aws.s3.objects[(lambda_function.S3_BUCKET, key)]['Body']))
+
+
+def test_backup_is_partitioned_by_year(local_aws):
+    status, body = invoke('POST', '/backup/hired_employees', {'format': 'parquet'})
+
+    assert status == 200
+    assert body['format'] == 'parquet'
+    assert [key[len(body['backup_key']):] for key in body['files']] == [
+        f'year={year}/part-00000.parquet' for year in (2020, 2021, 2022)
+    ]
+    assert sum(parquet_file(local_aws, key).metadata.num_rows for key in body['files']) == body['rows']
+    assert lambda_function.find_backup('hired_employees')['format'] == 'parquet'
+
+
+def test_row_groups_follow_the_sort_key(local_aws, monkeypatch):
+    monkeypatch.setattr(lambda_function, 'PARQUET_ROW_GROUP_ROWS', 20)
+
+    body = invoke('POST', '/backup/hired_employees', {'format': 'parquet'})[1]
+
+    parquet = parquet_file(local_aws, body['files'][0])
+    column = parquet.schema_arrow.get_field_index('datetime')
+    ranges = [(group.column(column).statistics.min, group.column(column).statistics.max)
+              for group in (parquet.metadata.row_group(i) for i in range(parquet.metadata.num_row_groups))]
+    assert len(ranges) > 1
+    # Sorted rows give each row group its own, non-overlapping datetime range
+    assert all(previous[1] <= current[0] for previous, current in zip(ranges, ranges[1:]))
+    assert parquet.metadata.row_group(0).sorting_columns[0].column_index == column
+
+
+def test_backups_query_in_place_with_partition_pruning(local_aws, tmp_path):
+    body = invoke('POST', '/backup/hired_employees', {'format': 'parquet'})[1]
+    for key in body['files']:
+        path = tmp_path / key[len(body['backup_key']):]
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(local_aws.s3.objects[(lambda_function.S3_BUCKET, key)]['Body'])
+
+    duckdb = pytest.importorskip('duckdb')
+    count, = duckdb.sql(
+        f"SELECT COUNT(*) FROM read_parquet('{tmp_path}/*/*.parquet', hive_partitioning = true) WHERE year = 2021"
+    ).fetchone()
+
+    assert count == local_aws.db.query(
+        "SELECT COUNT(*) FROM hr_data.hired_employees WHERE EXTRACT(year FROM datetime) = 2021"
+    )[0][0]
+
+
+def test_unpartitioned_table_restores(local_aws):
+    expected = local_aws.db.query('SELECT * FROM hr_data.jobs ORDER BY id')
+    body = invoke('POST', '/backup/jobs', {'format': 'parquet', 'codec': 'zstandard'})[1]
+    assert body['files'] == [f"{body['backup_key']}part-00000.parquet"]
+
+    local_aws.db.query('DELETE FROM hr_data.jobs')
+    assert invoke('POST', '/restore/jobs', {'backup_key': body['manifest_key']})[0] == 200
+    assert local_aws.db.query('SELECT * FROM hr_data.jobs ORDER BY id') == expected
+
+
+def test_parquet_delta_chains_onto_an_avro_base(local_aws):
+    invoke('POST', '/backup/hired_employees')
+    local_aws.db.query("INSERT INTO hr_data.hired_employees VALUES (9001, 'Late Hire', '2022-06-01 09:00:00+00', 1, 1)")
+    expected = local_aws.db.query('SELECT * FROM hr_data.hired_employees ORDER BY id')
+    delta = invoke('POST', '/backup/hired_employees', {'format': 'parquet', 'mode': 'incremental'})[1]
+    assert delta['rows'] == 1 and delta['mode'] == 'incremental'
+
+    local_aws.db.query('DELETE FROM hr_data.hired_employees')
+    assert invoke('POST', '/restore/hired_employees', {'backup_key': delta['manifest_key']})[0] == 200
+    assert local_aws.db.query('SELECT * FROM hr_data.hired_employees ORDER BY id') == expected
+
+
+def test_invalid_format_is_a_bad_request(local_aws):
+    status, body = invoke('POST', '/backup/jobs', query={'format': 'orc'})
+
+    assert status == 400
+    assert 'Invalid format' in body['error']
+
+
+@pytest.mark.parametrize('part', ['', 'year=2021/part-00000.parquet'])
+def test_parquet_keys_point_at_the_manifest(local_aws, part):
+    body = invoke('POST', '/backup/hired_employees', {'format': 'parquet'})[1]
+
+    status, error = invoke('POST', '/restore/hired_employees', {'backup_key': body['backup_key'] + part})
+
+    assert status == 400
+    assert body['manifest_key'] in error['error']
+
+
+def test_unknown_raw_key_is_a_bad_request(local_aws):
+    status, body = invoke('POST', '/restore/jobs', {'backup_key': 'backups/jobs/notes.txt'})
+
+    assert status == 400
+    assert 'neither a backup manifest' in body['error']
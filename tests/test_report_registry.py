@@ -0,0 +1,135 @@
+import json
+import os
+
+import pytest
+
+import lambda_function
+from report_registry import ReportParameterError, ReportRegistry, UnknownReportError, parse_report
+
+CUSTOM_REPORT = """-- Hires for one department
+-- @report department_hires
+-- @window
+-- @param department_id int 1..1000
+-- @param min_hires int 0.. default=0
+-- @cache_ttl 60
+SELECT COUNT(*) AS hired
+FROM hr_data.hired_employees e
+WHERE e.department_id = :department_id
+    AND e.datetime >= CAST(:window_start AS TIMESTAMPTZ)
+    AND e.datetime < CAST(:window_end AS TIMESTAMPTZ)
+HAVING COUNT(*) >= :min_hires;
+"""
+
+
+def test_loads_annotated_queries_only():
+    assert lambda_function.REPORTS.names() == ['departments_above_avg_hiring', 'monthly_hiring_trend', 'quarterly_hiring_report']
+
+
+def test_header_declares_parameters_and_ttl():
+    report = parse_report(CUSTOM_REPORT)
+
+    assert report.name == 'department_hires'
+    assert report.cache_ttl == 60
+    assert report.bind({'department_id': '3', 'year': '2021'}) == {
+        'department_id': 3,
+        'min_hires': 0,
+        'window_start': '2021-01-01 00:00:00+00',
+        'window_end': '2022-01-01 00:00:00+00'
+    }
+    assert not report.sql.endswith(';')
+
+
+@pytest.mark.parametrize('params', [
+    {'year': '2021'},
+    {'department_id': 'abc', 'year': '2021'},
+    {'department_id': '5000', 'year': '2021'},
+    {'department_id': '1'},
+    {'department_id': '1', 'year': '2021', 'color': 'red'},
+])
+def test_bind_rejects_bad_parameters(params):
+    with pytest.raises(ReportParameterError):
+        parse_report(CUSTOM_REPORT).bind(params)
+
+
+def test_undeclared_placeholder_fails_at_load():
+    with pytest.raises(ValueError):
+        parse_report("-- @report broken\nSELECT * FROM hr_data.jobs WHERE id = :job_id")
+
+
+def test_casts_are_not_placeholders():
+    assert parse_report("-- @report casts\nSELECT '2021-01-01'::date") is not None
+
+
+def test_new_report_served_without_handler_changes(tmp_path, monkeypatch):
+    (tmp_path / 'department_hires.sql').write_text(CUSTOM_REPORT)
+    monkeypatch.setattr(lambda_function, 'REPORTS', ReportRegistry.load(str(tmp_path)))
+    calls = []
+    monkeypatch.setattr(lambda_function, 'execute_sql_query',
+                        lambda sql, parameters=None, compile_stats=False: calls.append(parameters) or {'rows': [[4]]})
+
+    event = {
+        'httpMethod': 'GET',
+        'path': '/reports/department_hires',
+        'queryStringParameters': {'department_id': '2', 'start': '2021-01-01', 'end': '2021-02-01'}
+    }
+    first = lambda_function.lambda_handler(event, None)
+    second = lambda_function.lambda_handler(event, None)
+
+    assert first['statusCode'] == second['statusCode'] == 200
+    assert json.loads(second['body']) == {'rows': [[4]]}
+    assert len(calls) == 1
+
+
+def test_unknown_report_is_404():
+    response = lambda_function.lambda_handler({'httpMethod': 'GET', 'path': '/reports/nope/2021'}, None)
+
+    assert response['statusCode'] == 404
+    with pytest.raises(UnknownReportError):
+        lambda_function.REPORTS.get('nope')
+
+
+def test_ids_variants_register_under_their_report():
+    registry = ReportRegistry.load(os.path.join(os.path.dirname(__file__), '..', 'database', 'queries'))
+    variant = registry.get('quarterly_hiring_report', 'ids')
+
+    assert registry.names() == ['departments_above_avg_hiring', 'monthly_hiring_trend', 'quarterly_hiring_report']
+    assert variant.attach == [('department_id', 'departments', 'department', True), ('job_id', 'jobs', 'job', True)]
+    assert variant.sort == ['department', 'job']
+    with pytest.raises(ReportParameterError):
+        ReportRegistry({'plain': parse_report('-- @report plain\nSELECT 1')}).get('plain', 'ids')
+
+
+def test_opt_in_variants_are_marked():
+    registry = ReportRegistry.load(os.path.join(os.path.dirname(__file__), '..', 'database', 'queries'))
+
+    assert registry.get('departments_above_avg_hiring', 'summary').opt_in
+    assert not registry.get('quarterly_hiring_report', 'summary').opt_in
+
+
+def test_report_cache_evicts_the_least_recently_used(monkeypatch):
+    calls = []
+
+    def fake_execute(sql, parameters=None, compile_stats=False):
+        calls.append(parameters['window_start'])
+        return {'columns': [], 'rows': [], 'count': 0}
+
+    monkeypatch.setattr(lambda_function, 'execute_sql_query', fake_execute)
+    monkeypatch.setattr(lambda_function, 'MAINTAIN_HIRING_SUMMARY', False)
+    monkeypatch.setattr(lambda_function, 'REPORT_CACHE_MAX_ENTRIES', 2)
+
+    for year in (2020, 2021, 2020, 2022, 2020, 2021):
+        lambda_function.execute_report_query('quarterly_hiring_report', year)
+
+    assert len(lambda_function._report_cache) == 2
+    assert [start[:4] for start in calls] == ['2020', '2021', '2022', '2021']
+
+
+def test_expired_report_results_are_dropped(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(lambda_function.time, 'time', lambda: now[0])
+    lambda_function.cache_report(('r', None, ()), 1010.0, {'rows': []})
+
+    assert lambda_function.cached_report(('r', None, ())) == {'rows': []}
+    now[0] = 1010.0
+    assert lambda_function.cached_report(('r', None, ())) is None
+    assert len(lambda_function._report_cache) == 0
@@ -0,0 +1,71 @@
+import json
+
+import pytest
+
+import lambda_function
+from report_windows import quarter_window, resolve_window, year_window
+
+
+def test_year_window_is_half_open():
+    assert year_window(2021) == ('2021-01-01 00:00:00+00', '2022-01-01 00:00:00+00')
+
+
+def test_quarter_windows():
+    assert quarter_window(2021, 1) == ('2021-01-01 00:00:00+00', '2021-04-01 00:00:00+00')
+    assert quarter_window(2021, 4) == ('2021-10-01 00:00:00+00', '2022-01-01 00:00:00+00')
+
+
+def test_explicit_range_wins_over_year():
+    assert resolve_window(2021, start='2021-03-15', end='2021-04-01') == (
+        '2021-03-15 00:00:00+00', '2021-04-01 00:00:00+00'
+    )
+
+
+@pytest.mark.parametrize('kwargs', [
+    {'year': 1999},
+    {'year': 2021, 'quarter': 5},
+    {'start': '2021-02-01'},
+    {'start': '2021-02-01', 'end': '2021-01-01'},
+    {},
+])
+def test_invalid_windows(kwargs):
+    with pytest.raises(ValueError):
+        resolve_window(**kwargs)
+
+
+def test_reports_leave_sort_key_column_bare():
+    for name in lambda_function.REPORTS.names():
+        sql = lambda_function.REPORTS.get(name).sql
+
+        assert 'EXTRACT(YEAR' not in sql
+        assert ('e.datetime >= CAST(:window_start AS TIMESTAMPTZ)' in sql
+                or 's.month_start >= CAST(:window_start AS TIMESTAMPTZ)' in sql)
+
+
+def test_reports_bind_window(monkeypatch):
+    calls = []
+    monkeypatch.setattr(lambda_function, 'execute_sql_query',
+                        lambda sql, parameters=None, compile_stats=False: calls.append((sql, parameters)) or {'rows': []})
+
+    event = {
+        'httpMethod': 'GET',
+        'path': '/reports/departments_above_avg_hiring/2021',
+        'queryStringParameters': {'quarter': '2'}
+    }
+    response = lambda_function.lambda_handler(event, None)
+
+    assert response['statusCode'] == 200
+    assert 'EXTRACT(YEAR' not in calls[0][0]
+    assert calls[0][1] == {'window_start': '2021-04-01 00:00:00+00', 'window_end': '2021-07-01 00:00:00+00'}
+
+
+def test_report_rejects_bad_window():
+    event = {
+        'httpMethod': 'GET',
+        'path': '/reports/quarterly_hiring_report',
+        'queryStringParameters': {'start': '2021-05-01', 'end': '2021-01-01'}
+    }
+    response = lambda_function.lambda_handler(event, None)
+
+    assert response['statusCode'] == 400
+    assert 'Invalid report window' in json.loads(response['body'])['error']
@@ -0,0 +1,73 @@
+import json
+
+import lambda_function
+import request_metrics
+from lambda_client import api_event
+
+
+def invoke_and_capture(capsys, method, path, body=None, query=None):
+    response = lambda_function.lambda_handler(api_event(method, path, body, query), None)
+    lines = [json.loads(line) for line in capsys.readouterr().out.splitlines() if line]
+    return response, lines
+
+
+def test_emf_record_has_phase_timings(local_aws, capsys, monkeypatch):
+    monkeypatch.setattr(request_metrics, 'LOG_SAMPLE_RATE', 0.0)
+
+    response, lines = invoke_and_capture(capsys, 'POST', '/sql', {'sql': 'SELECT id FROM hr_data.departments'})
+
+    assert response['statusCode'] == 200
+    assert len(lines) == 1
+    record = lines[0]
+    directive = record['_aws']['CloudWatchMetrics'][0]
+    assert directive['Dimensions'] == [['Route']]
+    assert record['Route'] == 'sql'
+    for name in ('CredentialsMs', 'SubmitMs', 'PollWaitMs', 'ResultFetchMs', 'DecodeMs', 'SerializeMs', 'TotalMs'):
+        assert name in record
+        assert {'Name': name, 'Unit': 'Milliseconds'} in directive['Metrics']
+    assert record['PollCount'] >= 1
+    # The cost guard's EXPLAIN, then the query
+    assert record['StatementCount'] == 2
+
+
+def test_backup_records_s3_write(local_aws, capsys, monkeypatch):
+    monkeypatch.setattr(request_metrics, 'LOG_SAMPLE_RATE', 0.0)
+
+    response, lines = invoke_and_capture(capsys, 'POST', '/backup/departments')
+
+    assert response['statusCode'] == 200
+    assert lines[0]['Route'] == 'backup'
+    assert 'S3WriteMs' in lines[0]
+
+
+def test_sampled_log_carries_context_but_not_rows(local_aws, capsys):
+    response, lines = invoke_and_capture(capsys, 'GET', '/reports/quarterly_hiring_report/2021')
+
+    record = request_metrics.current().emit(response['statusCode'], sample_rate=1.0)
+    log = json.loads(capsys.readouterr().out.splitlines()[-1])
+
+    assert response['statusCode'] == 200
+    assert '_aws' not in log
+    assert log['report'] == 'quarterly_hiring_report'
+    assert log['path'] == '/reports/quarterly_hiring_report/2021'
+    assert log['TotalMs'] == record['TotalMs']
+    assert 'rows' not in log
+
+
+def test_server_errors_are_always_logged(local_aws, capsys, monkeypatch):
+    monkeypatch.setattr(request_metrics, 'LOG_SAMPLE_RATE', 0.0)
+    local_aws.db.query('DROP TABLE hr_data.jobs')
+
+    response, lines = invoke_and_capture(capsys, 'POST', '/backup/jobs')
+
+    assert response['statusCode'] == 500
+    assert len(lines) == 2
+    assert lines[0]['ServerError'] == 1
+    assert lines[1]['level'] == 'ERROR'
+    assert 'jobs' in lines[1]['error']
+
+
+def test_route_name_is_low_cardinality():
+    assert lambda_function.route_name({'httpMethod': 'GET', 'path': '/reports/x/2021'}) == 'reports'
+    assert lambda_function.route_name({'httpMethod': 'OPTIONS', 'path': '/data/jobs'}) == 'options'
+    assert lambda_function.route_name({'httpMethod': 'GET', 'path': '/nope/1'}) == 'other'
@@ -0,0 +1,150 @@
+import re
+import threading
+
+import pytest
+
+import hiring_summary
+import lambda_function
+from lambda_client import invoke
+from routing import Router, Target
+
+
+def executed_sql(local_aws):
+    sqls = []
+    for operation, kwargs in local_aws.redshift_data.calls:
+        if operation == 'ExecuteStatement':
+            sqls.append(kwargs['Sql'])
+        elif operation == 'BatchExecuteStatement':
+            sqls.extend(kwargs['Sqls'])
+    return sqls
+
+
+def test_swap_statements():
+    assert lambda_function.build_swap_statements('jobs', 'a1') == [
+        'ALTER TABLE hr_data.jobs RENAME TO jobs_retired_a1',
+        'ALTER TABLE hr_data.jobs_restore_a1 RENAME TO jobs',
+        'DROP TABLE hr_data.jobs_retired_a1',
+    ]
+    assert 'CREATE TABLE hr_data.jobs_restore_a1 (LIKE hr_data.jobs)' in \
+        lambda_function.build_staging_statements('jobs', 'a1')
+
+
+def test_grants_render_per_identity_type():
+    assert lambda_function.grant_statement('jobs', 'SELECT', 'group', 'analysts') == \
+        'GRANT SELECT ON hr_data.jobs TO GROUP "analysts"'
+    assert lambda_function.grant_statement('jobs', 'SELECT', 'role', 'reporting') == \
+        'GRANT SELECT ON hr_data.jobs TO ROLE "reporting"'
+    assert lambda_function.grant_statement('jobs', 'INSERT', 'user', 'etl') == 'GRANT INSERT ON hr_data.jobs TO "etl"'
+
+
+def test_restore_loads_staging_and_swaps(local_aws):
+    _, body = invoke('POST', '/backup/hired_employees')
+    expected = local_aws.db.query('SELECT * FROM hr_data.hired_employees ORDER BY id')
+    local_aws.db.query('DELETE FROM hr_data.hired_employees WHERE id > 10')
+    local_aws.redshift_data.calls.clear()
+
+    status, _ = invoke('POST', '/restore/hired_employees', {'backup_key': body['backup_key']})
+
+    assert status == 200
+    sqls = executed_sql(local_aws)
+    assert not any(sql.startswith('DELETE FROM hr_data.hired_employees') for sql in sqls)
+    inserts = [sql for sql in sqls if sql.startswith('INSERT INTO hr_data.hired_employees')]
+    assert inserts and all(sql.startswith('INSERT INTO hr_data.hired_employees_restore') for sql in inserts)
+    suffix = re.match(r'INSERT INTO hr_data\.hired_employees_restore_(\w+)', inserts[0]).group(1)
+    assert sqls[-5:-2] == lambda_function.build_swap_statements('hired_employees', suffix)
+    assert sqls[-2:] == hiring_summary.rebuild_statements()
+    assert local_aws.db.query('SELECT * FROM hr_data.hired_employees ORDER BY id') == expected
+    assert local_aws.db.query(
+        "SELECT COUNT(*) FROM information_schema.tables WHERE table_name LIKE 'hired_employees_%'"
+    ) == [(0,)]
+
+
+def test_failed_load_leaves_live_table_untouched(local_aws, monkeypatch):
+    _, body = invoke('POST', '/backup/jobs')
+    before = local_aws.db.query('SELECT * FROM hr_data.jobs ORDER BY id')
+
+    def fail(*args, **kwargs):
+        raise Exception('Database query error: insert failed')
+    monkeypatch.setattr(lambda_function, 'build_parameterized_insert', fail)
+
+    with pytest.raises(Exception):
+        lambda_function.restore_table('jobs', body['backup_key'])
+
+    assert local_aws.db.query('SELECT * FROM hr_data.jobs ORDER BY id') == before
+    assert local_aws.db.query(
+        "SELECT COUNT(*) FROM information_schema.tables WHERE table_name LIKE 'jobs_%'"
+    ) == [(0,)]
+
+
+def test_concurrent_restores_stage_separately():
+    pytest.importorskip('duckdb')
+    from local_data_api import LocalAWS, Latency
+
+    local = LocalAWS(latency=Latency(execution_ms=20))
+    local.db.seed()
+    local.install(lambda_function)
+    try:
+        _, body = invoke('POST', '/backup/jobs')
+        expected = local.db.query('SELECT * FROM hr_data.jobs ORDER BY id')
+        statuses = []
+
+        def restore():
+            statuses.append(invoke('POST', '/restore/jobs', {'backup_key': body['manifest_key']})[0])
+
+        threads = [threading.Thread(target=restore) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=10)
+    finally:
+        lambda_function._clients.clear()
+        lambda_function._credentials.clear()
+
+    assert statuses == [200, 200]
+    staged = {re.match(r'INSERT INTO hr_data\.(jobs_restore_\w+)', kwargs['Sql']).group(1)
+              for op, kwargs in local.redshift_data.calls
+              if op == 'ExecuteStatement' and kwargs['Sql'].startswith('INSERT INTO hr_data.jobs_restore')}
+    assert len(staged) == 2
+    assert local.db.query('SELECT * FROM hr_data.jobs ORDER BY id') == expected
+
+
+def test_empty_backup_reports_nothing_restored(local_aws):
+    local_aws.db.query('DELETE FROM hr_data.jobs')
+    _, snapshot = invoke('POST', '/backup')
+    jobs = next(entry for entry in snapshot['tables'] if entry['table'] == 'jobs')
+    local_aws.db.query("INSERT INTO hr_data.jobs VALUES (1, 'Engineer')")
+
+    status, body = invoke('POST', '/restore/jobs', {'backup_key': jobs['manifest_key']})
+
+    assert status == 400 and 'nothing was restored' in body['error']
+    assert local_aws.db.query('SELECT * FROM hr_data.jobs') == [(1, 'Engineer')]
+
+
+@pytest.mark.parametrize('path', ['/backup/jobs_restore', '/restore/jobs;DROP'])
+def test_unknown_table_is_a_bad_request(local_aws, path):
+    status, body = invoke('POST', path, {'backup_key': 'backups/jobs/x.avro'})
+
+    assert status == 400 and body['error'] == 'Invalid table name'
+    assert local_aws.redshift_data.calls == []
+
+
+def test_datashare_consumer_reads_a_restored_table(local_aws, monkeypatch):
+    local_aws.db.query('GRANT SELECT ON hr_data.jobs TO GROUP analysts')
+    local_aws.db.query('ALTER DATASHARE hr_share ADD TABLE hr_data.jobs')
+    local_aws.redshift_data.consumers['hr_share'] = 'hr_share'
+    monkeypatch.setattr(lambda_function, 'ROUTER', Router({
+        'producer': Target('producer', 'dev', cluster='test-cluster'),
+        'analytics': Target('analytics', 'hr_share', cluster='consumer-cluster', writable=False),
+    }))
+    monkeypatch.setattr(lambda_function, 'SQL_GUARD', False)
+    _, body = invoke('POST', '/backup/jobs')
+
+    assert invoke('POST', '/restore/jobs', {'backup_key': body['manifest_key']})[0] == 200
+
+    assert local_aws.db.query(
+        "SELECT privilege_type, identity_type, identity_name FROM svv_relation_privileges WHERE relation_name = 'jobs'"
+    ) == [('SELECT', 'group', 'analysts')]
+    status, result = invoke('POST', '/sql', {'sql': 'SELECT COUNT(*) FROM hr_data.jobs'})
+    assert status == 200 and result['rows'] == [[40]]
+    assert [kwargs['Database'] for op, kwargs in local_aws.redshift_data.calls
+            if op == 'ExecuteStatement' and kwargs.get('Sql') == 'SELECT COUNT(*) FROM hr_data.jobs'] == ['hr_share']
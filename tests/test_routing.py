@@ -0,0 +1,126 @@
+import json
+
+import pytest
+
+import lambda_function
+import routing
+from lambda_client import invoke
+from routing import Router, Target
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def router(local_aws, monkeypatch):
+    router = Router({
+        'producer': Target('producer', 'dev', cluster='test-cluster'),
+        'analytics': Target('analytics', 'dev', workgroup='hr-analytics', secret_arn='analytics-secret'),
+    }, failure_threshold=2, cooldown_seconds=30, clock=Clock())
+    monkeypatch.setattr(lambda_function, 'ROUTER', router)
+    return router
+
+
+def test_select_into_is_not_read_only():
+    assert routing.read_only('SELECT * FROM hr_data.jobs')
+    assert routing.read_only("SELECT 'copy into' AS note")
+    assert not routing.read_only('SELECT * INTO hr_data.jobs_copy FROM hr_data.jobs')
+    assert not routing.read_only('WITH j AS (SELECT * FROM hr_data.jobs) SELECT * INTO TEMP t FROM j')
+
+
+def targets(local):
+    """Where each submitted statement went, following warm sessions to their target"""
+    sessions = local.redshift_data.sessions
+    return [sessions[kwargs['SessionId']].target if 'SessionId' in kwargs
+            else kwargs.get('WorkgroupName') or kwargs.get('ClusterIdentifier')
+            for op, kwargs in local.redshift_data.calls
+            if op in ('ExecuteStatement', 'BatchExecuteStatement')]
+
+
+def test_connection_fields_per_target_kind():
+    assert Target('p', 'dev', cluster='c').connection('awsuser', 'secret') == \
+        {'Database': 'dev', 'ClusterIdentifier': 'c', 'DbUser': 'awsuser'}
+    assert Target('a', 'dev', workgroup='w').connection('awsuser', 'secret') == \
+        {'Database': 'dev', 'WorkgroupName': 'w', 'SecretArn': 'secret'}
+    consumer = Target.from_dict('a', {'cluster': 'c2', 'database': 'hr_share', 'consumer': True}, {'database': 'dev'})
+    assert not consumer.writable and consumer.connection(secret_arn='secret')['Database'] == 'hr_share'
+    with pytest.raises(ValueError):
+        Target('x', 'dev', cluster='c', workgroup='w')
+
+
+def test_environment_configures_targets(monkeypatch):
+    monkeypatch.setenv('ROUTING_TARGETS', json.dumps({'analytics': {'workgroup': 'hr-analytics'}}))
+    monkeypatch.setenv('ROUTING_RULES', 'adhoc=producer')
+    router = routing.from_environment('hr-cluster', 'dev')
+
+    assert [t.name for t in router.candidates('report')] == ['analytics', 'producer']
+    assert [t.name for t in router.candidates('adhoc')] == ['producer']
+    assert [t.name for t in router.candidates('report', writes=True)] == ['analytics', 'producer']
+
+    monkeypatch.delenv('ROUTING_TARGETS')
+    assert [t.name for t in routing.from_environment('c', 'dev').candidates('report')] == ['producer']
+
+
+def test_reads_go_to_analytics_and_writes_to_the_producer(router, local_aws):
+    assert invoke('GET', '/reports/quarterly_hiring_report/2021', query={'cache': 'false'})[0] == 200
+    assert invoke('POST', '/data/jobs', {'data': [{'id': 900, 'job': 'Router'}]})[0] == 200
+    assert invoke('POST', '/backup/jobs')[0] == 200
+
+    assert targets(local_aws) == ['hr-analytics', 'test-cluster', 'test-cluster']
+
+
+def test_adhoc_writes_skip_a_read_only_consumer(local_aws, monkeypatch):
+    monkeypatch.setattr(lambda_function, 'ROUTER', Router({
+        'producer': Target('producer', 'dev', cluster='test-cluster'),
+        'analytics': Target('analytics', 'dev', cluster='consumer-cluster', writable=False),
+    }))
+    monkeypatch.setattr(lambda_function, 'SQL_GUARD', False)
+
+    assert invoke('POST', '/sql', {'sql': 'SELECT COUNT(*) FROM hr_data.jobs'})[0] == 200
+    assert invoke('POST', '/sql', {'sql': "UPDATE hr_data.jobs SET job = 'x' WHERE id = 1"})[0] == 200
+
+    assert targets(local_aws) == ['consumer-cluster', 'test-cluster']
+
+
+def test_unavailable_target_fails_over_and_cools_down(router, local_aws):
+    report = '/reports/departments_above_avg_hiring/2021'
+    assert invoke('GET', report, query={'cache': 'false'})[0] == 200
+    local_aws.redshift_data.unavailable.add('hr-analytics')
+
+    for _ in range(2):
+        assert invoke('GET', report, query={'cache': 'false'})[0] == 200
+    stats = router.stats()['analytics']
+    assert not stats['healthy'] and stats['failures'] == 2
+    calls_before = len(local_aws.redshift_data.calls)
+
+    assert invoke('GET', report, query={'cache': 'false'})[0] == 200
+    assert not any(kwargs.get('WorkgroupName') for _, kwargs in local_aws.redshift_data.calls[calls_before:])
+
+    local_aws.redshift_data.unavailable.clear()
+    router.clock.now += 31
+    assert invoke('GET', report, query={'cache': 'false'})[0] == 200
+    assert targets(local_aws)[-1] == 'hr-analytics'
+
+
+def test_failing_sql_does_not_mark_the_target_unhealthy(router, local_aws):
+    for _ in range(3):
+        assert invoke('POST', '/sql', {'sql': 'SELECT * FROM hr_data.missing'})[0] == 400
+
+    assert router.stats()['analytics']['healthy']
+
+
+def test_targets_route_reports_latency(router, local_aws):
+    invoke('GET', '/reports/quarterly_hiring_report/2021')
+
+    status, body = invoke('GET', '/targets')
+
+    assert status == 200
+    analytics = body['targets']['analytics']
+    assert analytics['target'] == {'workgroup': 'hr-analytics', 'database': 'dev', 'writable': True}
+    assert analytics['statements'] == 1 and analytics['p95_ms'] >= 0
+    assert body['targets']['producer']['statements'] == 0
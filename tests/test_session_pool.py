@@ -0,0 +1,151 @@
+import threading
+
+import pytest
+from botocore.exceptions import ClientError
+
+import lambda_function
+import request_metrics
+from session_pool import SessionPool
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def submitted(local, operation='ExecuteStatement'):
+    return [kwargs for op, kwargs in local.redshift_data.calls if op == operation]
+
+
+@pytest.fixture(autouse=True)
+def pipeline_request():
+    # Pooling applies to pipeline workloads; ad-hoc SQL never gets a pooled session
+    return request_metrics.start('reports')
+
+
+def test_statements_reuse_one_session(local_aws, pipeline_request):
+    metrics = pipeline_request
+
+    for _ in range(3):
+        assert lambda_function.execute_sql_query('SELECT COUNT(*) FROM hr_data.jobs')['rows'] == [[40]]
+
+    first, *rest = submitted(local_aws)
+    assert first['SessionKeepAliveSeconds'] == lambda_function.SESSIONS.keep_alive_seconds
+    assert first['ClusterIdentifier'] == 'test-cluster'
+    assert all(kwargs['SessionId'] and 'ClusterIdentifier' not in kwargs for kwargs in rest)
+    assert metrics.counters['SessionReuse'] == 2
+
+
+def test_batches_share_the_session(local_aws):
+    lambda_function.execute_sql_query('SELECT 1')
+    lambda_function.execute_batch_statements(['SELECT 1', 'SELECT 2'])
+
+    batch, = submitted(local_aws, 'BatchExecuteStatement')
+    assert list(local_aws.redshift_data.sessions) == [batch['SessionId']]
+
+
+def test_concurrent_statements_get_their_own_sessions():
+    pytest.importorskip('duckdb')
+    from local_data_api import LocalAWS, Latency
+
+    local = LocalAWS(latency=Latency(execution_ms=100))
+    local.db.seed()
+    local.install(lambda_function)
+    # The report class has room for all three statements at once
+    errors = []
+
+    def run(job_id):
+        try:
+            lambda_function.execute_sql_query(f"UPDATE hr_data.jobs SET job = job WHERE id = {job_id}")
+        except Exception as e:
+            errors.append(e)
+
+    try:
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(1, 4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=10)
+        run(4)
+    finally:
+        lambda_function._clients.clear()
+        lambda_function._credentials.clear()
+
+    assert errors == []
+    assert len(local.redshift_data.sessions) == 3
+    assert 'SessionId' in submitted(local)[-1]
+
+
+def test_expired_session_is_not_reused(local_aws, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(lambda_function, 'SESSIONS', SessionPool(60, clock=clock))
+    lambda_function.execute_sql_query('SELECT 1')
+
+    clock.now += 55
+
+    lambda_function.execute_sql_query('SELECT 1')
+    assert all('SessionKeepAliveSeconds' in kwargs for kwargs in submitted(local_aws))
+
+
+def test_lost_session_falls_back_to_a_new_one(local_aws):
+    lambda_function.execute_sql_query('SELECT 1')
+    local_aws.redshift_data.sessions.clear()
+
+    assert lambda_function.execute_sql_query('SELECT 2')['rows'] == [[2]]
+
+    calls = submitted(local_aws)
+    assert 'SessionId' in calls[1] and 'SessionKeepAliveSeconds' in calls[2]
+    assert len(local_aws.redshift_data.sessions) == 1
+
+
+def test_session_limit_runs_without_a_session():
+    calls = []
+
+    def execute_statement(**kwargs):
+        calls.append(kwargs)
+        if 'SessionKeepAliveSeconds' in kwargs:
+            raise ClientError({'Error': {'Code': 'ActiveSessionsExceededException', 'Message': 'Too many sessions'}},
+                              'ExecuteStatement')
+        return {'Id': 'statement-1'}
+
+    response, session_id, reused = SessionPool(300).submit(execute_statement, {'ClusterIdentifier': 'c', 'Sql': 'SELECT 1'})
+
+    assert response['Id'] == 'statement-1' and session_id is None and not reused
+    assert calls[-1] == {'ClusterIdentifier': 'c', 'Sql': 'SELECT 1'}
+
+
+def test_zero_keep_alive_disables_sessions(local_aws, monkeypatch):
+    monkeypatch.setattr(lambda_function, 'SESSIONS', SessionPool(0))
+
+    lambda_function.execute_sql_query('SELECT 1')
+    lambda_function.execute_sql_query('SELECT 1')
+
+    assert not any('SessionId' in kwargs or 'SessionKeepAliveSeconds' in kwargs for kwargs in submitted(local_aws))
+
+
+def test_adhoc_statements_do_not_use_pooled_sessions(local_aws):
+    lambda_function.execute_sql_query('SELECT 1')
+    request_metrics.start('sql')
+
+    lambda_function.execute_sql_query("SET timezone TO 'America/New_York'")
+    lambda_function.execute_sql_query('SELECT 1')
+
+    report, *adhoc = submitted(local_aws)
+    assert 'SessionKeepAliveSeconds' in report
+    assert not any('SessionId' in kwargs or 'SessionKeepAliveSeconds' in kwargs for kwargs in adhoc)
+
+
+def test_workloads_do_not_share_sessions(local_aws):
+    lambda_function.execute_sql_query('SELECT 1')
+    request_metrics.start('data')
+    lambda_function.execute_sql_query('SELECT 1')
+    request_metrics.start('reports')
+    lambda_function.execute_sql_query('SELECT 1')
+
+    report, ingest, again = submitted(local_aws)
+    assert 'SessionKeepAliveSeconds' in report and 'SessionKeepAliveSeconds' in ingest
+    assert len(local_aws.redshift_data.sessions) == 2
+    assert again['SessionId'] in local_aws.redshift_data.sessions
@@ -0,0 +1,173 @@
+import threading
+import time
+
+import pytest
+
+import lambda_function
+import request_metrics
+import single_flight
+from single_flight import DynamoDBRegistry, InFlightRegistry, MemoryRegistry, SingleFlight, SQLiteRegistry
+
+
+@pytest.fixture(params=['memory', 'sqlite', 'dynamodb'])
+def registry(request, tmp_path):
+    if request.param == 'dynamodb':
+        pytest.importorskip('duckdb')
+        from local_data_api import FakeDynamoDB
+        dynamodb = FakeDynamoDB()
+        return DynamoDBRegistry('coordination', lambda: dynamodb)
+    return MemoryRegistry() if request.param == 'memory' else SQLiteRegistry(str(tmp_path / 'in_flight.db'))
+
+
+def test_registry_missing_a_method_fails_when_built():
+    class Partial(InFlightRegistry):
+        def claim(self, key, owner, now, lease_seconds):
+            return None
+
+    with pytest.raises(TypeError):
+        Partial()
+
+
+def test_keys_ignore_layout_but_not_literals():
+    key = single_flight.statement_key('SELECT *\n  FROM hr_data.departments;')
+
+    assert key == single_flight.statement_key('SELECT * FROM hr_data.departments')
+    assert single_flight.statement_key("SELECT 'a  b'") != single_flight.statement_key("SELECT 'a b'")
+    assert single_flight.statement_key('SELECT :x', {'x': 1}) != single_flight.statement_key('SELECT :x', {'x': 2})
+    assert single_flight.statement_key('SELECT 1', scope='a') != single_flight.statement_key('SELECT 1', scope='b')
+    assert single_flight.statement_key('INSERT INTO hr_data.jobs VALUES (1, \'x\')') is None
+    assert single_flight.statement_key('SELECT * INTO hr_data.jobs_copy FROM hr_data.jobs') is None
+    assert single_flight.statement_key("SELECT 'into' AS word") is not None
+
+
+def test_follower_waits_for_the_leader_to_submit(registry):
+    coalescer = SingleFlight(registry, poll_seconds=0.01)
+    key = single_flight.statement_key('SELECT 1')
+    submitted = threading.Event()
+    attached = []
+
+    def follow():
+        submitted.wait()
+        with coalescer.join(key) as flight:
+            attached.append(flight.statement_id)
+
+    with coalescer.join(key) as leader:
+        assert not leader.coalesced
+        follower = threading.Thread(target=follow)
+        follower.start()
+        submitted.set()
+        time.sleep(0.05)
+        assert attached == []
+        leader.publish('statement-1')
+        follower.join(timeout=5)
+
+    assert attached == ['statement-1']
+    with coalescer.join(key) as flight:
+        assert not flight.coalesced
+
+
+def test_follower_leads_when_the_leader_gives_up(registry):
+    coalescer = SingleFlight(registry, poll_seconds=0.01)
+    key = single_flight.statement_key('SELECT 1')
+    results = []
+
+    def follow():
+        with coalescer.join(key) as flight:
+            results.append(flight.coalesced)
+
+    with pytest.raises(RuntimeError):
+        with coalescer.join(key):
+            follower = threading.Thread(target=follow)
+            follower.start()
+            time.sleep(0.05)
+            raise RuntimeError('submit failed')
+    follower.join(timeout=5)
+
+    assert results == [False]
+
+
+def test_abandoned_claim_expires(registry):
+    coalescer = SingleFlight(registry, pending_seconds=0.05, poll_seconds=0.01)
+    key = single_flight.statement_key('SELECT 1')
+    registry.claim(key, 'crashed', time.time(), 0.05)
+
+    with coalescer.join(key) as flight:
+        assert not flight.coalesced
+
+
+def executed(local):
+    return [kwargs['Sql'] for op, kwargs in local.redshift_data.calls if op == 'ExecuteStatement']
+
+
+def run_concurrently(sql, callers=5, route='reports'):
+    """Run the same statement from several threads against a fake with slow statements"""
+    pytest.importorskip('duckdb')
+    from local_data_api import LocalAWS, Latency
+
+    local = LocalAWS(latency=Latency(execution_ms=200))
+    local.db.seed()
+    local.install(lambda_function)
+    metrics = request_metrics.start(route)
+    results = []
+
+    def run():
+        results.append(lambda_function.execute_sql_query(sql))
+
+    try:
+        threads = [threading.Thread(target=run) for _ in range(callers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=10)
+    finally:
+        lambda_function._clients.clear()
+        lambda_function._credentials.clear()
+    return local, metrics, results
+
+
+def test_concurrent_identical_queries_share_one_statement():
+    local, metrics, results = run_concurrently('SELECT * FROM hr_data.departments ORDER BY id')
+
+    assert len(executed(local)) == 1
+    assert metrics.counters['CoalesceHits'] == 4
+    assert all(result['rows'] == results[0]['rows'] for result in results)
+    assert len(results[0]['rows']) == 12
+
+
+def test_concurrent_writes_are_never_coalesced():
+    local, metrics, _ = run_concurrently("UPDATE hr_data.jobs SET job = job WHERE id = 1")
+
+    assert len(executed(local)) == 5
+    assert 'CoalesceHits' not in metrics.counters
+
+
+@pytest.mark.parametrize('route', ['backup', 'data'])
+def test_backup_and_ingest_reads_are_never_coalesced(route):
+    local, metrics, _ = run_concurrently('SELECT * FROM hr_data.departments ORDER BY id', route=route)
+
+    assert len(executed(local)) == 5
+    assert 'CoalesceHits' not in metrics.counters
+
+
+@pytest.mark.parametrize('store', ['sqlite', 'dynamodb'])
+def test_shared_registry_attaches_across_containers(local_aws, tmp_path, monkeypatch, store):
+    def registry():
+        if store == 'dynamodb':
+            return DynamoDBRegistry('coordination', lambda: local_aws.dynamodb)
+        return SQLiteRegistry(str(tmp_path / 'in_flight.db'))
+
+    monkeypatch.setattr(lambda_function, 'COALESCER', SingleFlight(registry()))
+    request_metrics.start('reports')
+    sql = 'SELECT id, job FROM hr_data.jobs ORDER BY id'
+    user = local_aws.secretsmanager.username
+    key = single_flight.statement_key(sql, None, f"producer/{user}")
+    # Another container has submitted the statement and is still waiting on it
+    statement_id = local_aws.redshift_data.execute_statement(ClusterIdentifier='test-cluster', Database='dev', Sql=sql)['Id']
+    other = registry()
+    other.claim(key, 'other-container', time.time(), 60)
+    other.publish(key, 'other-container', statement_id, time.time(), 60)
+
+    result = lambda_function.execute_sql_query(sql)
+
+    assert len(result['rows']) == 40
+    assert executed(local_aws) == [sql]
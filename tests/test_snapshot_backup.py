@@ -0,0 +1,85 @@
+import pytest
+
+import lambda_function
+from lambda_client import invoke
+
+
+def snapshot(db):
+    return {
+        table: db.query(f'SELECT * FROM hr_data.{table} ORDER BY id')
+        for table in lambda_function.TABLE_COLUMNS
+    }
+
+
+def test_backup_all_reads_one_transaction(local_aws):
+    status, body = invoke('POST', '/backup')
+
+    assert status == 200
+    assert [entry['table'] for entry in body['tables']] == ['departments', 'jobs', 'hired_employees']
+    assert body['manifest_key'].startswith('backups/snapshots/')
+    assert body['tables'][2]['rows'] == 200
+    batches = [call for call in local_aws.redshift_data.calls if call[0] == 'BatchExecuteStatement']
+    assert len(batches) == 1
+    assert len(batches[0][1]['Sqls']) == 3
+
+
+def test_restore_all_reloads_the_set(local_aws):
+    expected = snapshot(local_aws.db)
+    _, body = invoke('POST', '/backup')
+
+    local_aws.db.query('DELETE FROM hr_data.hired_employees')
+    local_aws.db.query("UPDATE hr_data.departments SET department = 'Changed'")
+    status, _ = invoke('POST', '/restore', {'backup_key': body['manifest_key']})
+
+    assert status == 200
+    assert snapshot(local_aws.db) == expected
+
+
+def test_restore_all_rejects_table_manifests(local_aws):
+    _, body = invoke('POST', '/backup/jobs')
+
+    status, error = invoke('POST', '/restore', {'backup_key': body['manifest_key']})
+
+    assert status == 400
+    assert 'not a snapshot manifest' in error['error']
+
+
+def test_snapshot_tables_are_catalogued_and_restore_alone(local_aws):
+    expected = local_aws.db.query('SELECT * FROM hr_data.jobs ORDER BY id')
+    _, body = invoke('POST', '/backup')
+    jobs = body['tables'][1]
+
+    assert lambda_function.find_backup('jobs')['key'] == jobs['manifest_key']
+    local_aws.db.query('DELETE FROM hr_data.jobs')
+    assert invoke('POST', '/restore/jobs', {'backup_key': jobs['manifest_key']})[0] == 200
+    assert local_aws.db.query('SELECT * FROM hr_data.jobs ORDER BY id') == expected
+
+
+def test_incremental_chains_onto_a_snapshot(local_aws):
+    _, body = invoke('POST', '/backup')
+    local_aws.db.query("INSERT INTO hr_data.hired_employees VALUES (9001, 'Late Hire', '2022-06-01 09:00:00+00', 1, 1)")
+
+    _, delta = invoke('POST', '/backup/hired_employees', {'mode': 'incremental'})
+
+    assert delta['mode'] == 'incremental' and delta['rows'] == 1
+    assert delta['base'] == body['tables'][2]['manifest_key']
+
+
+def test_parquet_snapshot_restores(local_aws):
+    pytest.importorskip('pyarrow')
+    expected = snapshot(local_aws.db)
+    status, body = invoke('POST', '/backup', {'format': 'parquet'})
+    assert status == 200 and body['format'] == 'parquet'
+    assert all(key.endswith('.parquet') for entry in body['tables'] for key in entry['files'])
+
+    local_aws.db.query('DELETE FROM hr_data.hired_employees')
+    assert invoke('POST', '/restore', {'backup_key': body['manifest_key']})[0] == 200
+    assert snapshot(local_aws.db) == expected
+
+
+def test_snapshot_rejects_an_unknown_format(local_aws):
+    status, body = invoke('POST', '/backup', query={'format': 'orc'})
+
+    assert status == 400
+    assert 'Invalid format' in body['error']
+    assert local_aws.redshift_data.calls == []
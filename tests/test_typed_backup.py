@@ -0,0 +1,84 @@
+import io
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import pytest
+
+import lambda_function
+from lambda_client import invoke
+
+fastavro = pytest.importorskip('fastavro')
+
+
+def stored(local_aws, key):
+    return local_aws.s3.objects[(lambda_function.S3_BUCKET, key)]['Body']
+
+
+def test_schema_types_from_column_metadata():
+    schema = lambda_function.avro_schema('t', ['id', 'datetime', 'amount', 'name'], [
+        {'typeName': 'int4'},
+        {'typeName': 'timestamptz'},
+        {'typeName': 'numeric', 'precision': 12, 'scale': 2},
+        {'typeName': 'varchar'},
+    ])
+
+    assert [field['type'][1] for field in schema['fields']] == [
+        'int',
+        {'type': 'long', 'logicalType': 'timestamp-micros'},
+        {'type': 'bytes', 'logicalType': 'decimal', 'precision': 12, 'scale': 2},
+        'string',
+    ]
+    assert lambda_function.avro_schema('t', ['id'])['fields'] == [{'name': 'id', 'type': ['null', 'string']}]
+
+
+def test_values_convert_for_their_fields():
+    assert lambda_function.avro_value('2021-07-27 16:02:08+00', {'type': 'long', 'logicalType': 'timestamp-micros'}) == \
+        datetime(2021, 7, 27, 16, 2, 8, tzinfo=timezone.utc)
+    assert lambda_function.avro_value('12.50', {'type': 'bytes', 'logicalType': 'decimal'}) == Decimal('12.50')
+    assert lambda_function.avro_value(7, 'string') == '7'
+    assert lambda_function.avro_value(None, 'int') is None
+
+
+def test_backup_is_typed_and_restores(local_aws):
+    expected = local_aws.db.query('SELECT * FROM hr_data.hired_employees ORDER BY id')
+
+    status, body = invoke('POST', '/backup/hired_employees', {'codec': 'null'})
+    assert status == 200
+
+    reader = fastavro.reader(io.BytesIO(stored(local_aws, body['backup_key'])))
+    types = {field['name']: field['type'][1] for field in reader.writer_schema['fields']}
+    assert types['id'] == 'int'
+    assert types['datetime']['logicalType'] == 'timestamp-micros'
+    first = next(reader)
+    assert isinstance(first['id'], int) and first['datetime'].tzinfo is not None
+
+    local_aws.db.query('DELETE FROM hr_data.hired_employees')
+    assert invoke('POST', '/restore/hired_employees', {'backup_key': body['manifest_key']})[0] == 200
+    assert local_aws.db.query('SELECT * FROM hr_data.hired_employees ORDER BY id') == expected
+
+
+def test_typed_backup_is_smaller_than_strings(local_aws):
+    result = lambda_function.execute_sql_query('SELECT * FROM hr_data.hired_employees', metadata=True)
+    lambda_function.write_avro_backup('hired_employees', result['columns'], result['rows'], 'strings.avro', 'null')
+    lambda_function.write_avro_backup('hired_employees', result['columns'], result['rows'], 'typed.avro', 'null',
+                                      metadata=result['metadata'])
+
+    assert len(stored(local_aws, 'typed.avro')) < len(stored(local_aws, 'strings.avro'))
+
+
+def test_string_backups_still_restore_and_dedupe_with_typed_ones(local_aws):
+    # A backup written before typed schemas, then a typed one with an extra row
+    result = lambda_function.execute_sql_query('SELECT * FROM hr_data.jobs')
+    lambda_function.write_avro_backup('jobs', result['columns'], result['rows'], 'backups/jobs/old.avro')
+    local_aws.db.query("INSERT INTO hr_data.jobs VALUES (900, 'Archivist')")
+    expected = local_aws.db.query('SELECT * FROM hr_data.jobs ORDER BY id')
+    old = lambda_function.read_avro_backup('backups/jobs/old.avro')
+    new = lambda_function.read_avro_backup(
+        invoke('POST', '/backup/jobs', {'codec': 'null'})[1]['backup_key']
+    )
+
+    assert len(lambda_function.dedupe_by_id(old + new)) == len(expected)
+
+    local_aws.db.query('DELETE FROM hr_data.jobs')
+    assert invoke('POST', '/restore/jobs', {'backup_key': 'backups/jobs/old.avro'})[0] == 200
+    assert len(local_aws.db.query('SELECT * FROM hr_data.jobs')) == len(expected) - 1
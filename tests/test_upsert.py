@@ -0,0 +1,56 @@
+import json
+
+import lambda_function
+
+
+def test_upsert_statements_merge_on_id():
+    data = [
+        {"id": 1, "department": "Engineering"},
+        {"id": 2, "department": "Sales"}
+    ]
+    statements = lambda_function.build_upsert_statements('departments', data)
+
+    assert statements[0] == "CREATE TEMP TABLE departments_stage (LIKE hr_data.departments)"
+    assert "VALUES (1, 'Engineering'), (2, 'Sales')" in statements[1]
+    assert "MERGE INTO hr_data.departments USING departments_stage s ON hr_data.departments.id = s.id" in statements[2]
+    assert "UPDATE SET department = s.department" in statements[2]
+    assert statements[-1] == "DROP TABLE departments_stage"
+
+
+def test_upsert_last_duplicate_wins():
+    data = [
+        {"id": 1, "job": "Engineer"},
+        {"id": 1, "job": "Senior Engineer"}
+    ]
+    statements = lambda_function.build_upsert_statements('jobs', data)
+
+    assert "'Senior Engineer'" in statements[1]
+    assert "'Engineer'" not in statements[1]
+
+
+def test_upsert_mode_runs_one_transaction(monkeypatch):
+    batches = []
+    monkeypatch.setattr(lambda_function, 'execute_batch_statements', batches.append)
+
+    event = {
+        'httpMethod': 'POST',
+        'path': '/data/jobs',
+        'body': json.dumps({'mode': 'upsert', 'data': [{"id": 1, "job": "Engineer"}]})
+    }
+    response = lambda_function.lambda_handler(event, None)
+
+    assert response['statusCode'] == 200
+    assert len(batches) == 1
+    assert any(sql.strip().startswith('MERGE INTO') for sql in batches[0])
+
+
+def test_invalid_mode_rejected():
+    event = {
+        'httpMethod': 'POST',
+        'path': '/data/jobs',
+        'queryStringParameters': {'mode': 'replace'},
+        'body': json.dumps({'data': [{"id": 1, "job": "Engineer"}]})
+    }
+    response = lambda_function.lambda_handler(event, None)
+
+    assert response['statusCode'] == 400